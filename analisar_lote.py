@@ -0,0 +1,150 @@
+"""
+Analisador offline de boletos em lote.
+
+Percorre um diretório de PDFs/imagens, roda ArquivoService e ModeloService num pool
+de processos (um por núcleo) e grava as análises no banco em inserts em lote, sem
+passar pela API HTTP e seus limites de requisição.
+
+Uso:
+    python analisar_lote.py caminho/dos/boletos [--workers N] [--lote 100] [--user-id ID]
+
+Os arquivos já gravados ficam registrados no checkpoint; se o processo for
+interrompido, rodar o mesmo comando de novo continua de onde parou.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+EXTENSOES_SUPORTADAS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
+
+# Serviços de cada processo do pool, criados uma única vez no initializer
+_arquivo_service = None
+_modelo_service = None
+
+
+def _iniciar_worker():
+    global _arquivo_service, _modelo_service
+    from app.services.arquivo_service import ArquivoService
+    from app.services.modelo_service import ModeloService
+
+    _arquivo_service = ArquivoService()
+    _modelo_service = ModeloService()
+
+
+def _analisar(caminho):
+    """Roda no worker: extração, validação e predição de um arquivo"""
+    extensao = caminho.rsplit('.', 1)[1].lower()
+    resultado = _arquivo_service.processar_arquivo(caminho, extensao)
+    if not resultado['sucesso']:
+        return {'caminho': caminho, 'status': 'erro', 'erro': resultado['erro']}
+
+    dados = resultado['dados_extraidos']
+    validacao = _arquivo_service.validar_dados_extraidos(dados)
+    if not validacao['valido']:
+        return {'caminho': caminho, 'status': 'erro', 'erro': '; '.join(validacao['erros'])}
+
+    predicao = _modelo_service.fazer_predicao(dados)
+    if 'erro' in predicao:
+        return {'caminho': caminho, 'status': 'erro', 'erro': predicao['erro']}
+
+    predicao.pop('explicacao_shap', None)  # não é persistida; evita trafegar entre processos
+    return {
+        'caminho': caminho,
+        'status': 'ok',
+        'banco': _modelo_service.mapear_banco(dados['banco']),
+        'dados_extraidos': dados,
+        'predicao': predicao,
+        'nivel_extracao': resultado['nivel_extracao']
+    }
+
+
+def listar_arquivos(diretorio):
+    for raiz, _, nomes in os.walk(diretorio):
+        for nome in sorted(nomes):
+            if '.' in nome and nome.rsplit('.', 1)[1].lower() in EXTENSOES_SUPORTADAS:
+                yield os.path.abspath(os.path.join(raiz, nome))
+
+
+def carregar_checkpoint(caminho_checkpoint):
+    if not os.path.exists(caminho_checkpoint):
+        return set()
+    with open(caminho_checkpoint, encoding='utf-8') as f:
+        return {linha.rstrip('\n') for linha in f if linha.strip()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analisa um diretório de boletos em paralelo e grava no banco')
+    parser.add_argument('diretorio', help='Diretório com PDFs/imagens de boletos')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Processos no pool (padrão: núcleos)')
+    parser.add_argument('--lote', type=int, default=100, help='Análises por insert em lote')
+    parser.add_argument('--user-id', type=int, default=None, help='Usuário dono das análises')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Arquivo de checkpoint (padrão: .analisar_lote_checkpoint no diretório)')
+    args = parser.parse_args()
+
+    caminho_checkpoint = args.checkpoint or os.path.join(args.diretorio, '.analisar_lote_checkpoint')
+    ja_processados = carregar_checkpoint(caminho_checkpoint)
+    pendentes = [c for c in listar_arquivos(args.diretorio) if c not in ja_processados]
+
+    print(f"{len(pendentes)} arquivo(s) a processar ({len(ja_processados)} já no checkpoint), "
+          f"{args.workers} worker(s)")
+    if not pendentes:
+        return
+
+    from app import create_app, db
+    from app.models.boleto import AnaliseBoleto
+
+    app = create_app()
+    totais = {'ok': 0, 'erro': 0}
+    inicio = time.perf_counter()
+
+    with app.app_context(), open(caminho_checkpoint, 'a', encoding='utf-8') as checkpoint, \
+            multiprocessing.Pool(args.workers, initializer=_iniciar_worker) as pool:
+        analises = []
+        caminhos_lote = []
+
+        def gravar_lote():
+            if not caminhos_lote:
+                return
+            db.session.add_all(analises)
+            db.session.commit()
+            # O checkpoint só avança depois do commit: nada é perdido nem gravado em dobro
+            checkpoint.write(''.join(c + '\n' for c in caminhos_lote))
+            checkpoint.flush()
+            analises.clear()
+            caminhos_lote.clear()
+
+        try:
+            for n, resultado in enumerate(pool.imap_unordered(_analisar, pendentes, chunksize=4), start=1):
+                totais[resultado['status']] += 1
+                caminhos_lote.append(resultado['caminho'])
+
+                if resultado['status'] == 'ok':
+                    analises.append(AnaliseBoleto.de_predicao(
+                        args.user_id, resultado['banco'], resultado['dados_extraidos'],
+                        resultado['predicao'], resultado['nivel_extracao']
+                    ))
+                else:
+                    print(f"ERRO {resultado['caminho']}: {resultado['erro']}")
+
+                if len(caminhos_lote) >= args.lote:
+                    gravar_lote()
+
+                if n % 50 == 0 or n == len(pendentes):
+                    decorrido = time.perf_counter() - inicio
+                    print(f"{n}/{len(pendentes)} | {n / decorrido:.2f} arquivos/s | "
+                          f"ok {totais['ok']} erro {totais['erro']}")
+        except KeyboardInterrupt:
+            print("Interrompido: gravando o que já foi analisado...")
+            pool.terminate()
+        finally:
+            gravar_lote()
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Concluído: {totais['ok']} análise(s) gravada(s), {totais['erro']} erro(s) "
+          f"em {decorrido:.1f}s ({sum(totais.values()) / decorrido:.2f} arquivos/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
@@ -10,9 +10,22 @@ db = SQLAlchemy()
 def create_app():
     app = Flask(__name__)
     
+    # Request que valida os arquivos enviados enquanto o corpo ainda está chegando
+    from app.middleware.upload_guard import UploadRequest, ArquivoRejeitado
+    app.request_class = UploadRequest
+    
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///detecta_boletos.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Perfil do engine (WAL/pragmas no SQLite, pool/timeouts no PostgreSQL): ver app/utils/perfis_banco.py
+    from app.utils.perfis_banco import opcoes_engine, aplicar_pragmas
+    perfil_banco = os.getenv('DB_PERFIL', 'padrao')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'], perfil_banco)
+    # Corpo máximo da requisição: 10MB de arquivo + margem para o envelope multipart.
+    # Requisições maiores são recusadas (413) pelo Content-Length, antes de qualquer leitura.
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 10 * 1024 * 1024 + 64 * 1024))
+    # Lotes em .zip (/api/upload/analyze-archive)
+    app.config['MAX_ARCHIVE_CONTENT_LENGTH'] = int(os.getenv('MAX_ARCHIVE_CONTENT_LENGTH', 200 * 1024 * 1024))
     
     # --- CONFIGURAÇÃO FINAL DO CORS ---
     # Lista de URLs (origens) que podem fazer requisições para sua API
@@ -25,6 +38,8 @@ def create_app():
     # ------------------------------------
     
     db.init_app(app)
+    with app.app_context():
+        aplicar_pragmas(db.engine, perfil_banco)
     
     @app.route('/')
     def home():
@@ -34,6 +49,15 @@ def create_app():
     def health():
         return {"status": "healthy"}
     
+    @app.errorhandler(413)
+    def arquivo_muito_grande(e):
+        limite_mb = (request.max_content_length or app.config['MAX_CONTENT_LENGTH']) / (1024 * 1024)
+        return jsonify({'erro': f'Arquivo muito grande. Máximo: {limite_mb:.0f}MB'}), 413
+    
+    @app.errorhandler(ArquivoRejeitado)
+    def arquivo_rejeitado(e):
+        return jsonify({'erro': e.description}), 400
+    
     # Registrar blueprints
     try:
         from app.routes.auth_routes import auth_bp
@@ -1,88 +1,66 @@
-import time
 from functools import wraps
+from typing import Tuple
 from flask import request, jsonify
-from collections import defaultdict, deque
 
-class SimpleRateLimiter:
-    def __init__(self):
-        # Armazenar requisições por IP e endpoint
-        self.requests = defaultdict(lambda: defaultdict(deque))
-        self.cleanup_interval = 300  # Limpar a cada 5 minutos
-        self.last_cleanup = time.time()
-    
-    def limit(self, requests_per_minute=60, per_endpoint=True):
+from app.utils.contadores import contadores
+
+class GCRARateLimiter:
+    """
+    Rate limiting por GCRA (Generic Cell Rate Algorithm), equivalente a um token bucket.
+    Cada chave (IP + endpoint) guarda um único float: o instante teórico da próxima
+    requisição (TAT). A memória por cliente é constante, qualquer que seja o limite.
+    """
+
+    def __init__(self, armazenamento=None):
+        # Os TATs ficam no armazenamento de contadores compartilhado (CONTADORES_BACKEND): com o
+        # backend mmap ou redis o limite vale para todos os workers, e não para cada um
+        self.contadores = armazenamento or contadores
+
+    def limit(self, requests_per_minute=60, per_endpoint=True, burst=None):
         """
         Decorator para rate limiting
-        requests_per_minute: número máximo de requests por minuto
+        requests_per_minute: taxa sustentada permitida
         per_endpoint: se True, limite por endpoint; se False, limite global
+        burst: requisições aceitas de uma vez com o bucket cheio (padrão: requests_per_minute)
         """
+        intervalo = 60.0 / requests_per_minute
+        tolerancia = intervalo * (burst or requests_per_minute)
+
         def decorator(f):
             @wraps(f)
             def decorated_function(*args, **kwargs):
-                current_time = time.time()
-                client_ip = self._get_client_ip()
-                
                 # Determinar chave do rate limit
-                if per_endpoint:
-                    key = f"{request.endpoint}"
-                else:
-                    key = "global"
-                
-                # Cleanup periódico
-                if current_time - self.last_cleanup > self.cleanup_interval:
-                    self._cleanup_old_requests(current_time)
-                    self.last_cleanup = current_time
-                
-                # Obter fila de requests deste IP para este endpoint
-                request_times = self.requests[client_ip][key]
-                
-                # Remover requests antigas (> 1 minuto)
-                while request_times and current_time - request_times[0] > 60:
-                    request_times.popleft()
-                
-                # Verificar se excedeu o limite
-                if len(request_times) >= requests_per_minute:
-                    return jsonify({
+                key = f"{request.endpoint}" if per_endpoint else "global"
+
+                permitido, retry_after = self.consumir(f"{self._get_client_ip()}|{key}", intervalo, tolerancia)
+                if not permitido:
+                    resposta = jsonify({
                         'error': 'Rate limit excedido',
                         'detail': f'Máximo {requests_per_minute} requests por minuto',
-                        'retry_after': 60 - (current_time - request_times[0])
-                    }), 429
-                
-                # Registrar esta requisição
-                request_times.append(current_time)
-                
+                        'retry_after': retry_after
+                    })
+                    resposta.headers['Retry-After'] = str(int(retry_after) + 1)
+                    return resposta, 429
+
                 # Executar função original
                 return f(*args, **kwargs)
-            
+
             return decorated_function
         return decorator
-    
+
+    def consumir(self, chave: str, intervalo: float, tolerancia: float) -> Tuple[bool, float]:
+        """
+        Tenta consumir uma requisição da chave. Retorna (permitido, segundos até a próxima liberação).
+        intervalo: segundos entre requisições na taxa sustentada; tolerancia: intervalo * burst
+        """
+        return self.contadores.gcra(f"rl:{chave}", intervalo, tolerancia)
+
     def _get_client_ip(self):
         """Obtém IP do cliente"""
         forwarded_for = request.headers.get('X-Forwarded-For')
         if forwarded_for:
             return forwarded_for.split(',')[0].strip()
         return request.remote_addr or '127.0.0.1'
-    
-    def _cleanup_old_requests(self, current_time):
-        """Remove dados antigos para liberar memória"""
-        cutoff = current_time - 3600  # Manter apenas última hora
-        
-        for ip in list(self.requests.keys()):
-            for endpoint in list(self.requests[ip].keys()):
-                request_times = self.requests[ip][endpoint]
-                
-                # Remover requests antigas
-                while request_times and request_times[0] < cutoff:
-                    request_times.popleft()
-                
-                # Remover endpoints vazios
-                if not request_times:
-                    del self.requests[ip][endpoint]
-            
-            # Remover IPs vazios
-            if not self.requests[ip]:
-                del self.requests[ip]
 
 # Instância global do rate limiter
-rate_limiter = SimpleRateLimiter()
\ No newline at end of file
+rate_limiter = GCRARateLimiter()
@@ -0,0 +1,77 @@
+from flask import Request, current_app
+from werkzeug.exceptions import BadRequest
+from app.services.security_service import SecurityService
+
+security_service = SecurityService()
+
+
+class ArquivoRejeitado(BadRequest):
+    """Upload recusado durante o recebimento (assinatura, dimensões ou páginas inválidas)"""
+
+
+class FluxoUploadVerificado:
+    """
+    Destino de um arquivo do multipart que inspeciona os primeiros KB assim que chegam.
+    Se o header for inválido, o parsing é interrompido antes do resto do corpo ser gravado.
+    """
+    def __init__(self, destino, extensao: str, max_paginas: int = None):
+        self._destino = destino
+        self._extensao = extensao
+        self._max_paginas = max_paginas
+        self._cabecalho = b''
+        self._verificado = False
+
+    def write(self, dados):
+        if not self._verificado:
+            faltam = security_service.HEADER_INSPECTION_SIZE - len(self._cabecalho)
+            self._cabecalho += bytes(dados[:faltam])
+            if len(self._cabecalho) >= security_service.HEADER_INSPECTION_SIZE:
+                self._verificar()
+        return self._destino.write(dados)
+
+    def seek(self, *args):
+        # O parser volta ao início ao terminar a parte: arquivos menores que o trecho inspecionado são checados aqui
+        if not self._verificado and self._cabecalho:
+            self._verificar()
+        return self._destino.seek(*args)
+
+    def _verificar(self):
+        self._verificado = True
+        valido, msg = security_service.validate_upload_header(self._cabecalho, self._extensao, self._max_paginas)
+        if not valido:
+            self._destino.close()
+            raise ArquivoRejeitado(msg)
+
+    def __getattr__(self, nome):
+        return getattr(self._destino, nome)
+
+    def __iter__(self):
+        return iter(self._destino)
+
+
+def modo_multiplo(args) -> bool:
+    """Query string pede extração de todos os boletos do arquivo"""
+    return args.get('multiplo', '').lower() in ('1', 'true', 'sim')
+
+
+class UploadRequest(Request):
+    """Request com verificação em streaming dos arquivos enviados"""
+
+    @property
+    def max_content_length(self):
+        # O lote em .zip tem limite próprio de tamanho
+        if self.endpoint == 'upload.analisar_arquivo_zip' and current_app:
+            return current_app.config['MAX_ARCHIVE_CONTENT_LENGTH']
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        destino = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        extensao = '.' + filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+        if extensao not in security_service.FILE_SIGNATURES:
+            # Extensões desconhecidas são recusadas depois, na rota
+            return destino
+
+        # No modo de múltiplos boletos (?multiplo=1) o PDF pode ter uma página por boleto
+        max_paginas = security_service.MAX_PDF_PAGES_BATCH if modo_multiplo(self.args) else None
+        return FluxoUploadVerificado(destino, extensao, max_paginas)
@@ -26,9 +26,44 @@ class AnaliseBoleto(db.Model):
     probabilidade_verdadeiro = db.Column(db.Float, nullable=False)
     confianca = db.Column(db.Float, nullable=False)
     
+    # Nível da cascata de OCR que produziu a extração (None para análises manuais)
+    nivel_extracao = db.Column(db.String(20), nullable=True)
+    # Linha como o OCR leu, quando a linha digitável foi recuperada/corrigida (None se foi lida como está)
+    linha_ocr = db.Column(db.String(60), nullable=True)
+    
     # Metadados
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Índices da paginação por cursor do histórico: (created_at, id), com e sem os filtros
+    __table_args__ = (
+        db.Index('ix_analises_created_at_id', 'created_at', 'id'),
+        db.Index('ix_analises_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_analises_resultado_created_at_id', 'resultado', 'created_at', 'id'),
+    )
+    
+    @classmethod
+    def de_predicao(cls, user_id, banco, dados_extraidos, predicao, nivel_extracao=None):
+        """Monta a análise a partir dos dados extraídos e da predição (banco já mapeado pelo ModeloService)"""
+        features_extraidas = predicao.get('features_extraidas', {})
+        
+        return cls(
+            user_id=user_id,
+            banco=banco,
+            codigo_banco=dados_extraidos.get('codigo_banco', 1),
+            agencia=dados_extraidos.get('agencia', 1),
+            valor=dados_extraidos.get('valor', 0.0),
+            linha_digitavel=dados_extraidos.get('linha_digitavel', ''),
+            linha_cod_banco=features_extraidas.get('linha_cod_banco', 0),
+            linha_moeda=features_extraidas.get('linha_moeda', 9),
+            linha_valor=features_extraidas.get('linha_valor', 0),
+            resultado=predicao['resultado'],
+            probabilidade_falso=predicao['probabilidade_falso'],
+            probabilidade_verdadeiro=predicao['probabilidade_verdadeiro'],
+            confianca=predicao['confianca'],
+            nivel_extracao=nivel_extracao,
+            linha_ocr=dados_extraidos.get('linha_ocr') if dados_extraidos.get('linha_recuperada') else None
+        )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -38,7 +73,9 @@ class AnaliseBoleto(db.Model):
                 'codigo_banco': self.codigo_banco,
                 'agencia': self.agencia,        # ⬅️ NOME ATUALIZADO
                 'valor': self.valor,            # ⬅️ NOME ATUALIZADO
-                'linha_digitavel': self.linha_digitavel
+                'linha_digitavel': self.linha_digitavel,
+                'linha_recuperada': self.linha_ocr is not None,
+                'linha_ocr': self.linha_ocr
             },
             'resultado': {
                 'predicao': self.resultado,
@@ -48,5 +85,28 @@ class AnaliseBoleto(db.Model):
                 },
                 'confianca': self.confianca
             },
+            'nivel_extracao': self.nivel_extracao,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+
+class HashImagemBoleto(db.Model):
+    """Hashes perceptuais de imagens já analisadas, para reaproveitar a extração de fotos repetidas"""
+    __tablename__ = 'hashes_imagem_boleto'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    analise_id = db.Column(db.Integer, db.ForeignKey('analises_boleto.id'), nullable=False)
+    # Dono da imagem: 'u:<user_id>' para usuários logados, 'ip:<endereço>' para anônimos
+    dono = db.Column(db.String(64), nullable=False)
+    # Hashes de 64 bits guardados com sinal (o INTEGER do SQLite é assinado)
+    dhash = db.Column(db.BigInteger, nullable=False)
+    phash = db.Column(db.BigInteger, nullable=False)
+    dhash_detalhado = db.Column(db.LargeBinary(512), nullable=False)
+    dados_extraidos = db.Column(JSON, nullable=False)
+    nivel_extracao = db.Column(db.String(20), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_hashes_imagem_dono_created_at', 'dono', 'created_at'),
+    )
+
@@ -0,0 +1,29 @@
+from app import db
+
+class ContadorAnalises(db.Model):
+    """
+    Totais de análises por dimensão e resultado, atualizados na mesma transação que grava
+    cada análise: /api/stats lê estes contadores em vez de contar analises_boleto.
+    """
+    __tablename__ = 'contadores_analises'
+
+    # 'banco' (chave = codigo_banco) ou 'usuario' (chave = user_id, 'anonimo' sem login)
+    dimensao = db.Column(db.String(10), primary_key=True)
+    chave = db.Column(db.String(32), primary_key=True)
+    resultado = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    soma_confianca = db.Column(db.Float, nullable=False, default=0.0)
+
+class _RollupAnalises:
+    """Análises agregadas por intervalo de tempo (UTC, como created_at) e banco"""
+    inicio = db.Column(db.DateTime, primary_key=True)
+    codigo_banco = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    falsos = db.Column(db.Integer, nullable=False, default=0)
+    soma_confianca = db.Column(db.Float, nullable=False, default=0.0)
+
+class RollupAnalisesHora(_RollupAnalises, db.Model):
+    __tablename__ = 'rollup_analises_hora'
+
+class RollupAnalisesDia(_RollupAnalises, db.Model):
+    __tablename__ = 'rollup_analises_dia'
@@ -0,0 +1,11 @@
+from app import db
+
+class Sequencia(db.Model):
+    """
+    Próximo id livre por tabela, reservado em blocos pela gravação em lote (SQLite não tem
+    sequências compartilháveis entre processos; no PostgreSQL usa-se a sequência da própria tabela)
+    """
+    __tablename__ = 'sequencias'
+
+    nome = db.Column(db.String(64), primary_key=True)
+    proximo = db.Column(db.BigInteger, nullable=False)
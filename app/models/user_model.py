@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.senha_service import senha_service
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,12 +16,19 @@ class User(db.Model):
     #analises = db.relationship('AnaliseBoleto', backref='user', lazy='dynamic')
     
     def set_password(self, password):
-        """Define a senha do usuário com hash"""
-        self.senha_hash = generate_password_hash(password)
+        """Define a senha do usuário com hash (no executor de senhas)"""
+        self.senha_hash = senha_service.gerar_hash(password)
     
     def check_password(self, password):
-        """Verifica se a senha está correta"""
-        return check_password_hash(self.senha_hash, password)
+        """
+        Verifica se a senha está correta. Se o hash foi gerado com parâmetros diferentes
+        dos configurados, regrava-o com os atuais (o commit fica a cargo de quem chamou).
+        """
+        if not senha_service.verificar(self.senha_hash, password):
+            return False
+        if senha_service.precisa_rehash(self.senha_hash):
+            self.senha_hash = senha_service.gerar_hash(password)
+        return True
     
     def to_dict(self):
         """Converte o usuário para dicionário (sem senha)"""
@@ -0,0 +1,10 @@
+from app import db
+
+class UsoDiario(db.Model):
+    """Análises feitas por dono e dia: cota diária e histórico de uso sem varrer analises_boleto"""
+    __tablename__ = 'uso_diario'
+
+    # Dono: 'u:<user_id>' para usuários logados, 'ip:<endereço>' para anônimos
+    dono = db.Column(db.String(64), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    analises = db.Column(db.Integer, nullable=False, default=0)
@@ -1,7 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from app import db
 from app.models.user_model import User
 from app.services.auth_security_service import AuthSecurityService
+from app.services.usuario_cache_service import UsuarioCacheService
+from app.services.senha_service import senha_service, FilaSenhasCheia
+import json
 import jwt
 import os
 from datetime import datetime, timedelta
@@ -9,42 +12,60 @@ from functools import wraps
 
 auth_bp = Blueprint('auth', __name__)
 security_service = AuthSecurityService()
+cache_usuarios = UsuarioCacheService()
 
 # ============ DECORATOR PARA PROTEÇÃO DE ROTAS ============
+def resolver_usuario():
+    """
+    Usuário do token da requisição, resolvido uma única vez e guardado em flask.g.
+    Retorna (usuario, erro): sem usuário válido, erro traz a mensagem do 401.
+    """
+    if 'auth' not in g:
+        g.auth = _resolver_usuario()
+    return g.auth
+
+
+def _resolver_usuario():
+    token = None
+    
+    # Verificar se token foi enviado no header
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        try:
+            token = auth_header.split(" ")[1]  # "Bearer TOKEN"
+        except IndexError:
+            return None, 'Token mal formatado'
+    
+    if not token:
+        return None, 'Token não fornecido'
+    
+    try:
+        # Token e usuário vêm do cache quando já foram verificados há pouco
+        current_user = cache_usuarios.obter_usuario(cache_usuarios.verificar_token(token))
+        
+        if not current_user:
+            return None, 'Usuário não encontrado'
+        
+        if not current_user.is_active:
+            return None, 'Usuário desativado'
+            
+    except jwt.ExpiredSignatureError:
+        return None, 'Token expirado. Faça login novamente'
+    except jwt.InvalidTokenError:
+        return None, 'Token inválido'
+    except Exception as e:
+        return None, f'Erro ao validar token: {str(e)}'
+    
+    return current_user, None
+
+
 def token_required(f):
     """Decorator para proteger rotas que precisam de autenticação"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Verificar se token foi enviado no header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]  # "Bearer TOKEN"
-            except IndexError:
-                return jsonify({'error': 'Token mal formatado'}), 401
-        
-        if not token:
-            return jsonify({'error': 'Token não fornecido'}), 401
-        
-        try:
-            # Decodificar token
-            data = jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-            
-            if not current_user:
-                return jsonify({'error': 'Usuário não encontrado'}), 401
-            
-            if not current_user.is_active:
-                return jsonify({'error': 'Usuário desativado'}), 401
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado. Faça login novamente'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
-        except Exception as e:
-            return jsonify({'error': f'Erro ao validar token: {str(e)}'}), 401
+        current_user, erro = resolver_usuario()
+        if erro:
+            return jsonify({'error': erro}), 401
         
         # Passa o usuário para a função protegida
         return f(current_user, *args, **kwargs)
@@ -52,6 +73,22 @@ def token_required(f):
     return decorated
 
 
+# E-mails (separados por vírgula) com acesso às análises de todos os usuários
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+
+def usuario_admin(usuario) -> bool:
+    """Administrador: e-mail listado em ADMIN_EMAILS"""
+    return usuario.email.lower() in ADMIN_EMAILS
+
+
+def resposta_servidor_ocupado():
+    """503 quando o executor de hash de senhas está sem vagas"""
+    resposta = jsonify({'error': 'Servidor ocupado. Tente novamente em instantes'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
+
 # ============ ROTAS PÚBLICAS ============
 
 @auth_bp.route('/register', methods=['POST'])
@@ -104,6 +141,9 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except FilaSenhasCheia:
+        db.session.rollback()
+        return resposta_servidor_ocupado()
     except Exception as e:
         db.session.rollback()
         print(f"Erro ao criar usuário: {e}")
@@ -151,6 +191,10 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Usuário desativado'}), 403
         
+        # Hash regravado por check_password (parâmetros de hash alterados)
+        if db.session.is_modified(user):
+            db.session.commit()
+        
         # Login bem-sucedido - limpar tentativas falhadas
         security_service.register_successful_login(identifier)
         
@@ -167,26 +211,118 @@ def login():
             'user': user.to_dict()
         }), 200
         
+    except FilaSenhasCheia:
+        return resposta_servidor_ocupado()
     except Exception as e:
         print(f"Erro no login: {e}")
         return jsonify({'error': f'Erro no login: {str(e)}'}), 500
 
 
+# Colunas que podem ser pedidas em ?fields= (id sempre é lido: é o cursor da paginação)
+CAMPOS_USUARIO = {
+    'id': User.id,
+    'nome': User.nome,
+    'email': User.email,
+    'created_at': User.created_at,
+    'is_active': User.is_active
+}
+MAX_USUARIOS_POR_PAGINA = 200
+LOTE_EXPORTACAO_USUARIOS = 1000
+
+
+def campos_usuario_pedidos():
+    """Campos de ?fields=a,b,c (todos se ausente). Levanta ValueError com campo desconhecido"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(CAMPOS_USUARIO)
+    campos = [campo.strip() for campo in fields.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in CAMPOS_USUARIO]
+    if invalidos:
+        raise ValueError(f'Campos inválidos: {", ".join(invalidos)}. Permitidos: {", ".join(CAMPOS_USUARIO)}')
+    return campos
+
+
+def pagina_usuarios(campos, apos_id, limite):
+    """
+    Uma página por keyset (id > cursor, ordenado por id): o custo não depende de quantas
+    páginas vêm antes. Só as colunas pedidas são lidas. Retorna (usuarios, último id).
+    """
+    extras = [campo for campo in campos if campo != 'id']
+    linhas = db.session.query(User.id, *[CAMPOS_USUARIO[campo] for campo in extras]).filter(
+        User.id > apos_id
+    ).order_by(User.id).limit(limite).all()
+    
+    usuarios = []
+    for linha in linhas:
+        valores = dict(zip(['id'] + extras, linha))
+        if valores.get('created_at'):
+            valores['created_at'] = valores['created_at'].isoformat()
+        usuarios.append({campo: valores[campo] for campo in campos})
+    return usuarios, (linhas[-1][0] if linhas else None)
+
+
 @auth_bp.route('/users', methods=['GET'])
 def listar_usuarios():
-    """Lista todos os usuários cadastrados"""
+    """
+    Lista os usuários cadastrados, paginados por cursor.
+    ?limit= (padrão 50, máx. 200), ?cursor= (proximo_cursor da página anterior), ?fields=id,nome,...
+    total é a contagem de todos os usuários (não só da página), como antes da paginação.
+    """
     try:
-        usuarios = User.query.all()
+        campos = campos_usuario_pedidos()
+        limite = min(max(request.args.get('limit', 50, type=int), 1), MAX_USUARIOS_POR_PAGINA)
+        cursor = request.args.get('cursor', 0, type=int)
+        
+        usuarios, ultimo_id = pagina_usuarios(campos, cursor, limite)
         return jsonify({
-            'total': len(usuarios),
-            'usuarios': [u.to_dict() for u in usuarios]
+            'total': db.session.query(db.func.count(User.id)).scalar(),
+            'quantidade': len(usuarios),
+            'usuarios': usuarios,
+            # None na última página
+            'proximo_cursor': ultimo_id if len(usuarios) == limite else None
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 # ============ ROTAS PROTEGIDAS ============
 
+@auth_bp.route('/users/export', methods=['GET'])
+@token_required
+def exportar_usuarios(current_user):
+    """Todos os usuários num array JSON enviado aos poucos, lidos em lotes por keyset (?fields= como em /users)"""
+    try:
+        campos = campos_usuario_pedidos()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def gerar():
+        yield '['
+        primeiro = True
+        ultimo_id = 0
+        while ultimo_id is not None:
+            usuarios, ultimo_id = pagina_usuarios(campos, ultimo_id, LOTE_EXPORTACAO_USUARIOS)
+            # Encerra a transação entre lotes: nenhuma leitura longa fica aberta durante o envio
+            db.session.rollback()
+            for usuario in usuarios:
+                yield ('' if primeiro else ',') + json.dumps(usuario, ensure_ascii=False)
+                primeiro = False
+            if len(usuarios) < LOTE_EXPORTACAO_USUARIOS:
+                break
+        yield ']'
+    
+    return Response(stream_with_context(gerar()), mimetype='application/json')
+
+
+@auth_bp.route('/hash-metrics', methods=['GET'])
+@token_required
+def metricas_hash_senha(current_user):
+    """Ocupação e latência do executor de hash de senhas"""
+    return jsonify(senha_service.metricas()), 200
+
+
 @auth_bp.route('/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
@@ -230,12 +366,16 @@ def update_user(current_user):
             current_user.set_password(data['senha'])
         
         db.session.commit()
+        cache_usuarios.invalidar_usuario(current_user.id)
         
         return jsonify({
             'message': 'Usuário atualizado com sucesso',
             'user': current_user.to_dict()
         }), 200
         
+    except FilaSenhasCheia:
+        db.session.rollback()
+        return resposta_servidor_ocupado()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro ao atualizar usuário: {str(e)}'}), 500
@@ -256,6 +396,8 @@ def test():
                 'GET /api/auth/test'
             ],
             'protected': [
+                'GET /api/auth/users/export (requer token)',
+                'GET /api/auth/hash-metrics (requer token)',
                 'GET /api/auth/me (requer token)',
                 'PUT /api/auth/update (requer token)'
             ]
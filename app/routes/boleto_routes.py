@@ -1,26 +1,23 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app import db
 from app.models.boleto import AnaliseBoleto
 from app.services.modelo_service import ModeloService
-import jwt
-import os
+from app.services.estatisticas_service import EstatisticasService
+from app.services.gravacao_service import gravacao_service
+from app.routes.auth_routes import resolver_usuario, token_required, usuario_admin
 
 boleto_bp = Blueprint('boleto', __name__)
 modelo_service = ModeloService()
+estatisticas_service = EstatisticasService()
 
 def get_current_user_optional():
     """Tenta obter o usuário atual se token for fornecido (opcional)"""
-    token = None
-    if 'Authorization' in request.headers:
-        try:
-            auth_header = request.headers['Authorization']
-            token = auth_header.split(" ")[1]
-            data = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=["HS256"])
-            from app.models.user_model import User
-            return User.query.get(data['user_id'])
-        except:
-            return None
-    return None
+    current_user, _ = resolver_usuario()
+    return current_user
 
 @boleto_bp.route('/analyze', methods=['POST'])
 def analisar_boleto():
@@ -69,8 +66,7 @@ def analisar_boleto():
             confianca=resultado_predicao['confianca']
         )
         
-        db.session.add(analise)
-        db.session.commit()
+        gravacao_service.gravar([analise])
         
        # Retornar resultado com explicação SHAP
         resposta = {
@@ -98,41 +94,248 @@ def analisar_boleto():
         traceback.print_exc()
         return jsonify({'erro': str(e)}), 500
 
+MAX_HISTORICO_POR_PAGINA = 100
+
+# granularidade -> (passo, pontos no período padrão, máximo de pontos por consulta)
+INTERVALOS_SERIE = {
+    'hora': (timedelta(hours=1), 48, 24 * 93),
+    'dia': (timedelta(days=1), 30, 3 * 366),
+}
+
+def codificar_cursor(analise):
+    return f"{analise.created_at.isoformat()}_{analise.id}"
+
+def data_utc(texto):
+    """ISO 8601 -> datetime sem fuso, em UTC como created_at. Levanta ValueError se inválido"""
+    data = datetime.fromisoformat(texto)
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+def decodificar_cursor(cursor):
+    """'<created_at>_<id>' -> (datetime, id). Levanta ValueError se o cursor for inválido"""
+    created_at, _, analise_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created_at), int(analise_id)
+
+def contar_analises(filtros, modo):
+    """
+    Total do histórico. 'exato': COUNT com os filtros (pelo índice). 'aproximado': sem filtros,
+    limite superior pelo intervalo de ids (análises não são apagadas, mas a reserva de ids em
+    blocos da gravação em lote deixa lacunas); com filtros não há estimativa barata e fica None.
+    """
+    if modo == 'exato':
+        return db.session.query(db.func.count(AnaliseBoleto.id)).filter(*filtros).scalar()
+    if modo == 'aproximado' and not filtros:
+        menor, maior = db.session.query(db.func.min(AnaliseBoleto.id), db.func.max(AnaliseBoleto.id)).one()
+        return (maior - menor + 1) if maior else 0
+    return None
+
 @boleto_bp.route('/history', methods=['GET'])
 def historico_analises():
-    """Retorna histórico de análises"""
+    """
+    Retorna histórico de análises, da mais recente para a mais antiga, paginado por cursor
+    em (created_at, id): cada página custa o mesmo, por mais fundo que esteja.
+    ?per_page= (máx. 100), ?cursor= (proximo_cursor da página anterior), ?user_id=, ?resultado=,
+    ?total=aproximado (padrão; limite superior) | exato | nenhum.
+    ?page= mantém a paginação por offset dos clientes antigos (total exato, pages, current_page).
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), MAX_HISTORICO_POR_PAGINA)
+        modo_total = request.args.get('total', 'aproximado')
+        if modo_total not in ('aproximado', 'exato', 'nenhum'):
+            return jsonify({'erro': 'total deve ser aproximado, exato ou nenhum'}), 400
         
-        analises = AnaliseBoleto.query.order_by(AnaliseBoleto.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        filtros = []
+        user_id = request.args.get('user_id', type=int)
+        if user_id is not None:
+            filtros.append(AnaliseBoleto.user_id == user_id)
+        resultado = request.args.get('resultado')
+        if resultado:
+            filtros.append(AnaliseBoleto.resultado == resultado)
+        
+        query = AnaliseBoleto.query.filter(*filtros)
+        ordem = (AnaliseBoleto.created_at.desc(), AnaliseBoleto.id.desc())
+        cursor = request.args.get('cursor')
+        
+        if 'page' in request.args:
+            if cursor:
+                return jsonify({'erro': 'Use page ou cursor, não os dois'}), 400
+            page = request.args.get('page', type=int)
+            if not page or page < 1:
+                return jsonify({'erro': 'page deve ser um inteiro a partir de 1'}), 400
+            pagina = query.order_by(*ordem).paginate(page=page, per_page=per_page, error_out=False)
+            return jsonify({
+                'analises': [analise.to_dict() for analise in pagina.items],
+                'total': pagina.total,
+                'pages': pagina.pages,
+                'current_page': page,
+                'proximo_cursor': codificar_cursor(pagina.items[-1]) if pagina.has_next and pagina.items else None
+            }), 200
+        
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decodificar_cursor(cursor)
+            except ValueError:
+                return jsonify({'erro': 'Cursor inválido'}), 400
+            # Comparação de tupla: vira um intervalo no índice (com OR o SQLite varre o índice inteiro)
+            query = query.filter(
+                db.tuple_(AnaliseBoleto.created_at, AnaliseBoleto.id) < db.tuple_(cursor_created_at, cursor_id)
+            )
+        
+        analises = query.order_by(*ordem).limit(per_page).all()
         
         return jsonify({
-            'analises': [analise.to_dict() for analise in analises.items],
-            'total': analises.total,
-            'pages': analises.pages,
-            'current_page': page
+            'analises': [analise.to_dict() for analise in analises],
+            'total': contar_analises(filtros, modo_total),
+            'total_aproximado': modo_total == 'aproximado',
+            # None na última página
+            'proximo_cursor': codificar_cursor(analises[-1]) if len(analises) == per_page else None
         }), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+LOTE_EXPORTACAO_HISTORICO = 1000
+COLUNAS_EXPORTACAO = (
+    AnaliseBoleto.id, AnaliseBoleto.user_id, AnaliseBoleto.created_at, AnaliseBoleto.banco,
+    AnaliseBoleto.codigo_banco, AnaliseBoleto.agencia, AnaliseBoleto.valor, AnaliseBoleto.linha_digitavel,
+    AnaliseBoleto.resultado, AnaliseBoleto.probabilidade_falso, AnaliseBoleto.probabilidade_verdadeiro,
+    AnaliseBoleto.confianca, AnaliseBoleto.nivel_extracao, AnaliseBoleto.linha_ocr
+)
+FORMATOS_EXPORTACAO = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def linhas_exportacao(filtros):
+    """
+    Análises filtradas em ordem cronológica, só as colunas exportadas, lidas em lotes.
+    PostgreSQL: uma consulta num cursor no servidor (yield_per). SQLite: lotes por keyset em
+    (created_at, id), com a transação encerrada entre eles para a leitura não segurar o arquivo.
+    """
+    consulta = db.select(*COLUNAS_EXPORTACAO).where(*filtros).order_by(AnaliseBoleto.created_at, AnaliseBoleto.id)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        yield from db.session.execute(consulta.execution_options(yield_per=LOTE_EXPORTACAO_HISTORICO))
+        return
+    
+    ultimo = None
+    while True:
+        lote = consulta
+        if ultimo:
+            lote = lote.where(db.tuple_(AnaliseBoleto.created_at, AnaliseBoleto.id) > db.tuple_(*ultimo))
+        linhas = db.session.execute(lote.limit(LOTE_EXPORTACAO_HISTORICO)).all()
+        db.session.rollback()
+        yield from linhas
+        if len(linhas) < LOTE_EXPORTACAO_HISTORICO:
+            return
+        ultimo = (linhas[-1].created_at, linhas[-1].id)
+
+@boleto_bp.route('/history/export', methods=['GET'])
+@token_required
+def exportar_historico(current_user):
+    """
+    Exporta o histórico inteiro (ou o filtrado) numa única resposta enviada aos poucos.
+    ?formato=csv (padrão) | ndjson, ?inicio= e ?fim= (ISO 8601, em created_at), ?user_id=, ?resultado=
+    Só as análises do próprio usuário; administradores (ADMIN_EMAILS) exportam as de todos.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'erro': 'formato deve ser csv ou ndjson'}), 400
+    
+    filtros = []
+    try:
+        if 'inicio' in request.args:
+            filtros.append(AnaliseBoleto.created_at >= data_utc(request.args['inicio']))
+        if 'fim' in request.args:
+            filtros.append(AnaliseBoleto.created_at < data_utc(request.args['fim']))
+    except ValueError:
+        return jsonify({'erro': 'inicio e fim devem estar no formato ISO 8601'}), 400
+    user_id = request.args.get('user_id', type=int)
+    if not usuario_admin(current_user):
+        if user_id not in (None, current_user.id):
+            return jsonify({'erro': 'Sem permissão para exportar análises de outro usuário'}), 403
+        user_id = current_user.id
+    if user_id is not None:
+        filtros.append(AnaliseBoleto.user_id == user_id)
+    resultado = request.args.get('resultado')
+    if resultado:
+        filtros.append(AnaliseBoleto.resultado == resultado)
+    
+    colunas = [coluna.key for coluna in COLUNAS_EXPORTACAO]
+    
+    def gerar():
+        # Um pedaço da resposta a cada lote de linhas, não um por linha
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if formato == 'csv':
+            escritor.writerow(colunas)
+        pendentes = 0
+        for linha in linhas_exportacao(filtros):
+            valores = linha._asdict()
+            valores['created_at'] = valores['created_at'].isoformat() if valores['created_at'] else None
+            if formato == 'csv':
+                escritor.writerow(valores.values())
+            else:
+                buffer.write(json.dumps(valores, ensure_ascii=False) + '\n')
+            pendentes += 1
+            if pendentes == LOTE_EXPORTACAO_HISTORICO:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pendentes = 0
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(gerar()),
+        mimetype=FORMATOS_EXPORTACAO[formato],
+        headers={'Content-Disposition': f'attachment; filename=analises.{formato}'}
+    )
+
 @boleto_bp.route('/stats', methods=['GET'])
 def estatisticas():
-    """Retorna estatísticas das análises"""
+    """
+    Retorna estatísticas das análises (contadores mantidos a cada análise gravada, em cache
+    por alguns segundos). ?user_id= inclui os totais do usuário.
+    """
+    try:
+        resposta = dict(estatisticas_service.resumo())
+        if 'user_id' in request.args:
+            resposta['usuario'] = estatisticas_service.resumo_usuario(request.args.get('user_id', type=int))
+        
+        return jsonify(resposta), 200
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@boleto_bp.route('/stats/timeseries', methods=['GET'])
+def serie_temporal():
+    """
+    Série temporal das análises (total, taxa de fraude, confiança média e divisão por banco),
+    lida dos rollups por hora/dia. Horários em UTC.
+    ?granularidade=dia (padrão) | hora, ?inicio= e ?fim= (ISO 8601; padrão: últimos 30 dias
+    ou últimas 48 horas), ?codigo_banco=
+    """
     try:
-        total_analises = AnaliseBoleto.query.count()
-        verdadeiros = AnaliseBoleto.query.filter_by(resultado='Verdadeiro').count()
-        falsos = AnaliseBoleto.query.filter_by(resultado='Falso').count()
+        granularidade = request.args.get('granularidade', 'dia')
+        if granularidade not in INTERVALOS_SERIE:
+            return jsonify({'erro': 'granularidade deve ser hora ou dia'}), 400
+        passo, padrao, maximo = INTERVALOS_SERIE[granularidade]
         
+        try:
+            fim = data_utc(request.args['fim']) if 'fim' in request.args else datetime.utcnow()
+            inicio = data_utc(request.args['inicio']) if 'inicio' in request.args else fim - padrao * passo
+        except ValueError:
+            return jsonify({'erro': 'inicio e fim devem estar no formato ISO 8601'}), 400
+        if inicio >= fim:
+            return jsonify({'erro': 'inicio deve ser anterior a fim'}), 400
+        if (fim - inicio) > maximo * passo:
+            return jsonify({'erro': f'Intervalo máximo: {maximo} pontos por consulta'}), 400
+        
+        serie = estatisticas_service.serie_temporal(
+            granularidade, inicio, fim, request.args.get('codigo_banco', type=int)
+        )
         return jsonify({
-            'total_analises': total_analises,
-            'verdadeiros': verdadeiros,
-            'falsos': falsos,
-            'porcentagem_verdadeiros': round((verdadeiros / total_analises * 100) if total_analises > 0 else 0, 2),
-            'porcentagem_falsos': round((falsos / total_analises * 100) if total_analises > 0 else 0, 2)
+            'granularidade': granularidade,
+            'inicio': inicio.isoformat(),
+            'fim': fim.isoformat(),
+            'serie': serie
         }), 200
         
     except Exception as e:
@@ -1,15 +1,25 @@
+import io
+import json
 import os
 import tempfile
-from flask import Blueprint, request, jsonify
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
+from PIL import Image
 from app import db
 from app.models.boleto import AnaliseBoleto
-from app.services.arquivo_service import ArquivoService
+from app.services.arquivo_service import ArquivoService, OrcamentoJob, OrcamentoExcedido
 from app.services.modelo_service import ModeloService
 from app.services.limitacao_service import LimitacaoService
-from app.routes.auth_routes import token_required
+from app.services.security_service import SecurityService
+from app.services.duplicata_service import DuplicataService
+from app.services.gravacao_service import gravacao_service
+from app.routes.auth_routes import token_required, resolver_usuario
 from app.middleware.rate_limiter import rate_limiter
-import jwt
+from app.middleware.upload_guard import modo_multiplo
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -17,29 +27,144 @@ upload_bp = Blueprint('upload', __name__)
 arquivo_service = ArquivoService()
 modelo_service = ModeloService()
 limitacao_service = LimitacaoService()
+security_service = SecurityService()
+duplicata_service = DuplicataService()
 
 # Configurações de upload
 UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# Uploads até este tamanho são processados direto da memória; acima, vão para um arquivo temporário
+MAX_MEMORY_PROCESSING_SIZE = int(os.getenv('UPLOAD_MEMORY_LIMIT', 4 * 1024 * 1024))  # 4MB
+# Lote em .zip: número de arquivos, tamanho descompactado total, workers de OCR e tamanho dos inserts em lote
+MAX_ARCHIVE_MEMBERS = int(os.getenv('MAX_ARCHIVE_MEMBERS', 500))
+MAX_ARCHIVE_UNCOMPRESSED_SIZE = int(os.getenv('MAX_ARCHIVE_UNCOMPRESSED_SIZE', 1024 * 1024 * 1024))  # 1GB
+ARCHIVE_WORKERS = int(os.getenv('ARCHIVE_WORKERS', os.cpu_count() or 2))
+ARCHIVE_INSERT_BATCH = int(os.getenv('ARCHIVE_INSERT_BATCH', 50))
+# Texto enviado pelo cliente (OCR no dispositivo ou camada de texto do PDF)
+MAX_TEXT_LENGTH = int(os.getenv('MAX_TEXT_LENGTH', 100 * 1024))
 
 def allowed_file(filename):
     """Verifica se o arquivo tem extensão permitida"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def carregar_upload(file, file_extension):
+    """
+    Carrega o upload para processamento.
+    Retorna (conteudo_ou_caminho, tamanho, temp_path); temp_path só é preenchido
+    quando o arquivo excede MAX_MEMORY_PROCESSING_SIZE e precisou ir para o disco.
+    """
+    file.stream.seek(0, os.SEEK_END)
+    file_size = file.stream.tell()
+    file.stream.seek(0)
+    
+    if file_size <= MAX_MEMORY_PROCESSING_SIZE:
+        return file.read(), file_size, None
+    
+    # Nome único por chamada: evita colisão entre threads do mesmo processo
+    fd, temp_path = tempfile.mkstemp(prefix='temp_boleto_', suffix=f'.{file_extension}', dir=UPLOAD_FOLDER)
+    with os.fdopen(fd, 'wb') as destino:
+        file.save(destino)
+    return temp_path, file_size, temp_path
+
+def ler_cabecalho(conteudo):
+    """Primeiros KB do upload, esteja ele em memória ou em disco"""
+    if isinstance(conteudo, bytes):
+        return conteudo[:security_service.HEADER_INSPECTION_SIZE]
+    with open(conteudo, 'rb') as f:
+        return f.read(security_service.HEADER_INSPECTION_SIZE)
+
+def analisar_multiplos_boletos(conteudo, filename, file_extension, file_size, user_id, client_ip, info_limite):
+    """Extrai todos os boletos do arquivo, pontua todos numa chamada ao modelo e salva as análises"""
+    resultado_processamento = arquivo_service.processar_arquivo_multiplo(conteudo, file_extension)
+    
+    if not resultado_processamento['sucesso']:
+        if resultado_processamento['orcamento_excedido']:
+            return jsonify({
+                'erro': f'Arquivo excede os limites de processamento: {resultado_processamento["erro"]}',
+                'recurso_excedido': resultado_processamento['orcamento_excedido']
+            }), 422
+        return jsonify({
+            'erro': f'Erro ao processar arquivo: {resultado_processamento["erro"]}'
+        }), 500
+    
+    boletos = resultado_processamento['boletos']
+    if not boletos:
+        return jsonify({'erro': 'Nenhum boleto encontrado no arquivo'}), 400
+    
+    # Validar cada boleto; só os válidos vão para o modelo
+    for boleto in boletos:
+        boleto['validacao'] = arquivo_service.validar_dados_extraidos(boleto['dados_extraidos'])
+    validos = [boleto for boleto in boletos if boleto['validacao']['valido']]
+    
+    # Cota relida agora (o OCR pode ter levado tempo): boletos além do restante não são analisados
+    _, info_limite = limitacao_service.verificar_limite_usuario(user_id, client_ip)
+    for boleto in validos[info_limite['restante']:]:
+        boleto['limite_atingido'] = True
+    validos = validos[:info_limite['restante']]
+    
+    predicoes = modelo_service.fazer_predicao_lote([boleto['dados_extraidos'] for boleto in validos])
+    
+    analises = []
+    for boleto, predicao in zip(validos, predicoes):
+        boleto['predicao'] = predicao
+        if 'erro' not in predicao:
+            boleto['analise'] = AnaliseBoleto.de_predicao(
+                user_id, modelo_service.mapear_banco(boleto['dados_extraidos']['banco']),
+                boleto['dados_extraidos'], predicao, boleto['nivel_extracao'])
+            analises.append(boleto['analise'])
+    
+    db.session.add_all(analises)
+    limitacao_service.registrar_uso(user_id, client_ip, len(analises))
+    db.session.commit()
+    info_limite['usado_hoje'] += len(analises)
+    info_limite['restante'] -= len(analises)
+    
+    resultados = []
+    for boleto in boletos:
+        item = {
+            'pagina': boleto['pagina'],
+            'nivel_extracao': boleto['nivel_extracao'],
+            'dados_extraidos': boleto['dados_extraidos'],
+            'validacao': boleto['validacao']
+        }
+        predicao = boleto.get('predicao')
+        if 'analise' in boleto:
+            item['id'] = boleto['analise'].id
+            item['resultado_ml'] = {
+                'predicao': predicao['resultado'],
+                'probabilidades': {
+                    'falso': predicao['probabilidade_falso'],
+                    'verdadeiro': predicao['probabilidade_verdadeiro']
+                },
+                'confianca': predicao['confianca']
+            }
+        elif boleto.get('limite_atingido'):
+            item['erro'] = 'Limite diário atingido'
+        elif predicao:
+            item['erro'] = f'Erro na análise ML: {predicao["erro"]}'
+        else:
+            item['erro'] = 'Não foi possível extrair dados válidos do boleto'
+        resultados.append(item)
+    
+    return jsonify({
+        'user_id': user_id,
+        'arquivo_processado': {
+            'nome_arquivo': filename,
+            'tipo': file_extension,
+            'tamanho_kb': round(file_size / 1024, 2),
+            'paginas': resultado_processamento['paginas']
+        },
+        'total_boletos': len(resultados),
+        'total_analisados': len(analises),
+        'analises': resultados,
+        'limite_info': info_limite
+    }), 200
+
 def get_current_user_optional():
     """Tenta obter o usuário atual se token for fornecido"""
-    token = None
-    if 'Authorization' in request.headers:
-        try:
-            auth_header = request.headers['Authorization']
-            token = auth_header.split(" ")[1]
-            data = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=["HS256"])
-            from app.models.user_model import User
-            return User.query.get(data['user_id'])
-        except:
-            return None
-    return None
+    current_user, _ = resolver_usuario()
+    return current_user
 
 @upload_bp.route('/analyze-file', methods=['POST'])
 @rate_limiter.limit(requests_per_minute=10)
@@ -74,24 +199,66 @@ def analisar_arquivo():
                 'sugestao': 'Faça login para ter acesso ao limite estendido' if not user_id else 'Tente novamente amanhã'
             }), 429
         
-        # Salvar arquivo temporariamente
+        # Carregar arquivo (em memória, ou em disco se for grande)
         filename = secure_filename(file.filename)
         file_extension = filename.rsplit('.', 1)[1].lower()
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_boleto_{os.getpid()}_{filename}")
-        
-        file.save(temp_path)
+        conteudo, file_size, temp_path = carregar_upload(file, file_extension)
         
         try:
             # Verificar tamanho do arquivo
-            file_size = os.path.getsize(temp_path)
             valido, msg = limitacao_service.verificar_qualidade_arquivo(file_size, file_extension)
             if not valido:
                 return jsonify({'erro': msg}), 400
             
-            # Processar arquivo
-            resultado_processamento = arquivo_service.processar_arquivo(temp_path, file_extension)
+            # Arquivos pequenos não passam pela inspeção em streaming por inteiro; revalidar o header
+            multiplo = modo_multiplo(request.args)
+            max_paginas = security_service.MAX_PDF_PAGES_BATCH if multiplo else None
+            valido, msg = security_service.validate_upload_header(ler_cabecalho(conteudo), file_extension, max_paginas)
+            if not valido:
+                return jsonify({'erro': msg}), 400
+            
+            if multiplo:
+                # Lote: todos os boletos do arquivo, uma análise por boleto
+                return analisar_multiplos_boletos(conteudo, filename, file_extension, file_size, user_id, client_ip, info_limite)
+            
+            # Imagem decodificada uma vez, dentro do orçamento do job: serve ao hash e ao OCR
+            orcamento = OrcamentoJob()
+            arquivo = conteudo
+            if file_extension != 'pdf':
+                try:
+                    arquivo = arquivo_service.abrir_imagem(conteudo, orcamento)
+                except OrcamentoExcedido as e:
+                    return jsonify({
+                        'erro': f'Arquivo excede os limites de processamento: {e}',
+                        'recurso_excedido': e.recurso
+                    }), 422
+                except Exception:
+                    # Imagem ilegível: processar_arquivo reporta o erro abaixo
+                    pass
+            
+            # Foto nova de um boleto que o mesmo usuário acabou de enviar: reaproveita a extração sem OCR
+            dono = duplicata_service.dono(user_id, client_ip)
+            hashes = duplicata_service.calcular_hashes(arquivo) if isinstance(arquivo, Image.Image) else None
+            duplicata = duplicata_service.buscar(dono, hashes) if hashes else None
+            
+            if duplicata:
+                resultado_processamento = {
+                    'sucesso': True,
+                    'texto_extraido': '',
+                    'dados_extraidos': dict(duplicata.dados_extraidos),
+                    'nivel_extracao': 'duplicata'
+                }
+            else:
+                # Processar arquivo
+                resultado_processamento = arquivo_service.processar_arquivo(arquivo, file_extension, orcamento)
             
             if not resultado_processamento['sucesso']:
+                if resultado_processamento['orcamento_excedido']:
+                    # Job cancelado por limite de recursos (pixels, páginas, memória, tempo ou CPU)
+                    return jsonify({
+                        'erro': f'Arquivo excede os limites de processamento: {resultado_processamento["erro"]}',
+                        'recurso_excedido': resultado_processamento['orcamento_excedido']
+                    }), 422
                 return jsonify({
                     'erro': f'Erro ao processar arquivo: {resultado_processamento["erro"]}'
                 }), 500
@@ -124,27 +291,15 @@ def analisar_arquivo():
                     'dados_extraidos': dados_extraidos
                 }), 500
             
-            # Salvar análise no banco
-            features_extraidas = predicao.get('features_extraidas', {})
-            
-            analise = AnaliseBoleto(
-                user_id=user_id,
-                banco=modelo_service.mapear_banco(dados_extraidos['banco']),
-                codigo_banco=dados_extraidos.get('codigo_banco', 1),
-                agencia=dados_extraidos.get('agencia', 1),
-                valor=dados_extraidos.get('valor', 0.0),
-                linha_digitavel=dados_extraidos.get('linha_digitavel', ''),
-                linha_cod_banco=features_extraidas.get('linha_cod_banco', 0),
-                linha_moeda=features_extraidas.get('linha_moeda', 9),
-                linha_valor=features_extraidas.get('linha_valor', 0),
-                resultado=predicao['resultado'],
-                probabilidade_falso=predicao['probabilidade_falso'],
-                probabilidade_verdadeiro=predicao['probabilidade_verdadeiro'],
-                confianca=predicao['confianca']
-            )
-            
-            db.session.add(analise)
-            db.session.commit()
+            # Salvar análise no banco (uso diário e índice de duplicatas na mesma transação)
+            analise = AnaliseBoleto.de_predicao(user_id, modelo_service.mapear_banco(dados_extraidos['banco']),
+                                                dados_extraidos, predicao, resultado_processamento['nivel_extracao'])
+            
+            tarefas = [lambda: limitacao_service.registrar_uso(user_id, client_ip)]
+            if hashes and not duplicata:
+                tarefas.append(lambda: duplicata_service.registrar(dono, hashes, analise.id, dados_extraidos,
+                                                                   resultado_processamento['nivel_extracao']))
+            gravacao_service.gravar([analise], tarefas)
             
             # Resposta completa
             resposta = {
@@ -154,7 +309,9 @@ def analisar_arquivo():
                     'nome_arquivo': filename,
                     'tipo': file_extension,
                     'tamanho_kb': round(file_size / 1024, 2),
-                    'confianca_extracao': validacao['confianca']
+                    'confianca_extracao': validacao['confianca'],
+                    'nivel_extracao': resultado_processamento['nivel_extracao'],
+                    'duplicata_de': duplicata.analise_id if duplicata else None
                 },
                 'dados_extraidos': dados_extraidos,
                 'validacao': validacao,
@@ -180,12 +337,294 @@ def analisar_arquivo():
             
         finally:
             # Limpar arquivo temporário
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
         
+    except HTTPException:
+        # Upload recusado durante o recebimento (413 / header inválido): tratado pelos errorhandlers
+        raise
+    except Exception as e:
+        return jsonify({'erro': f'Erro interno: {str(e)}'}), 500
+
+@upload_bp.route('/analyze-text', methods=['POST'])
+@rate_limiter.limit(requests_per_minute=10)
+def analisar_texto():
+    """
+    Analisa boleto a partir do texto já extraído pelo cliente (OCR no dispositivo ou camada
+    de texto do PDF): só extração dos campos, validação e modelo, sem upload nem OCR no servidor
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        texto = data.get('texto')
+        
+        if not isinstance(texto, str) or not texto.strip():
+            return jsonify({'erro': 'Campo "texto" é obrigatório'}), 400
+        
+        if len(texto) > MAX_TEXT_LENGTH:
+            return jsonify({'erro': f'Texto muito grande. Máximo: {MAX_TEXT_LENGTH} caracteres'}), 400
+        
+        # Obter usuário atual (se logado)
+        current_user = get_current_user_optional()
+        user_id = current_user.id if current_user else None
+        client_ip = limitacao_service.get_client_ip()
+        
+        # Verificar limites de uso (os mesmos do upload de arquivo)
+        pode_analisar, info_limite = limitacao_service.verificar_limite_usuario(user_id, client_ip)
+        if not pode_analisar:
+            return jsonify({
+                'erro': 'Limite de análises diárias excedido',
+                'limite_info': info_limite,
+                'sugestao': 'Faça login para ter acesso ao limite estendido' if not user_id else 'Tente novamente amanhã'
+            }), 429
+        
+        # Extrair e validar dados
+        dados_extraidos = arquivo_service._extrair_dados_boleto(texto)
+        validacao = arquivo_service.validar_dados_extraidos(dados_extraidos)
+        
+        if not validacao['valido']:
+            return jsonify({
+                'erro': 'Não foi possível extrair dados válidos do boleto',
+                'detalhes': validacao['erros']
+            }), 400
+        
+        # Fazer predição com o modelo ML
+        predicao = modelo_service.fazer_predicao(dados_extraidos)
+        if 'erro' in predicao:
+            return jsonify({
+                'erro': f'Erro na análise ML: {predicao["erro"]}',
+                'dados_extraidos': dados_extraidos,
+                'validacao': validacao
+            }), 500
+        
+        # Salvar análise no banco
+        analise = AnaliseBoleto.de_predicao(user_id, modelo_service.mapear_banco(dados_extraidos['banco']),
+                                            dados_extraidos, predicao, 'texto_cliente')
+        
+        db.session.add(analise)
+        limitacao_service.registrar_uso(user_id, client_ip)
+        db.session.commit()
+        
+        return jsonify({
+            'id': analise.id,
+            'user_id': user_id,
+            'nivel_extracao': 'texto_cliente',
+            'dados_extraidos': dados_extraidos,
+            'validacao': validacao,
+            'resultado_ml': {
+                'predicao': predicao['resultado'],
+                'probabilidades': {
+                    'falso': predicao['probabilidade_falso'],
+                    'verdadeiro': predicao['probabilidade_verdadeiro']
+                },
+                'confianca': predicao['confianca']
+            },
+            'limite_info': info_limite,
+            'timestamp': analise.created_at.isoformat()
+        }), 200
+        
     except Exception as e:
         return jsonify({'erro': f'Erro interno: {str(e)}'}), 500
 
+def listar_membros_zip(arquivo_zip):
+    """Valida o índice do .zip (sem descompactar nada) e retorna os membros a processar"""
+    membros = [m for m in arquivo_zip.infolist() if not m.is_dir()]
+    
+    if len(membros) > MAX_ARCHIVE_MEMBERS:
+        raise ValueError(f'Arquivo com {len(membros)} itens (máximo {MAX_ARCHIVE_MEMBERS})')
+    
+    # Tamanhos declarados no diretório central: recusa zip bombs antes de descompactar
+    total = sum(m.file_size for m in membros)
+    if total > MAX_ARCHIVE_UNCOMPRESSED_SIZE:
+        raise ValueError(f'Conteúdo descompactado muito grande: {total / 1024 / 1024:.0f}MB')
+    
+    return membros
+
+def analisar_membro(nome, conteudo, file_extension):
+    """Processa um arquivo do lote (roda nos workers de OCR)"""
+    valido, msg = security_service.validate_upload_header(conteudo[:security_service.HEADER_INSPECTION_SIZE], file_extension)
+    if not valido:
+        return {'arquivo': nome, 'status': 'erro', 'erro': msg}
+    
+    resultado_processamento = arquivo_service.processar_arquivo(conteudo, file_extension)
+    if not resultado_processamento['sucesso']:
+        return {
+            'arquivo': nome,
+            'status': 'erro',
+            'erro': f'Erro ao processar arquivo: {resultado_processamento["erro"]}',
+            'recurso_excedido': resultado_processamento['orcamento_excedido']
+        }
+    
+    dados_extraidos = resultado_processamento['dados_extraidos']
+    validacao = arquivo_service.validar_dados_extraidos(dados_extraidos)
+    if not validacao['valido']:
+        return {
+            'arquivo': nome,
+            'status': 'erro',
+            'erro': 'Não foi possível extrair dados válidos do boleto',
+            'detalhes': validacao['erros']
+        }
+    
+    return {
+        'arquivo': nome,
+        'status': 'ok',
+        'nivel_extracao': resultado_processamento['nivel_extracao'],
+        'dados_extraidos': dados_extraidos,
+        'validacao': validacao
+    }
+
+@upload_bp.route('/analyze-archive', methods=['POST'])
+@token_required
+@rate_limiter.limit(requests_per_minute=2)
+def analisar_arquivo_zip(current_user):
+    """
+    Analisa um .zip de PDFs/imagens. Os membros são lidos direto do arquivo enviado
+    (sem extrair para o disco), processados em paralelo e cada resultado é enviado como
+    uma linha NDJSON assim que fica pronto. As análises são gravadas em inserts em lote.
+    """
+    if 'file' not in request.files:
+        return jsonify({'erro': 'Nenhum arquivo enviado'}), 400
+    
+    file = request.files['file']
+    if not file.filename.lower().endswith('.zip'):
+        return jsonify({'erro': 'Envie um arquivo .zip'}), 400
+    
+    client_ip = limitacao_service.get_client_ip()
+    pode_analisar, info_limite = limitacao_service.verificar_limite_usuario(current_user.id, client_ip)
+    if not pode_analisar:
+        return jsonify({'erro': 'Limite de análises diárias excedido', 'limite_info': info_limite}), 429
+    
+    # O fluxo do upload passa a ser desta rota: o Flask fecha os arquivos da requisição
+    # ao fim da view, mas a resposta continua sendo gerada depois disso
+    stream = file.stream
+    file.stream = io.BytesIO()
+    
+    try:
+        arquivo_zip = zipfile.ZipFile(stream)
+        membros = listar_membros_zip(arquivo_zip)
+    except zipfile.BadZipFile:
+        stream.close()
+        return jsonify({'erro': 'Arquivo .zip inválido'}), 400
+    except ValueError as e:
+        stream.close()
+        return jsonify({'erro': str(e)}), 400
+    
+    user_id = current_user.id
+    
+    def gerar_resultados():
+        pendentes_escrita = []
+        totais = {'arquivos': len(membros), 'ok': 0, 'erro': 0, 'salvos': 0}
+        
+        cota = {'restante': info_limite['restante']}
+        
+        def gravar_lote():
+            """
+            Grava as análises pendentes que cabem na cota, relida antes de cada lote (outras
+            requisições podem ter consumido). Retorna os arquivos que ficaram de fora.
+            """
+            if not pendentes_escrita:
+                return []
+            _, info = limitacao_service.verificar_limite_usuario(user_id, client_ip)
+            permitidos = pendentes_escrita[:info['restante']]
+            recusados = [nome for nome, _ in pendentes_escrita[info['restante']:]]
+            if permitidos:
+                db.session.add_all([analise for _, analise in permitidos])
+                limitacao_service.registrar_uso(user_id, client_ip, len(permitidos))
+                db.session.commit()
+                totais['salvos'] += len(permitidos)
+            cota['restante'] = info['restante'] - len(permitidos)
+            totais['ok'] -= len(recusados)
+            totais['erro'] += len(recusados)
+            pendentes_escrita.clear()
+            return recusados
+        
+        def linha(resultado):
+            return json.dumps(resultado, ensure_ascii=False, default=str) + '\n'
+        
+        executor = ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS)
+        em_andamento = set()
+        fila = iter(membros)
+        try:
+            while True:
+                # Mantém no máximo 2x workers arquivos descompactados em memória
+                for membro in fila:
+                    nome = membro.filename
+                    file_extension = nome.rsplit('.', 1)[1].lower() if '.' in nome else ''
+                    if file_extension not in ALLOWED_EXTENSIONS:
+                        totais['erro'] += 1
+                        yield linha({'arquivo': nome, 'status': 'erro', 'erro': 'Tipo de arquivo não permitido'})
+                        continue
+                    if membro.file_size > MAX_FILE_SIZE:
+                        totais['erro'] += 1
+                        yield linha({'arquivo': nome, 'status': 'erro', 'erro': 'Arquivo muito grande'})
+                        continue
+                    
+                    if len(pendentes_escrita) + len(em_andamento) >= cota['restante']:
+                        # Cota do dia já comprometida: não gasta OCR com o que não seria gravado
+                        totais['erro'] += 1
+                        yield linha({'arquivo': nome, 'status': 'erro', 'erro': 'Limite diário atingido'})
+                        continue
+                    
+                    try:
+                        conteudo = arquivo_zip.read(membro)
+                    except (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error) as e:
+                        # Membro criptografado, corrompido (CRC) ou com compressão não suportada
+                        totais['erro'] += 1
+                        yield linha({'arquivo': nome, 'status': 'erro', 'erro': f'Não foi possível descompactar: {e}'})
+                        continue
+                    em_andamento.add(executor.submit(analisar_membro, nome, conteudo, file_extension))
+                    if len(em_andamento) >= ARCHIVE_WORKERS * 2:
+                        break
+                
+                if not em_andamento:
+                    break
+                
+                concluidos, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    resultado = futuro.result()
+                    
+                    if resultado['status'] == 'ok':
+                        predicao = modelo_service.fazer_predicao(resultado['dados_extraidos'])
+                        if 'erro' in predicao:
+                            resultado = {'arquivo': resultado['arquivo'], 'status': 'erro',
+                                         'erro': f'Erro na análise ML: {predicao["erro"]}'}
+                        elif len(pendentes_escrita) >= cota['restante']:
+                            resultado = {'arquivo': resultado['arquivo'], 'status': 'erro', 'erro': 'Limite diário atingido'}
+                        else:
+                            pendentes_escrita.append((resultado['arquivo'], AnaliseBoleto.de_predicao(
+                                user_id, modelo_service.mapear_banco(resultado['dados_extraidos']['banco']),
+                                resultado['dados_extraidos'], predicao, resultado['nivel_extracao'])))
+                            resultado['resultado_ml'] = {
+                                'predicao': predicao['resultado'],
+                                'probabilidades': {
+                                    'falso': predicao['probabilidade_falso'],
+                                    'verdadeiro': predicao['probabilidade_verdadeiro']
+                                },
+                                'confianca': predicao['confianca']
+                            }
+                    
+                    totais[resultado['status']] += 1
+                    yield linha(resultado)
+                
+                if len(pendentes_escrita) >= ARCHIVE_INSERT_BATCH:
+                    for nome in gravar_lote():
+                        yield linha({'arquivo': nome, 'status': 'erro', 'erro': 'Limite diário atingido'})
+            
+            for nome in gravar_lote():
+                yield linha({'arquivo': nome, 'status': 'erro', 'erro': 'Limite diário atingido'})
+            yield linha({'resumo': totais})
+        finally:
+            # Cliente desconectou ou erro: cancela o que não começou e grava o que já foi analisado
+            executor.shutdown(wait=False, cancel_futures=True)
+            try:
+                gravar_lote()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro ao gravar lote de análises: {e}")
+            arquivo_zip.close()
+            stream.close()
+    
+    return Response(stream_with_context(gerar_resultados()), mimetype='application/x-ndjson')
+
 @upload_bp.route('/limits', methods=['GET'])
 @rate_limiter.limit(requests_per_minute=30)
 def obter_limites():
@@ -195,7 +634,7 @@ def obter_limites():
     client_ip = limitacao_service.get_client_ip()
     
     pode_analisar, info_limite = limitacao_service.verificar_limite_usuario(user_id, client_ip)
-    estatisticas = limitacao_service.obter_estatisticas_uso(user_id)
+    estatisticas = limitacao_service.obter_estatisticas_uso(user_id, client_ip)
     
     return jsonify({
         'pode_analisar': pode_analisar,
@@ -218,27 +657,33 @@ def testar_ocr(current_user):
         if not allowed_file(file.filename):
             return jsonify({'erro': 'Tipo de arquivo não permitido'}), 400
         
-        # Salvar arquivo temporariamente
+        # Carregar arquivo (em memória, ou em disco se for grande)
         filename = secure_filename(file.filename)
         file_extension = filename.rsplit('.', 1)[1].lower()
-        temp_path = os.path.join(UPLOAD_FOLDER, f"test_ocr_{os.getpid()}_{filename}")
-        
-        file.save(temp_path)
+        conteudo, file_size, temp_path = carregar_upload(file, file_extension)
         
         try:
+            valido, msg = security_service.validate_upload_header(ler_cabecalho(conteudo), file_extension)
+            if not valido:
+                return jsonify({'erro': msg}), 400
+            
             # Processar apenas para extração de texto
-            resultado = arquivo_service.processar_arquivo(temp_path, file_extension)
+            resultado = arquivo_service.processar_arquivo(conteudo, file_extension)
             
             return jsonify({
                 'sucesso': resultado['sucesso'],
                 'texto_extraido': resultado['texto_extraido'],
                 'dados_extraidos': resultado['dados_extraidos'],
+                'nivel_extracao': resultado['nivel_extracao'],
+                'orcamento_excedido': resultado['orcamento_excedido'],
                 'erro': resultado['erro']
             }), 200
             
         finally:
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
                 
+    except HTTPException:
+        raise
     except Exception as e:
         return jsonify({'erro': f'Erro no teste OCR: {str(e)}'}), 500
\ No newline at end of file
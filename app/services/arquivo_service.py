@@ -1,158 +1,421 @@
+import io
 import os
-import re
 import tempfile
-from PIL import Image
-import pytesseract
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from PIL import Image, ImageFilter, ImageOps
 import PyPDF2
-from typing import Dict, Optional, List
-from pdf2image import convert_from_path # <-- MUDANÇA AQUI: Novo import
+from typing import Dict, Optional, List, Iterator, Tuple, Union, BinaryIO
+from pdf2image import convert_from_path, convert_from_bytes
+from pdf2image.exceptions import PDFPopplerTimeoutError
+from app.utils.linha_digitavel import validar_linha_digitavel
+from app.utils.extrator_campos import extrair_campos, extrair_campos_por_boleto
+from app.services.security_service import SecurityService
+from app.services.ocr_service import OcrService
+
+class OrcamentoExcedido(Exception):
+    """Job de processamento cancelado por exceder um limite de recursos"""
+    def __init__(self, recurso: str, mensagem: str):
+        super().__init__(mensagem)
+        self.recurso = recurso
+
+class OrcamentoJob:
+    """
+    Limites de recursos de um job de processar_arquivo.
+    
+    Tempo de CPU é medido por thread do job (decodificação, parsing, regex); os processos
+    externos (tesseract, pdftoppm) são limitados pelo timeout e pelo tempo total.
+    Memória é estimada pelo tamanho decodificado das imagens, antes de decodificá-las.
+    """
+    def __init__(self, tempo_maximo: float = None, cpu_maximo: float = None, memoria_maxima_mb: int = None,
+                 pixels_maximos: int = None, paginas_maximas: int = None, timeout_tesseract: float = None):
+        self.tempo_maximo = tempo_maximo if tempo_maximo is not None else float(os.getenv('OCR_TEMPO_MAXIMO', 60))
+        self.cpu_maximo = cpu_maximo if cpu_maximo is not None else float(os.getenv('OCR_CPU_MAXIMO', 30))
+        self.memoria_maxima_mb = memoria_maxima_mb if memoria_maxima_mb is not None else int(os.getenv('OCR_MEMORIA_MAXIMA_MB', 512))
+        self.pixels_maximos = pixels_maximos if pixels_maximos is not None else int(os.getenv('OCR_PIXELS_MAXIMOS', SecurityService.MAX_IMAGE_PIXELS))
+        self.paginas_maximas = paginas_maximas if paginas_maximas is not None else int(os.getenv('OCR_PAGINAS_MAXIMAS', SecurityService.MAX_PDF_PAGES))
+        self.timeout_tesseract = timeout_tesseract if timeout_tesseract is not None else float(os.getenv('OCR_TIMEOUT_TESSERACT', 20))
+        
+        self.inicio = time.monotonic()
+        self._cpu_inicio = threading.local()
+    
+    def tempo_restante(self) -> float:
+        return self.tempo_maximo - (time.monotonic() - self.inicio)
+    
+    def verificar(self):
+        """Checkpoint entre etapas: cancela o job se tempo total ou CPU estourarem"""
+        if self.tempo_restante() <= 0:
+            raise OrcamentoExcedido('tempo', f"Processamento excedeu o tempo máximo de {self.tempo_maximo:.0f}s")
+        if not hasattr(self._cpu_inicio, 'valor'):
+            # Primeira verificação nesta thread (ex.: páginas processadas em paralelo)
+            self._cpu_inicio.valor = time.thread_time()
+        if time.thread_time() - self._cpu_inicio.valor > self.cpu_maximo:
+            raise OrcamentoExcedido('cpu', f"Processamento excedeu o tempo de CPU máximo de {self.cpu_maximo:.0f}s")
+    
+    def timeout_ocr(self) -> float:
+        """Timeout da próxima chamada externa: o menor entre o do tesseract e o tempo que sobra"""
+        self.verificar()
+        return max(1.0, min(self.timeout_tesseract, self.tempo_restante()))
+    
+    def verificar_imagem(self, largura: int, altura: int, bandas: int = 3, quantidade: int = 1):
+        """Confere pixels e memória decodificada antes de decodificar/rasterizar"""
+        if largura * altura > self.pixels_maximos:
+            raise OrcamentoExcedido('pixels', f"Imagem com {largura}x{altura} pixels excede o máximo de {self.pixels_maximos}")
+        memoria_mb = largura * altura * bandas * quantidade / (1024 * 1024)
+        if memoria_mb > self.memoria_maxima_mb:
+            raise OrcamentoExcedido('memoria', f"Processamento exigiria ~{memoria_mb:.0f}MB (máximo {self.memoria_maxima_mb}MB)")
+    
+    def verificar_paginas(self, paginas: int):
+        if paginas > self.paginas_maximas:
+            raise OrcamentoExcedido('paginas', f"PDF com {paginas} páginas excede o máximo de {self.paginas_maximas}")
 
 class ArquivoService:
     def __init__(self):
         # <-- MUDANÇA AQUI: A linha que definia o caminho do Tesseract foi REMOVIDA
+        self.ocr_service = OcrService()
         
-        self.patterns = {
-            'linha_digitavel': [
-                r'(\d{5}[\.\s]*\d{5}[\.\s]*\d{5}[\.\s]*\d{6}[\.\s]*\d{5}[\.\s]*\d{6}[\.\s]*\d[\.\s]*\d{14})',
-                r'(\d{47,48})',
-            ],
-            'valor': [
-                r'(?:valor|R\$)\s*:?\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)',
-                r'R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)',
-            ],
-            'banco': [
-                r'(banco do brasil|itau|itaú|bradesco|santander|caixa|nubank)',
-            ]
-        }
-    
-    def processar_arquivo(self, arquivo_path: str, tipo_arquivo: str) -> Dict:
-        """Processa PDF ou imagem e extrai dados"""
+        # Níveis da cascata de OCR, do mais barato ao mais caro.
+        # O primeiro lê apenas dígitos em baixa resolução, suficiente para a linha digitável
+        # de PDFs limpos e screenshots; os seguintes só rodam se a extração falhar.
+        self.niveis_ocr = [
+            {
+                'nome': 'rapido',
+                'dpi': 150,
+                'lado_maximo': 1600,
+                'psm': 6,
+                'whitelist': '0123456789.',
+                'preprocessar': False
+            },
+            {
+                'nome': 'padrao',
+                'dpi': 200,
+                'lado_maximo': 2400,
+                'psm': 6,
+                'whitelist': None,
+                'preprocessar': False
+            },
+            {
+                'nome': 'completo',
+                'dpi': 300,
+                'lado_maximo': None,
+                'psm': 3,
+                'whitelist': None,
+                'preprocessar': True
+            }
+        ]
+        
+        # Páginas processadas em paralelo no modo de múltiplos boletos
+        self.max_paginas_paralelas = int(os.getenv('OCR_PAGINAS_PARALELAS', os.cpu_count() or 2))
+    
+    def processar_arquivo(self, arquivo: Union[str, bytes, Image.Image], tipo_arquivo: str,
+                          orcamento: OrcamentoJob = None) -> Dict:
+        """Processa PDF ou imagem em níveis crescentes de custo até extrair dados válidos.
+        
+        `arquivo` pode ser o caminho em disco, o conteúdo já em memória (bytes) ou, para imagens,
+        a imagem já aberta com abrir_imagem no mesmo orçamento.
+        `orcamento` limita os recursos do job; por padrão usa os limites do ambiente (OCR_*).
+        """
+        orcamento = orcamento or OrcamentoJob()
         try:
-            if 'pdf' in tipo_arquivo.lower(): # <-- MUDANÇA AQUI: Lógica mais flexível para 'application/pdf'
-                texto_extraido = self._extrair_texto_pdf(arquivo_path)
-            else:  # imagem
-                texto_extraido = self._extrair_texto_imagem(arquivo_path)
+            melhor_tentativa = self._executar_cascata(self._niveis_extracao(arquivo, tipo_arquivo, orcamento))
             
-            dados_extraidos = self._extrair_dados_boleto(texto_extraido)
+            if melhor_tentativa is None or not melhor_tentativa['texto_extraido'].strip():
+                raise Exception("Não foi possível extrair texto do arquivo, mesmo com OCR.")
             
             return {
                 'sucesso': True,
-                'texto_extraido': texto_extraido,
-                'dados_extraidos': dados_extraidos,
+                'texto_extraido': melhor_tentativa['texto_extraido'],
+                'dados_extraidos': melhor_tentativa['dados_extraidos'],
+                'nivel_extracao': melhor_tentativa['nivel'],
+                'orcamento_excedido': None,
                 'erro': None
             }
             
+        except OrcamentoExcedido as e:
+            return {
+                'sucesso': False,
+                'texto_extraido': '',
+                'dados_extraidos': {},
+                'nivel_extracao': None,
+                'orcamento_excedido': e.recurso,
+                'erro': str(e)
+            }
         except Exception as e:
             return {
                 'sucesso': False,
                 'texto_extraido': '',
                 'dados_extraidos': {},
+                'nivel_extracao': None,
+                'orcamento_excedido': None,
                 'erro': str(e)
             }
     
-    # <-- MUDANÇA AQUI: Função de PDF totalmente substituída
-    def _extrair_texto_pdf(self, pdf_path: str) -> str:
-        """Extrai texto de PDF, usando OCR se necessário para PDFs escaneados."""
-        texto_final = ""
+    def processar_arquivo_multiplo(self, arquivo: Union[str, bytes], tipo_arquivo: str,
+                                   orcamento: OrcamentoJob = None) -> Dict:
+        """
+        Extrai todos os boletos do arquivo (lotes com um boleto por página ou vários por página).
+        Cada página do PDF passa pela própria cascata de níveis, com as páginas em paralelo.
+        """
+        orcamento = orcamento or OrcamentoJob(paginas_maximas=SecurityService.MAX_PDF_PAGES_BATCH)
+        try:
+            if 'pdf' in tipo_arquivo.lower():
+                # Uma cópia em disco para todas as páginas: convert_from_bytes gravaria o PDF inteiro
+                # num arquivo temporário a cada rasterização
+                with self._copia_em_disco(arquivo, '.pdf') as caminho:
+                    textos_paginas, tamanho_pagina = self._ler_pdf(caminho, orcamento)
+                    trabalhadores = max(1, min(len(textos_paginas), self.max_paginas_paralelas))
+                    
+                    def processar_pagina(numero_e_texto):
+                        numero, texto_pagina = numero_e_texto
+                        niveis = self._niveis_pagina_pdf(caminho, numero, texto_pagina, tamanho_pagina,
+                                                         trabalhadores, orcamento)
+                        return numero, self._executar_cascata(niveis, multiplo=True)
+                    
+                    # OCR e rasterização rodam em processos externos (ou liberam o GIL no tesserocr),
+                    # então threads bastam para ocupar os núcleos
+                    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+                        tentativas = list(executor.map(processar_pagina, enumerate(textos_paginas, start=1)))
+            else:  # imagem: uma única "página"
+                imagem = self.abrir_imagem(arquivo, orcamento)
+                niveis = ((nivel['nome'], self._ocr_imagem(imagem, nivel, orcamento)) for nivel in self.niveis_ocr)
+                tentativas = [(1, self._executar_cascata(niveis, multiplo=True))]
+            
+            boletos = []
+            linhas_vistas = set()
+            for numero, tentativa in tentativas:
+                if tentativa is None:
+                    continue
+                for dados in tentativa['dados_extraidos']:
+                    # Mesmo boleto repetido (ex.: recibo do pagador + ficha de compensação)
+                    if dados['linha_digitavel'] in linhas_vistas:
+                        continue
+                    linhas_vistas.add(dados['linha_digitavel'])
+                    boletos.append({
+                        'pagina': numero,
+                        'nivel_extracao': tentativa['nivel'],
+                        'dados_extraidos': dados
+                    })
+            
+            return {
+                'sucesso': True,
+                'paginas': len(tentativas),
+                'boletos': boletos,
+                'orcamento_excedido': None,
+                'erro': None
+            }
+            
+        except OrcamentoExcedido as e:
+            return {'sucesso': False, 'paginas': 0, 'boletos': [], 'orcamento_excedido': e.recurso, 'erro': str(e)}
+        except Exception as e:
+            return {'sucesso': False, 'paginas': 0, 'boletos': [], 'orcamento_excedido': None, 'erro': str(e)}
+    
+    def _executar_cascata(self, niveis: Iterator[Tuple[str, str]], multiplo: bool = False) -> Optional[Dict]:
+        """Percorre os níveis até a extração ser suficiente e retorna a melhor tentativa"""
+        melhor_tentativa = None
+        
+        for nivel, texto_extraido in niveis:
+            if multiplo:
+                dados_extraidos = self._extrair_todos_boletos(texto_extraido)
+                pontuacao = (sum(1 for d in dados_extraidos if validar_linha_digitavel(d['linha_digitavel'])),
+                             len(dados_extraidos))
+                suficiente = bool(dados_extraidos) and pontuacao[0] == len(dados_extraidos)
+            else:
+                dados_extraidos = self._extrair_dados_boleto(texto_extraido)
+                pontuacao = self._pontuar_extracao(dados_extraidos)
+                suficiente = self._extracao_suficiente(dados_extraidos)
+            
+            tentativa = {
+                'nivel': nivel,
+                'texto_extraido': texto_extraido,
+                'dados_extraidos': dados_extraidos,
+                'pontuacao': pontuacao
+            }
+            if melhor_tentativa is None or tentativa['pontuacao'] > melhor_tentativa['pontuacao']:
+                melhor_tentativa = tentativa
+            
+            # Só escala para o próximo nível se faltar dado ou a linha não fechar os dígitos verificadores
+            if suficiente:
+                break
+        
+        return melhor_tentativa
+    
+    def _niveis_extracao(self, arquivo: Union[str, bytes], tipo_arquivo: str,
+                         orcamento: OrcamentoJob) -> Iterator[Tuple[str, str]]:
+        """Gera (nível, texto) sob demanda: cada nível só é executado se o anterior não bastar"""
+        if 'pdf' in tipo_arquivo.lower():
+            # Nível zero: camada de texto do PDF, sem OCR
+            textos_paginas, tamanho_pagina = self._ler_pdf(arquivo, orcamento)
+            texto_pdf = "".join(texto + "\n" for texto in textos_paginas)
+            if texto_pdf.strip():
+                yield 'texto_pdf', texto_pdf
+            
+            for nivel in self.niveis_ocr:
+                self._verificar_rasterizacao(nivel, tamanho_pagina, len(textos_paginas), orcamento)
+                yield nivel['nome'], self._ocr_pdf(arquivo, nivel, orcamento)
+        else:  # imagem
+            imagem = arquivo if isinstance(arquivo, Image.Image) else self.abrir_imagem(arquivo, orcamento)
+            for nivel in self.niveis_ocr:
+                yield nivel['nome'], self._ocr_imagem(imagem, nivel, orcamento)
+    
+    def _niveis_pagina_pdf(self, pdf: str, numero: int, texto_pagina: str,
+                           tamanho_pagina: Tuple[float, float], simultaneas: int,
+                           orcamento: OrcamentoJob) -> Iterator[Tuple[str, str]]:
+        """
+        Cascata de uma única página do PDF. Se a camada de texto não bastar, a página é
+        rasterizada uma vez, na maior resolução dos níveis, e reduzida para os níveis menores.
+        """
+        if texto_pagina.strip():
+            yield 'texto_pdf', texto_pagina
+        
+        dpi_maximo = max(nivel['dpi'] for nivel in self.niveis_ocr)
+        self._verificar_rasterizacao({'dpi': dpi_maximo}, tamanho_pagina, simultaneas, orcamento)
+        pagina = self._rasterizar(pdf, dpi_maximo, orcamento, pagina=numero)[0]
+        
+        for nivel in self.niveis_ocr:
+            imagem = pagina
+            if nivel['dpi'] < dpi_maximo:
+                escala = nivel['dpi'] / dpi_maximo
+                imagem = pagina.resize((max(1, int(pagina.width * escala)), max(1, int(pagina.height * escala))),
+                                       Image.LANCZOS)
+            yield nivel['nome'], self._ocr_imagem(imagem, nivel, orcamento)
+    
+    def _verificar_rasterizacao(self, nivel: Dict, tamanho_pagina: Tuple[float, float], paginas: int,
+                                orcamento: OrcamentoJob):
+        """Estimativa da rasterização (tons de cinza, 1 byte/pixel) antes de chamar o poppler"""
+        largura = int(tamanho_pagina[0] / 72 * nivel['dpi'])
+        altura = int(tamanho_pagina[1] / 72 * nivel['dpi'])
+        orcamento.verificar_imagem(largura, altura, bandas=1, quantidade=paginas)
+    
+    def _extracao_suficiente(self, dados: Dict) -> bool:
+        """Extração aceita: sem campos obrigatórios faltando e linha digitável com DVs corretos"""
+        validacao = self.validar_dados_extraidos(dados)
+        return validacao['valido'] and validar_linha_digitavel(dados.get('linha_digitavel', ''))
+    
+    def _pontuar_extracao(self, dados: Dict) -> Tuple[bool, float]:
+        """Critério para escolher a melhor tentativa quando nenhum nível é suficiente"""
+        validacao = self.validar_dados_extraidos(dados)
+        return validar_linha_digitavel(dados.get('linha_digitavel', '')), validacao['confianca']
+    
+    @contextmanager
+    def _copia_em_disco(self, arquivo: Union[str, bytes], sufixo: str) -> Iterator[str]:
+        """Caminho do arquivo: o próprio, se já está em disco, ou uma cópia temporária do conteúdo"""
+        if not isinstance(arquivo, (bytes, bytearray)):
+            yield arquivo
+            return
+        fd, caminho = tempfile.mkstemp(prefix='boleto_', suffix=sufixo)
         try:
-            # 1. Tenta extrair texto diretamente com PyPDF2
-            with open(pdf_path, 'rb') as file:
+            with os.fdopen(fd, 'wb') as destino:
+                destino.write(arquivo)
+            yield caminho
+        finally:
+            os.remove(caminho)
+    
+    def _abrir_fluxo(self, arquivo: Union[str, bytes]) -> BinaryIO:
+        """Fluxo binário sobre o conteúdo em memória ou sobre o arquivo em disco"""
+        if isinstance(arquivo, (bytes, bytearray)):
+            return io.BytesIO(arquivo)
+        return open(arquivo, 'rb')
+    
+    def _ler_pdf(self, pdf: Union[str, bytes], orcamento: OrcamentoJob) -> Tuple[List[str], Tuple[float, float]]:
+        """
+        Confere o número de páginas e extrai a camada de texto do PDF com PyPDF2.
+        Retorna (texto de cada página, maior tamanho de página em pontos).
+        """
+        textos_paginas = []
+        try:
+            with self._abrir_fluxo(pdf) as file:
                 pdf_reader = PyPDF2.PdfReader(file)
+                paginas = len(pdf_reader.pages)
+                orcamento.verificar_paginas(paginas)
+                
+                largura_maxima, altura_maxima = 0.0, 0.0
                 for page in pdf_reader.pages:
-                    texto_final += page.extract_text() + "\n"
-            
-            # 2. Se o texto for muito curto, aciona o OCR com Tesseract
-            if len(texto_final.strip()) < 100:
-                texto_ocr = ""
-                # Converte o PDF em uma lista de imagens
-                imagens_pdf = convert_from_path(pdf_path)
-                for imagem in imagens_pdf:
-                    # Aplica o OCR em cada página/imagem
-                    texto_ocr += pytesseract.image_to_string(imagem, lang='por') + "\n"
-                texto_final = texto_ocr
-
-            if not texto_final.strip():
-                 raise Exception("Não foi possível extrair texto do PDF, mesmo com OCR.")
-
-            return texto_final
+                    largura_maxima = max(largura_maxima, float(page.mediabox.width))
+                    altura_maxima = max(altura_maxima, float(page.mediabox.height))
+                    textos_paginas.append(page.extract_text() or "")
+                    orcamento.verificar()
+            return textos_paginas, (largura_maxima, altura_maxima)
+        except OrcamentoExcedido:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao processar PDF: {str(e)}")
-
-    def _extrair_texto_imagem(self, imagem_path: str) -> str:
-        """OCR em imagem"""
+    
+    def _ocr_pdf(self, pdf: Union[str, bytes], nivel: Dict, orcamento: OrcamentoJob) -> str:
+        """Rasteriza o PDF na resolução do nível e aplica OCR"""
+        texto_ocr = ""
+        for imagem in self._rasterizar(pdf, nivel['dpi'], orcamento):
+            texto_ocr += self._ocr_imagem(imagem, nivel, orcamento) + "\n"
+        return texto_ocr
+    
+    def _rasterizar(self, pdf: Union[str, bytes], dpi: int, orcamento: OrcamentoJob,
+                    pagina: int = None) -> List[Image.Image]:
+        """Páginas do PDF (ou só a indicada) em tons de cinza na resolução pedida"""
         try:
-            image = Image.open(imagem_path)
-            
+            opcoes = {
+                'dpi': dpi,
+                'grayscale': True,
+                'first_page': pagina,
+                'last_page': pagina or orcamento.paginas_maximas,
+                'timeout': orcamento.timeout_ocr()
+            }
+            if isinstance(pdf, (bytes, bytearray)):
+                return convert_from_bytes(pdf, **opcoes)
+            return convert_from_path(pdf, **opcoes)
+        except OrcamentoExcedido:
+            raise
+        except PDFPopplerTimeoutError:
+            raise OrcamentoExcedido('tempo', "Rasterização do PDF excedeu o tempo limite")
+        except Exception as e:
+            raise Exception(f"Erro ao processar PDF: {str(e)}")
+    
+    def abrir_imagem(self, imagem: Union[str, bytes], orcamento: OrcamentoJob) -> Image.Image:
+        """Abre a imagem uma única vez para todos os níveis (e para o hash de duplicatas), dentro do orçamento"""
+        try:
+            orcamento.verificar()
+            with self._abrir_fluxo(imagem) as fluxo:
+                image = Image.open(fluxo)
+                # Image.open só lê o header: confere o orçamento antes de decodificar
+                orcamento.verificar_imagem(image.width, image.height, bandas=max(3, len(image.getbands())))
+                image.load()
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            orcamento.verificar()
+            return image
+        except OrcamentoExcedido:
+            raise
+        except Exception as e:
+            raise Exception(f"Erro no OCR: {str(e)}")
+    
+    def _ocr_imagem(self, image: Image.Image, nivel: Dict, orcamento: OrcamentoJob) -> str:
+        """OCR em imagem com os parâmetros do nível"""
+        try:
+            lado_maximo = nivel['lado_maximo']
+            if lado_maximo and max(image.size) > lado_maximo:
+                image = image.copy()
+                image.thumbnail((lado_maximo, lado_maximo))
             
-            texto = pytesseract.image_to_string(image, lang='por')
+            if nivel['preprocessar']:
+                image = ImageOps.autocontrast(ImageOps.grayscale(image))
+                image = image.filter(ImageFilter.SHARPEN)
             
-            return texto
+            return self.ocr_service.reconhecer(image, psm=nivel['psm'], whitelist=nivel['whitelist'],
+                                               timeout=orcamento.timeout_ocr())
+        except OrcamentoExcedido:
+            raise
+        except TimeoutError:
+            raise OrcamentoExcedido('tempo', "OCR excedeu o tempo limite")
         except Exception as e:
             raise Exception(f"Erro no OCR: {str(e)}")
     
     def _extrair_dados_boleto(self, texto: str) -> Dict:
         """Extrai dados estruturados do texto"""
-        dados = {}
-        texto_limpo = texto.lower().replace('\n', ' ').replace('\r', ' ')
-        
-        linha = self._extrair_com_patterns(texto, self.patterns['linha_digitavel'])
-        if linha:
-            dados['linha_digitavel'] = re.sub(r'[^\d]', '', linha)
-            if len(dados['linha_digitavel']) >= 3:
-                dados['codigo_banco'] = int(dados['linha_digitavel'][:3])
-        
-        valor_str = self._extrair_com_patterns(texto, self.patterns['valor'])
-        if valor_str:
-            dados['valor'] = self._converter_valor(valor_str)
-        
-        banco = self._extrair_banco(texto_limpo)
-        dados['banco'] = banco if banco else 'Banco não identificado'
-        
-        dados.setdefault('agencia', 1)
-        dados.setdefault('codigo_banco', 1)
-        dados.setdefault('valor', 0.0)
-        
-        return dados
-    
-    def _extrair_com_patterns(self, texto: str, patterns: List[str]) -> Optional[str]:
-        """Extrai usando lista de padrões regex"""
-        for pattern in patterns:
-            match = re.search(pattern, texto, re.IGNORECASE)
-            if match:
-                # Se o padrão tiver grupos de captura, retorna o primeiro, senão, o match completo
-                return match.group(1) if match.groups() else match.group(0)
-        return None
-    
-    def _converter_valor(self, valor_str: str) -> float:
-        """Converte string de valor para float"""
-        try:
-            # Remove tudo que não for dígito, vírgula ou ponto
-            valor_limpo = re.sub(r'[^\d,.]', '', valor_str)
-            # Lida com casos como '1.234,56'
-            if '.' in valor_limpo and ',' in valor_limpo:
-                valor_limpo = valor_limpo.replace('.', '')
-            valor_limpo = valor_limpo.replace(',', '.')
-            return float(valor_limpo)
-        except:
-            return 0.0
-    
-    def _extrair_banco(self, texto_limpo: str) -> Optional[str]:
-        """Identifica o banco"""
-        bancos = {
-            'banco do brasil': 'Banco do Brasil',
-            'itau': 'Itaú', 'itaú': 'Itaú', 
-            'bradesco': 'Bradesco',
-            'santander': 'Santander',
-            'caixa': 'Caixa Econômica',
-            'nubank': 'NU Pagamentos S.A. – Nubank'
-        }
-        
-        for key, nome in bancos.items():
-            if key in texto_limpo:
-                return nome
-        return None
+        return extrair_campos(texto)
+    
+    def _extrair_todos_boletos(self, texto: str) -> List[Dict]:
+        """Extrai cada boleto presente no texto, segmentando-o ao redor de cada linha digitável"""
+        return extrair_campos_por_boleto(texto)
     
     def validar_dados_extraidos(self, dados: Dict) -> Dict:
         """Valida dados extraídos"""
@@ -1,13 +1,19 @@
 import bcrypt
 import re
-from datetime import datetime, timedelta
 from typing import Tuple, Dict
 from flask import request
 
+from app.utils.contadores import contadores
+
 class AuthSecurityService:
-    def __init__(self):
-        # Cache simples para tentativas de login (usar Redis em produção)
-        self.failed_attempts = {}
+    MAX_TENTATIVAS = 5
+    JANELA_BLOQUEIO = 900  # 15 minutos
+
+    def __init__(self, armazenamento=None):
+        # Tentativas falhas num contador compartilhado por todos os workers (CONTADORES_BACKEND),
+        # que expira 15 minutos depois da primeira tentativa da janela. Ao atingir o limite, o
+        # bloqueio vale 15 minutos a partir da tentativa que o causou
+        self.contadores = armazenamento or contadores
         self.blocked_ips = {}
     
     def validate_password_strength(self, password: str) -> Tuple[bool, str]:
@@ -39,65 +45,24 @@ class AuthSecurityService:
     
     def check_brute_force(self, identifier: str) -> Tuple[bool, str, int]:
         """Verifica tentativas de força bruta"""
-        now = datetime.now()
-        
-        # Limpar tentativas antigas (mais de 15 minutos)
-        self._cleanup_old_attempts(now)
-        
-        if identifier not in self.failed_attempts:
-            return True, "OK", 0
-        
-        attempts = self.failed_attempts[identifier]
-        attempt_count = len(attempts)
-        
         # Verificar se está bloqueado
-        if attempt_count >= 5:
-            last_attempt = max(attempts)
-            time_diff = (now - last_attempt).total_seconds()
-            
-            if time_diff < 900:  # 15 minutos
-                remaining = 900 - int(time_diff)
-                return False, f"Bloqueado por {remaining//60}m {remaining%60}s", attempt_count
-            else:
-                # Resetar após 15 minutos
-                del self.failed_attempts[identifier]
-                return True, "OK", 0
+        remaining = int(self.contadores.ttl(f"bloqueio:{identifier}"))
+        if remaining > 0:
+            return False, f"Bloqueado por {remaining//60}m {remaining%60}s", self.MAX_TENTATIVAS
         
-        return True, "OK", attempt_count
+        return True, "OK", int(self.contadores.get(f"login:{identifier}") or 0)
     
     def register_failed_attempt(self, identifier: str):
         """Registra tentativa falhada"""
-        now = datetime.now()
-        
-        if identifier not in self.failed_attempts:
-            self.failed_attempts[identifier] = []
-        
-        self.failed_attempts[identifier].append(now)
-        
-        # Manter apenas as últimas 10 tentativas
-        if len(self.failed_attempts[identifier]) > 10:
-            self.failed_attempts[identifier] = self.failed_attempts[identifier][-10:]
+        tentativas = self.contadores.incrby(f"login:{identifier}", 1, ex=self.JANELA_BLOQUEIO)
+        if tentativas >= self.MAX_TENTATIVAS:
+            self.contadores.set(f"bloqueio:{identifier}", 1, ex=self.JANELA_BLOQUEIO)
+            self.contadores.delete(f"login:{identifier}")
     
     def register_successful_login(self, identifier: str):
         """Limpa tentativas após login bem-sucedido"""
-        if identifier in self.failed_attempts:
-            del self.failed_attempts[identifier]
-    
-    def _cleanup_old_attempts(self, now: datetime):
-        """Remove tentativas antigas"""
-        cutoff = now - timedelta(minutes=15)
-        
-        for identifier in list(self.failed_attempts.keys()):
-            # Filtrar tentativas recentes
-            recent_attempts = [
-                attempt for attempt in self.failed_attempts[identifier]
-                if attempt > cutoff
-            ]
-            
-            if recent_attempts:
-                self.failed_attempts[identifier] = recent_attempts
-            else:
-                del self.failed_attempts[identifier]
+        self.contadores.delete(f"login:{identifier}")
+        self.contadores.delete(f"bloqueio:{identifier}")
     
     def get_client_ip(self) -> str:
         """Obtém IP real do cliente"""
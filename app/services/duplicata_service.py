@@ -0,0 +1,105 @@
+import io
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple, Union
+
+from PIL import Image
+
+from app import db
+from app.models.boleto import HashImagemBoleto
+from app.utils.hash_perceptual import calcular_hashes, distancia_detalhada, distancia_hamming
+
+
+def _com_sinal(valor: int) -> int:
+    """Hash de 64 bits sem sinal -> inteiro com sinal (cabe no BIGINT/INTEGER do banco)"""
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+def _sem_sinal(valor: int) -> int:
+    return valor + (1 << 64) if valor < 0 else valor
+
+
+class DuplicataService:
+    """
+    Reconhece fotos novas de um boleto já analisado pelo mesmo usuário (ou IP) e devolve a
+    extração guardada, evitando rodar o OCR de novo.
+
+    Boletos do mesmo emissor têm o mesmo layout e hashes de 64 bits muito parecidos. Por isso
+    dHash e pHash só selecionam candidatos, que precisam ser confirmados pelo dHash detalhado
+    (64x64), e a busca fica restrita ao mesmo dono e a uma janela curta. Na dúvida o arquivo
+    segue para o OCR normalmente.
+    """
+
+    def __init__(self):
+        self.ativo = os.getenv('DUPLICATAS_ATIVO', '1') == '1'
+        self.distancia_maxima = int(os.getenv('DUPLICATAS_DISTANCIA_MAXIMA', 6))
+        # Fração máxima de bits diferentes no dHash detalhado
+        self.distancia_detalhada_maxima = float(os.getenv('DUPLICATAS_DISTANCIA_DETALHADA', 0.2))
+        self.janela = timedelta(minutes=int(os.getenv('DUPLICATAS_JANELA_MINUTOS', 60)))
+        # Tamanho máximo do índice; as entradas mais antigas saem primeiro
+        self.max_entradas = int(os.getenv('DUPLICATAS_MAX_ENTRADAS', 10000))
+        # Candidatos comparados por busca (os mais recentes do dono)
+        self.max_candidatos = int(os.getenv('DUPLICATAS_MAX_CANDIDATOS', 50))
+
+    def calcular_hashes(self, imagem: Union[Image.Image, bytes, str]) -> Optional[Tuple[int, int, bytes]]:
+        """
+        (dhash, phash, dhash_detalhado) do upload de imagem, ou None se não for possível calcular.
+        Nas rotas, recebe a imagem já aberta por ArquivoService.abrir_imagem (decodificada dentro do
+        orçamento do job e reaproveitada pelo OCR).
+        """
+        if not self.ativo:
+            return None
+        try:
+            if isinstance(imagem, Image.Image):
+                return calcular_hashes(imagem)
+            with Image.open(io.BytesIO(imagem) if isinstance(imagem, bytes) else imagem) as img:
+                return calcular_hashes(img)
+        except Exception as e:
+            print(f"Erro ao calcular hash perceptual: {e}")
+            return None
+
+    def buscar(self, dono: str, hashes: Tuple[int, int, bytes]) -> Optional[HashImagemBoleto]:
+        """Imagem mais parecida do mesmo dono dentro da janela, se estiver abaixo dos limites"""
+        dhash, phash, detalhado = hashes
+        candidatos = HashImagemBoleto.query.filter(
+            HashImagemBoleto.dono == dono,
+            HashImagemBoleto.created_at >= datetime.utcnow() - self.janela
+        ).order_by(HashImagemBoleto.created_at.desc()).limit(self.max_candidatos).all()
+
+        melhor, menor_distancia = None, None
+        for candidato in candidatos:
+            distancia_d = distancia_hamming(dhash, _sem_sinal(candidato.dhash))
+            distancia_p = distancia_hamming(phash, _sem_sinal(candidato.phash))
+            if distancia_d > self.distancia_maxima or distancia_p > self.distancia_maxima:
+                continue
+            distancia = distancia_detalhada(detalhado, candidato.dhash_detalhado)
+            if distancia > self.distancia_detalhada_maxima:
+                continue
+            if menor_distancia is None or distancia < menor_distancia:
+                melhor, menor_distancia = candidato, distancia
+        return melhor
+
+    def registrar(self, dono: str, hashes: Tuple[int, int, bytes], analise_id: int,
+                  dados_extraidos: Dict, nivel_extracao: str):
+        """Adiciona a imagem ao índice (na sessão atual) e descarta as entradas além do limite"""
+        dhash, phash, detalhado = hashes
+        db.session.add(HashImagemBoleto(
+            analise_id=analise_id,
+            dono=dono,
+            dhash=_com_sinal(dhash),
+            phash=_com_sinal(phash),
+            dhash_detalhado=detalhado,
+            dados_extraidos=dados_extraidos,
+            nivel_extracao=nivel_extracao
+        ))
+
+        # Ids crescem com a inserção: tudo abaixo de (maior id - limite) é o excedente mais antigo
+        maior_id = db.session.query(db.func.max(HashImagemBoleto.id)).scalar() or 0
+        if maior_id > self.max_entradas:
+            HashImagemBoleto.query.filter(
+                HashImagemBoleto.id <= maior_id - self.max_entradas
+            ).delete(synchronize_session=False)
+
+    @staticmethod
+    def dono(user_id: Optional[int], client_ip: str) -> str:
+        return f'u:{user_id}' if user_id else f'ip:{client_ip}'
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import event, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models.boleto import AnaliseBoleto
+from app.models.estatisticas import ContadorAnalises, RollupAnalisesHora, RollupAnalisesDia
+from app.utils.linha_digitavel import BANCOS_POR_CODIGO
+
+def _insert(conexao):
+    return postgresql.insert if conexao.dialect.name == 'postgresql' else sqlite.insert
+
+def _chaves_analise(analise: AnaliseBoleto):
+    """(dimensao, chave) de cada contador afetado pela análise"""
+    return (
+        ('banco', str(analise.codigo_banco)),
+        ('usuario', str(analise.user_id) if analise.user_id else 'anonimo'),
+    )
+
+def _inicio_intervalo(momento: datetime, modelo) -> datetime:
+    if modelo is RollupAnalisesDia:
+        return momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+def _upsert_somando(conexao, modelo, chaves: List[str], linhas: List[Dict]):
+    """Insere as linhas ou, se a chave já existe, soma as demais colunas às atuais"""
+    stmt = _insert(conexao)(modelo).values(linhas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=chaves,
+        set_={coluna: getattr(modelo, coluna) + getattr(stmt.excluded, coluna)
+              for coluna in linhas[0] if coluna not in chaves}
+    )
+    conexao.execute(stmt)
+
+def _apos_flush(session, contexto):
+    """
+    Soma as análises novas aos contadores e aos rollups por hora e por dia, com um upsert
+    por tabela, dentro da transação do flush
+    """
+    novas = [objeto for objeto in session.new if isinstance(objeto, AnaliseBoleto)]
+    if not novas:
+        return
+
+    contadores = {}
+    rollups = {RollupAnalisesHora: {}, RollupAnalisesDia: {}}
+    for analise in novas:
+        for dimensao, chave in _chaves_analise(analise):
+            total, soma = contadores.get((dimensao, chave, analise.resultado), (0, 0.0))
+            contadores[(dimensao, chave, analise.resultado)] = (total + 1, soma + analise.confianca)
+        for modelo, deltas in rollups.items():
+            chave = (_inicio_intervalo(analise.created_at, modelo), analise.codigo_banco)
+            total, falsos, soma = deltas.get(chave, (0, 0, 0.0))
+            deltas[chave] = (total + 1, falsos + (analise.resultado == 'Falso'), soma + analise.confianca)
+
+    conexao = session.connection()
+    _upsert_somando(conexao, ContadorAnalises, ['dimensao', 'chave', 'resultado'], [
+        {'dimensao': d, 'chave': c, 'resultado': r, 'total': total, 'soma_confianca': soma}
+        for (d, c, r), (total, soma) in contadores.items()
+    ])
+    for modelo, deltas in rollups.items():
+        _upsert_somando(conexao, modelo, ['inicio', 'codigo_banco'], [
+            {'inicio': inicio, 'codigo_banco': banco, 'total': total, 'falsos': falsos, 'soma_confianca': soma}
+            for (inicio, banco), (total, falsos, soma) in deltas.items()
+        ])
+
+# Todo caminho que grava análises (rotas, lote .zip, analisar_lote.py) passa pelo flush da sessão
+event.listen(db.session, 'after_flush', _apos_flush)
+
+class EstatisticasService:
+    """Estatísticas das análises a partir dos contadores, com cache curto para o polling do dashboard"""
+
+    def __init__(self):
+        self.ttl_cache = float(os.getenv('STATS_CACHE_TTL', 5))
+        self.max_usuarios = int(os.getenv('STATS_TOP_USUARIOS', 10))
+        self._cache = None  # (expira, resumo)
+        self._lock = threading.Lock()
+
+    def resumo(self) -> Dict:
+        """Totais, por resultado, por banco e os usuários com mais análises"""
+        agora = time.monotonic()
+        with self._lock:
+            if self._cache and self._cache[0] > agora:
+                return self._cache[1]
+
+        por_banco = {}
+        por_resultado = {}
+        for chave, resultado, total, soma in db.session.query(
+            ContadorAnalises.chave, ContadorAnalises.resultado, ContadorAnalises.total, ContadorAnalises.soma_confianca
+        ).filter(ContadorAnalises.dimensao == 'banco').all():
+            codigo = int(chave)
+            banco = por_banco.setdefault(codigo, {
+                'codigo_banco': codigo,
+                'banco': BANCOS_POR_CODIGO.get(codigo, 'Banco não identificado'),
+                'total': 0, 'verdadeiros': 0, 'falsos': 0
+            })
+            banco['total'] += total
+            banco['verdadeiros' if resultado == 'Verdadeiro' else 'falsos'] += total
+            acumulado = por_resultado.setdefault(resultado, [0, 0.0])
+            acumulado[0] += total
+            acumulado[1] += soma
+
+        total_analises = sum(total for total, _ in por_resultado.values())
+        verdadeiros = por_resultado.get('Verdadeiro', [0])[0]
+        falsos = por_resultado.get('Falso', [0])[0]
+
+        resumo = {
+            'total_analises': total_analises,
+            'verdadeiros': verdadeiros,
+            'falsos': falsos,
+            'porcentagem_verdadeiros': round((verdadeiros / total_analises * 100) if total_analises > 0 else 0, 2),
+            'porcentagem_falsos': round((falsos / total_analises * 100) if total_analises > 0 else 0, 2),
+            'por_resultado': {
+                resultado: {'total': total, 'confianca_media': round(soma / total, 4) if total else 0}
+                for resultado, (total, soma) in por_resultado.items()
+            },
+            'por_banco': sorted(por_banco.values(), key=lambda banco: banco['total'], reverse=True),
+            'top_usuarios': self._top_usuarios()
+        }
+
+        with self._lock:
+            self._cache = (agora + self.ttl_cache, resumo)
+        return resumo
+
+    def _top_usuarios(self) -> List[Dict]:
+        total = db.func.sum(ContadorAnalises.total)
+        linhas = db.session.query(ContadorAnalises.chave, total).filter(
+            ContadorAnalises.dimensao == 'usuario', ContadorAnalises.chave != 'anonimo'
+        ).group_by(ContadorAnalises.chave).order_by(total.desc()).limit(self.max_usuarios).all()
+        return [{'user_id': int(chave), 'total': total} for chave, total in linhas]
+
+    def resumo_usuario(self, user_id: Optional[int]) -> Dict:
+        """Totais de um usuário por resultado (None: análises anônimas)"""
+        linhas = db.session.query(ContadorAnalises.resultado, ContadorAnalises.total).filter(
+            ContadorAnalises.dimensao == 'usuario',
+            ContadorAnalises.chave == (str(user_id) if user_id else 'anonimo')
+        ).all()
+        por_resultado = dict(linhas)
+        return {
+            'user_id': user_id,
+            'total_analises': sum(por_resultado.values()),
+            'verdadeiros': por_resultado.get('Verdadeiro', 0),
+            'falsos': por_resultado.get('Falso', 0)
+        }
+
+    def recalcular(self):
+        """Refaz contadores e rollups a partir de analises_boleto (carga inicial; rodar sem tráfego)"""
+        ContadorAnalises.query.delete()
+        colunas = ['dimensao', 'chave', 'resultado', 'total', 'soma_confianca']
+        dimensoes = (
+            ('banco', db.cast(AnaliseBoleto.codigo_banco, db.String)),
+            ('usuario', db.func.coalesce(db.cast(AnaliseBoleto.user_id, db.String), 'anonimo')),
+        )
+        for dimensao, chave in dimensoes:
+            consulta = select(
+                literal(dimensao), chave, AnaliseBoleto.resultado,
+                db.func.count(AnaliseBoleto.id), db.func.sum(AnaliseBoleto.confianca)
+            ).group_by(chave, AnaliseBoleto.resultado)
+            db.session.execute(ContadorAnalises.__table__.insert().from_select(colunas, consulta))
+        self._recalcular_rollups()
+        db.session.commit()
+        with self._lock:
+            self._cache = None
+
+    def _recalcular_rollups(self, lote: int = 10000):
+        """
+        Rollups por hora e por dia. As análises são lidas em lotes (yield_per) e agrupadas
+        aqui, com o mesmo truncamento de horário usado na gravação.
+        """
+        for modelo in (RollupAnalisesHora, RollupAnalisesDia):
+            modelo.query.delete()
+            deltas = {}
+            linhas = db.session.query(
+                AnaliseBoleto.created_at, AnaliseBoleto.codigo_banco, AnaliseBoleto.resultado, AnaliseBoleto.confianca
+            ).filter(AnaliseBoleto.created_at.isnot(None)).execution_options(yield_per=lote)
+            for created_at, codigo_banco, resultado, confianca in linhas:
+                chave = (_inicio_intervalo(created_at, modelo), codigo_banco)
+                total, falsos, soma = deltas.get(chave, (0, 0, 0.0))
+                deltas[chave] = (total + 1, falsos + (resultado == 'Falso'), soma + confianca)
+            novas = [
+                {'inicio': inicio, 'codigo_banco': banco, 'total': total, 'falsos': falsos, 'soma_confianca': soma}
+                for (inicio, banco), (total, falsos, soma) in deltas.items()
+            ]
+            for i in range(0, len(novas), lote):
+                db.session.execute(modelo.__table__.insert(), novas[i:i + lote])
+
+    def serie_temporal(self, granularidade: str, inicio: datetime, fim: datetime,
+                       codigo_banco: Optional[int] = None) -> List[Dict]:
+        """
+        Análises, taxa de fraude (resultado Falso), confiança média e divisão por banco em
+        cada hora ou dia de [inicio, fim), lidas dos rollups. Intervalos sem análises vêm zerados.
+        """
+        modelo = RollupAnalisesHora if granularidade == 'hora' else RollupAnalisesDia
+        passo = timedelta(hours=1) if granularidade == 'hora' else timedelta(days=1)
+        inicio = _inicio_intervalo(inicio, modelo)
+
+        consulta = modelo.query.filter(modelo.inicio >= inicio, modelo.inicio < fim)
+        if codigo_banco is not None:
+            consulta = consulta.filter(modelo.codigo_banco == codigo_banco)
+        por_intervalo = {}
+        for linha in consulta.order_by(modelo.inicio).all():
+            por_intervalo.setdefault(linha.inicio, []).append(linha)
+
+        serie = []
+        atual = inicio
+        while atual < fim:
+            linhas = por_intervalo.get(atual, [])
+            total = sum(linha.total for linha in linhas)
+            falsos = sum(linha.falsos for linha in linhas)
+            soma = sum(linha.soma_confianca for linha in linhas)
+            serie.append({
+                'inicio': atual.isoformat(),
+                'total': total,
+                'falsos': falsos,
+                'taxa_fraude': round(falsos / total, 4) if total else 0,
+                'confianca_media': round(soma / total, 4) if total else None,
+                'por_banco': [
+                    {
+                        'codigo_banco': linha.codigo_banco,
+                        'banco': BANCOS_POR_CODIGO.get(linha.codigo_banco, 'Banco não identificado'),
+                        'total': linha.total,
+                        'falsos': linha.falsos
+                    }
+                    for linha in sorted(linhas, key=lambda linha: linha.total, reverse=True)
+                ]
+            })
+            atual += passo
+        return serie
@@ -0,0 +1,217 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Sequence
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.dialects import sqlite
+from app import db
+from app.models.boleto import AnaliseBoleto
+from app.models.sequencia import Sequencia
+
+class AlocadorIds:
+    """
+    Ids de analises_boleto reservados em blocos, para que a análise tenha id antes de ser gravada.
+    PostgreSQL: valores da sequência da própria tabela (compartilhada com inserts comuns).
+    SQLite: bloco reservado na tabela sequencias, numa transação curta e separada.
+    """
+
+    def __init__(self, bloco: int):
+        self.bloco = bloco
+        self._ids = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def proximo(self) -> int:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo filho (fork): os ids herdados são do pai
+                self._pid = os.getpid()
+                self._ids.clear()
+            if not self._ids:
+                self._ids.extend(self._reservar(self.bloco))
+            return self._ids.popleft()
+
+    def completar(self):
+        """Reserva mais um bloco se restar menos da metade (chamado fora das requisições)"""
+        with self._lock:
+            faltam = len(self._ids) < self.bloco // 2
+        if faltam:
+            ids = self._reservar(self.bloco)
+            with self._lock:
+                self._ids.extend(ids)
+
+    def _reservar(self, quantidade: int) -> List[int]:
+        with db.engine.begin() as conexao:
+            if conexao.dialect.name == 'postgresql':
+                return conexao.execute(text(
+                    "SELECT nextval(pg_get_serial_sequence('analises_boleto', 'id')) FROM generate_series(1, :n)"
+                ), {'n': quantidade}).scalars().all()
+
+            # Começa depois do maior id já gravado (também por processos sem o alocador)
+            livre = db.select(db.func.coalesce(db.func.max(AnaliseBoleto.id), 0) + 1).scalar_subquery()
+            stmt = sqlite.insert(Sequencia).values(nome='analises_boleto', proximo=livre + quantidade)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['nome'],
+                set_={'proximo': db.case((Sequencia.proximo > livre, Sequencia.proximo), else_=livre) + quantidade}
+            ).returning(Sequencia.proximo)
+            fim = conexao.execute(stmt).scalar_one()
+            return list(range(fim - quantidade, fim))
+
+class _Pendente:
+    __slots__ = ('objetos', 'tarefas', 'concluido', 'erro')
+
+    def __init__(self, objetos, tarefas):
+        self.objetos = objetos
+        self.tarefas = tarefas
+        self.concluido = threading.Event()
+        self.erro = None
+
+class GravacaoAnalisesService:
+    """
+    Gravação das análises. 'direta' (padrão): add + commit na requisição, um commit (e um fsync)
+    por análise. 'lote': as análises entram numa fila e uma thread as grava em commits em grupo,
+    quando o lote enche (GRAVACAO_LOTE_MAXIMO) ou o intervalo vence (GRAVACAO_INTERVALO_MS).
+    A requisição sempre espera o commit do seu lote (um fsync por lote, não por análise): a cota
+    diária (uso_diario) é somada nesse commit, e responder antes deixaria passar análises além
+    da cota e perderia as que estivessem na fila se o processo morresse.
+    """
+
+    def __init__(self):
+        self.modo = os.getenv('GRAVACAO_ANALISES', 'direta')
+        self.lote_maximo = int(os.getenv('GRAVACAO_LOTE_MAXIMO', 200))
+        self.intervalo = float(os.getenv('GRAVACAO_INTERVALO_MS', 20)) / 1000
+        self.fila_maxima = int(os.getenv('GRAVACAO_FILA_MAXIMA', 5000))
+        self.alocador = AlocadorIds(int(os.getenv('GRAVACAO_BLOCO_IDS', 100)))
+
+        self._app = None
+        self._fila = deque()
+        self._condicao = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._encerrando = False
+
+        if self.modo == 'lote':
+            # Inserts fora da fila (lotes, .zip, texto) também usam os ids reservados: sem isso o
+            # autoincremento do SQLite (maior id + 1) cairia dentro de um bloco já reservado
+            event.listen(db.session, 'before_flush', self._atribuir_ids)
+            atexit.register(self.encerrar)
+
+    def gravar(self, objetos: Sequence[db.Model], tarefas: Sequence[Callable[[], None]] = ()):
+        """
+        Grava as análises (e objetos relacionados) e roda as tarefas na mesma transação, depois
+        do flush (ex.: registrar_uso, índice de duplicatas). Ao retornar, id e created_at das
+        análises estão definidos.
+        """
+        if self.modo != 'lote':
+            db.session.add_all(objetos)
+            if tarefas:
+                db.session.flush()
+            for tarefa in tarefas:
+                tarefa()
+            db.session.commit()
+            return
+
+        agora = datetime.utcnow()
+        for objeto in objetos:
+            if isinstance(objeto, AnaliseBoleto):
+                objeto.id = objeto.id or self.alocador.proximo()
+                objeto.created_at = objeto.created_at or agora
+
+        pendente = _Pendente(list(objetos), list(tarefas))
+        with self._condicao:
+            self._app = self._app or current_app._get_current_object()
+            self._iniciar_thread()
+            # Fila cheia: a requisição espera vaga em vez de acumular memória sem limite
+            while len(self._fila) >= self.fila_maxima:
+                self._condicao.wait()
+            self._fila.append(pendente)
+            # Acorda a thread no primeiro item (começa a contar o intervalo) e com o lote cheio
+            if len(self._fila) == 1 or len(self._fila) >= self.lote_maximo:
+                self._condicao.notify_all()
+
+        pendente.concluido.wait()
+        if pendente.erro:
+            raise pendente.erro
+
+    def encerrar(self, timeout: float = 30):
+        """Grava o que estiver na fila e para a thread (registrado no atexit)"""
+        with self._condicao:
+            self._encerrando = True
+            self._condicao.notify_all()
+            thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+
+    def _iniciar_thread(self):
+        # Também depois de um fork (gunicorn --preload): a thread do processo pai não existe no filho
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._fila.clear()
+            self._thread = threading.Thread(target=self._executar, name='gravacao-analises', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._fila and not self._encerrando:
+                    self._condicao.wait()
+                if not self._fila:
+                    return
+                # Espera o lote encher até o intervalo vencer (no encerramento, grava já)
+                prazo = time.monotonic() + self.intervalo
+                while len(self._fila) < self.lote_maximo and not self._encerrando:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                lote = [self._fila.popleft() for _ in range(min(self.lote_maximo, len(self._fila)))]
+                self._condicao.notify_all()
+
+            with self._app.app_context():
+                self._gravar_lote(lote)
+                try:
+                    self.alocador.completar()
+                except Exception as e:
+                    print(f"Erro ao reservar ids de análises: {e}")
+
+    def _gravar_lote(self, lote: List[_Pendente]):
+        # Objetos continuam legíveis na requisição depois do commit (sem expirar) e da sessão fechada
+        db.session().expire_on_commit = False
+        try:
+            try:
+                self._commit(lote)
+            except Exception:
+                db.session.rollback()
+                # Um item inválido não derruba o lote inteiro: grava um a um
+                for pendente in lote:
+                    try:
+                        self._commit([pendente])
+                    except Exception as e:
+                        db.session.rollback()
+                        pendente.erro = e
+                        print(f"Erro ao gravar análise {[getattr(o, 'id', None) for o in pendente.objetos]}: {e}")
+        finally:
+            db.session.remove()
+            for pendente in lote:
+                pendente.concluido.set()
+
+    def _commit(self, lote: List[_Pendente]):
+        for pendente in lote:
+            db.session.add_all(pendente.objetos)
+        db.session.flush()
+        for pendente in lote:
+            for tarefa in pendente.tarefas:
+                tarefa()
+        db.session.commit()
+
+    def _atribuir_ids(self, session, contexto, instancias):
+        for objeto in session.new:
+            if isinstance(objeto, AnaliseBoleto) and objeto.id is None:
+                objeto.id = self.alocador.proximo()
+
+# Instância compartilhada (uma fila e uma thread de gravação por processo)
+gravacao_service = GravacaoAnalisesService()
@@ -1,48 +1,91 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, Tuple
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models.uso_diario import UsoDiario
 
 class LimitacaoService:
     def __init__(self):
         self.LIMITE_USUARIO_ANONIMO = 5
         self.LIMITE_USUARIO_LOGADO = 100
-        self.usar_redis = False
-    
+        self.DIAS_HISTORICO = 7
+
     def verificar_limite_usuario(self, user_id: int = None, ip_address: str = None) -> Tuple[bool, Dict]:
-        """Versão simplificada sem Redis"""
+        """Cota diária: uma leitura pela chave primária (dono, dia) do contador de uso"""
         if user_id:
             limite = self.LIMITE_USUARIO_LOGADO
             tipo = 'logado'
         else:
-            limite = self.LIMITE_USUARIO_ANONIMO  
+            limite = self.LIMITE_USUARIO_ANONIMO
             tipo = 'anonimo'
-        
+
+        # populate_existing: relida do banco mesmo que já esteja na sessão (rechecagem antes de gravar lotes)
+        uso = db.session.get(UsoDiario, (self.dono(user_id, ip_address), date.today()), populate_existing=True)
+        usado_hoje = uso.analises if uso else 0
+
         info = {
             'tipo_usuario': tipo,
             'limite_diario': limite,
-            'usado_hoje': 0,
-            'restante': limite,
+            'usado_hoje': usado_hoje,
+            'restante': max(0, limite - usado_hoje),
             'reset_em': self._proximo_reset()
         }
-        
-        return True, info
-    
+
+        return usado_hoje < limite, info
+
+    def registrar_uso(self, user_id: int = None, ip_address: str = None, quantidade: int = 1):
+        """
+        Soma análises ao contador do dia com um upsert atômico. Roda na sessão atual:
+        é gravado no mesmo commit das análises.
+        """
+        if quantidade <= 0:
+            return
+
+        insert = postgresql.insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+        stmt = insert(UsoDiario).values(dono=self.dono(user_id, ip_address), dia=date.today(), analises=quantidade)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['dono', 'dia'],
+            set_={'analises': UsoDiario.analises + stmt.excluded.analises}
+        )
+        db.session.execute(stmt)
+
     def _proximo_reset(self) -> str:
         amanha = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
         return amanha.isoformat()
-    
+
     def verificar_qualidade_arquivo(self, tamanho_arquivo: int, tipo_arquivo: str) -> Tuple[bool, str]:
         MAX_SIZE = 10 * 1024 * 1024
         if tamanho_arquivo > MAX_SIZE:
             return False, "Arquivo muito grande"
         return True, "Arquivo válido"
-    
+
     def get_client_ip(self):
         from flask import request
         return request.environ.get('REMOTE_ADDR', '127.0.0.1')
-    
-    def obter_estatisticas_uso(self, user_id: int = None) -> Dict:
+
+    def obter_estatisticas_uso(self, user_id: int = None, ip_address: str = None) -> Dict:
+        """Total e histórico dos últimos 7 dias, lidos dos contadores diários do dono"""
+        dono = self.dono(user_id, ip_address)
+        inicio = date.today() - timedelta(days=self.DIAS_HISTORICO - 1)
+
+        por_dia = dict(db.session.query(UsoDiario.dia, UsoDiario.analises).filter(
+            UsoDiario.dono == dono, UsoDiario.dia >= inicio
+        ).all())
+        total = db.session.query(db.func.coalesce(db.func.sum(UsoDiario.analises), 0)).filter(
+            UsoDiario.dono == dono
+        ).scalar()
+
+        historico = []
+        for i in range(self.DIAS_HISTORICO):
+            dia = inicio + timedelta(days=i)
+            historico.append({'data': dia.isoformat(), 'analises': por_dia.get(dia, 0)})
+
         return {
-            'total_analises': 0,
-            'historico_7_dias': [],
+            'total_analises': total,
+            'historico_7_dias': historico,
             'limite_diario': self.LIMITE_USUARIO_LOGADO if user_id else self.LIMITE_USUARIO_ANONIMO
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def dono(user_id: int = None, ip_address: str = None) -> str:
+        return f'u:{user_id}' if user_id else f'ip:{ip_address}'
@@ -3,17 +3,19 @@ import pickle
 import pandas as pd
 import numpy as np
 import shap
-from typing import Dict
+from typing import Dict, List
 
 class MockModel:
     """Modelo mock para testes quando o modelo real no est disponvel"""
     def predict(self, X):
-        return np.array([1])
+        return np.ones(len(X), dtype=int)
     
     def predict_proba(self, X):
-        return np.array([[0.3, 0.7]])
+        return np.tile([0.3, 0.7], (len(X), 1))
 
 class ModeloService:
+    FEATURE_NAMES = ['banco', 'codigoBanco', 'agencia', 'valor', 'linha_codBanco', 'linha_moeda', 'linha_valor']
+
     def __init__(self):
         self.modelo = None
         self.mapeamento_bancos = {
@@ -84,51 +86,88 @@ class ModeloService:
         print(f"Banco no mapeado: {nome_banco}")
         return 0.0
 
+    def montar_features(self, dados_boleto: Dict) -> Dict:
+        features_linha = self.extrair_features_linha_digitavel(dados_boleto['linha_digitavel'])
+        return {
+            'banco': self.mapear_banco(dados_boleto['banco']),
+            'codigoBanco': float(dados_boleto['codigo_banco']),
+            'agencia': float(dados_boleto.get('agencia', 0)),
+            'valor': float(dados_boleto.get('valor', 0.0)),
+            'linha_codBanco': float(features_linha['linha_cod_banco']),
+            'linha_moeda': float(features_linha['linha_moeda']),
+            'linha_valor': float(features_linha['linha_valor'])
+        }
+
     def fazer_predicao(self, dados_boleto: Dict) -> Dict:
-        try:
-            features_linha = self.extrair_features_linha_digitavel(dados_boleto['linha_digitavel'])
-            features = {
-                'banco': self.mapear_banco(dados_boleto['banco']),
-                'codigoBanco': float(dados_boleto['codigo_banco']),
-                'agencia': float(dados_boleto.get('agencia', 0)),
-                'valor': float(dados_boleto.get('valor', 0.0)),
-                'linha_codBanco': float(features_linha['linha_cod_banco']),
-                'linha_moeda': float(features_linha['linha_moeda']),
-                'linha_valor': float(features_linha['linha_valor'])
-            }
-            feature_names = ['banco', 'codigoBanco', 'agencia', 'valor', 'linha_codBanco', 'linha_moeda', 'linha_valor']
-            df_features = pd.DataFrame([features])[feature_names]
-            
-            predicao_array = self.modelo.predict(df_features)
-            predicao = int(predicao_array[0])
-            probabilidades = self.modelo.predict_proba(df_features)[0]
-            
-            resultado = "Verdadeiro" if predicao == 1 else "Falso"
-            confianca = max(float(probabilidades[0]), float(probabilidades[1]))
+        return self.fazer_predicao_lote([dados_boleto])[0]
 
-            explicacao = self.gerar_explicacao_shap(df_features, predicao, features) if self.explainer else {"explicacao_texto": "Explicao no disponvel."}
+    def fazer_predicao_lote(self, lista_dados: List[Dict]) -> List[Dict]:
+        """Pontua varios boletos com uma unica chamada ao modelo (e ao SHAP)"""
+        resultados = [None] * len(lista_dados)
+        validos = []
+        for i, dados_boleto in enumerate(lista_dados):
+            try:
+                validos.append((i, self.montar_features(dados_boleto)))
+            except Exception as e:
+                resultados[i] = {'resultado': 'Erro', 'erro': str(e)}
 
-            return {
-                'resultado': resultado,
-                'confianca': confianca,
-                'explicacao_shap': explicacao
-            }
+        if not validos:
+            return resultados
+
+        try:
+            df_features = pd.DataFrame([features for _, features in validos])[self.FEATURE_NAMES]
+            predicoes = self.modelo.predict(df_features)
+            probabilidades = self.modelo.predict_proba(df_features)
+            valores_shap = self._calcular_valores_shap(df_features) if self.explainer else None
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return {'resultado': 'Erro', 'erro': str(e)}
+            for i, _ in validos:
+                resultados[i] = {'resultado': 'Erro', 'erro': str(e)}
+            return resultados
 
-    def gerar_explicacao_shap(self, df_features: pd.DataFrame, predicao: int, features_originais: Dict) -> Dict:
+        for linha, (i, features) in enumerate(validos):
+            predicao = int(predicoes[linha])
+            prob_falso, prob_verdadeiro = float(probabilidades[linha][0]), float(probabilidades[linha][1])
+
+            if valores_shap is not None:
+                explicacao = self.gerar_explicacao_shap(df_features.iloc[[linha]], predicao, features, valores_shap[linha])
+            else:
+                explicacao = {"explicacao_texto": "Explicao no disponvel."}
+
+            resultados[i] = {
+                'resultado': "Verdadeiro" if predicao == 1 else "Falso",
+                'confianca': max(prob_falso, prob_verdadeiro),
+                'probabilidade_falso': prob_falso,
+                'probabilidade_verdadeiro': prob_verdadeiro,
+                'features_extraidas': self.extrair_features_linha_digitavel(lista_dados[i]['linha_digitavel']),
+                'explicacao_shap': explicacao
+            }
+        return resultados
+
+    def _calcular_valores_shap(self, df_features: pd.DataFrame):
+        """Valores SHAP da classe positiva, uma linha por boleto"""
         try:
             shap_values = self.explainer.shap_values(df_features)
-            # Para classificacao binaria, shap_values pode ser uma lista de arrays.
-            # Se o modelo retorna SHAP values para ambas as classes, pegamos a da classe positiva (indice 1).
-            # Se retorna apenas para uma classe (e.g., a positiva), entao shap_values ja e o array.
+            # Para classificacao binaria, shap_values pode ser uma lista de arrays (uma por classe)
+            # ou um array (amostras, features, classes); pegamos a classe positiva (indice 1).
             if isinstance(shap_values, list) and len(shap_values) > 1:
-                shap_values_for_explanation = shap_values[1][0]
-            else:
-                # Assume que shap_values ja e o array para a classe positiva
-                shap_values_for_explanation = shap_values[0]
+                return np.asarray(shap_values[1])
+            shap_values = np.asarray(shap_values)
+            if shap_values.ndim == 3:
+                return shap_values[:, :, 1]
+            # Assume que shap_values ja e o array para a classe positiva
+            return shap_values
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def gerar_explicacao_shap(self, df_features: pd.DataFrame, predicao: int, features_originais: Dict,
+                              shap_values_for_explanation=None) -> Dict:
+        try:
+            if shap_values_for_explanation is None:
+                shap_values_for_explanation = self._calcular_valores_shap(df_features)[0]
             
             shap_map = {name: value for name, value in zip(df_features.columns, shap_values_for_explanation)}
             sorted_shap_features = sorted(shap_map.items(), key=lambda item: abs(item[1]), reverse=True)
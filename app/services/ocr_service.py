@@ -0,0 +1,130 @@
+import logging
+import os
+import queue
+import threading
+from typing import Optional
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # dependência opcional: sem ela o OCR usa apenas o pytesseract
+    tesserocr = None
+
+# O OcrService é criado na importação, em cada worker: as mensagens vão para o logging
+logger = logging.getLogger(__name__)
+
+
+class PytesseractBackend:
+    """OCR via pytesseract: um processo tesseract por chamada, imagem passada por arquivo temporário"""
+    nome = 'pytesseract'
+
+    def __init__(self, lang: str = 'por'):
+        self.lang = lang
+
+    def reconhecer(self, imagem: Image.Image, psm: int, whitelist: Optional[str], timeout: float) -> str:
+        config = f'--psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        try:
+            return pytesseract.image_to_string(imagem, lang=self.lang, config=config, timeout=timeout)
+        except RuntimeError as e:
+            # pytesseract sinaliza o timeout com RuntimeError
+            if 'timeout' in str(e).lower():
+                raise TimeoutError("OCR excedeu o tempo limite")
+            raise
+
+
+class TesserocrPoolBackend:
+    """
+    OCR via libtesseract (tesserocr) com um pool de engines de longa duração.
+    O modelo do idioma fica carregado em cada engine e a imagem é passada em memória.
+    O tamanho do pool também limita quantos OCRs rodam ao mesmo tempo no processo.
+    """
+    nome = 'tesserocr'
+
+    def __init__(self, lang: str = 'por', tamanho_pool: int = None):
+        self.lang = lang
+        self.tamanho_pool = tamanho_pool or os.cpu_count() or 2
+        self._livres = queue.LifoQueue()
+        self._criadas = 0
+        self._lock = threading.Lock()
+
+        # Cria a primeira engine já aqui para falhar cedo (ex.: traineddata ausente)
+        self._livres.put(self._criar_engine())
+        self._criadas = 1
+
+    def _criar_engine(self):
+        return tesserocr.PyTessBaseAPI(lang=self.lang)
+
+    def _obter_engine(self, timeout: float):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+
+        # A vaga é reservada sob o lock: threads concorrentes não passam do tamanho do pool
+        with self._lock:
+            pode_criar = self._criadas < self.tamanho_pool
+            if pode_criar:
+                self._criadas += 1
+        if pode_criar:
+            try:
+                return self._criar_engine()
+            except Exception:
+                with self._lock:
+                    self._criadas -= 1
+                raise
+
+        try:
+            return self._livres.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Nenhuma engine de OCR livre dentro do tempo limite")
+
+    def reconhecer(self, imagem: Image.Image, psm: int, whitelist: Optional[str], timeout: float) -> str:
+        engine = self._obter_engine(timeout)
+        try:
+            engine.SetPageSegMode(psm)
+            engine.SetVariable('tessedit_char_whitelist', whitelist or '')
+            engine.SetImage(imagem)
+            # Recognize aceita timeout em milissegundos e retorna False se for interrompido
+            if not engine.Recognize(int(timeout * 1000)):
+                raise TimeoutError("OCR excedeu o tempo limite")
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+            self._livres.put(engine)
+
+
+class OcrService:
+    """Seleciona o backend de OCR (OCR_BACKEND=auto|tesserocr|pytesseract) e mantém o pytesseract como fallback"""
+
+    def __init__(self, backend: str = None, lang: str = 'por'):
+        backend = (backend or os.getenv('OCR_BACKEND', 'auto')).lower()
+        self.fallback = PytesseractBackend(lang)
+        self.backend = self.fallback
+
+        if backend in ('auto', 'tesserocr'):
+            if tesserocr is None:
+                if backend == 'tesserocr':
+                    logger.warning("tesserocr não instalado, usando pytesseract")
+            else:
+                try:
+                    self.backend = TesserocrPoolBackend(lang, int(os.getenv('OCR_POOL_TAMANHO', 0)) or None)
+                except Exception as e:
+                    logger.warning("Erro ao inicializar engines do tesserocr, usando pytesseract: %s", e)
+
+        logger.info("Backend de OCR: %s", self.backend.nome)
+
+    def reconhecer(self, imagem: Image.Image, psm: int = 3, whitelist: Optional[str] = None,
+                   timeout: float = 20) -> str:
+        """Executa OCR na imagem; falhas inesperadas da engine persistente caem no pytesseract"""
+        try:
+            return self.backend.reconhecer(imagem, psm, whitelist, timeout)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            if self.backend is self.fallback:
+                raise
+            logger.warning("Erro no OCR via %s, tentando pytesseract: %s", self.backend.nome, e)
+            return self.fallback.reconhecer(imagem, psm, whitelist, timeout)
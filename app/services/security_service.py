@@ -1,12 +1,29 @@
 import hashlib
 import os
+import re
+import struct
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import Tuple, Union, Optional
 
 class SecurityService:
     ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.bmp'}
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))  # ~40 megapixels
+    MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', 20))
+    MAX_PDF_PAGES_BATCH = int(os.getenv('MAX_PDF_PAGES_LOTE', 200))  # PDFs com um boleto por página
+    HEADER_INSPECTION_SIZE = 16 * 1024  # 16KB: suficiente para assinatura e dimensões na maioria dos arquivos
+    
+    # Headers conhecidos
+    FILE_SIGNATURES = {
+        '.pdf': [b'%PDF'],
+        '.jpg': [b'\xff\xd8\xff'],
+        '.jpeg': [b'\xff\xd8\xff'],
+        '.png': [b'\x89PNG'],
+        '.tiff': [b'II*\x00', b'MM\x00*'],
+        '.bmp': [b'BM'],
+        '.zip': [b'PK\x03\x04']
+    }
     
     def validate_file_security(self, file_path: str) -> Tuple[bool, str]:
         """Validação básica de segurança de arquivos"""
@@ -38,28 +55,118 @@ class SecurityService:
         except Exception as e:
             return False, f"Erro na validação: {str(e)}"
     
-    def _validate_file_header(self, file_path: str, extension: str) -> bool:
-        """Valida header básico do arquivo"""
+    def _validate_file_header(self, file_path_or_header: Union[str, bytes], extension: str) -> bool:
+        """Valida header básico do arquivo (caminho em disco ou bytes iniciais já recebidos)"""
         try:
-            with open(file_path, 'rb') as f:
-                header = f.read(10)
-            
-            # Headers conhecidos
-            headers = {
-                '.pdf': [b'%PDF'],
-                '.jpg': [b'\xff\xd8\xff'],
-                '.jpeg': [b'\xff\xd8\xff'],
-                '.png': [b'\x89PNG'],
-                '.tiff': [b'II*\x00', b'MM\x00*'],
-                '.bmp': [b'BM']
-            }
+            if isinstance(file_path_or_header, (bytes, bytearray)):
+                header = bytes(file_path_or_header[:10])
+            else:
+                with open(file_path_or_header, 'rb') as f:
+                    header = f.read(10)
             
-            expected_headers = headers.get(extension, [])
+            expected_headers = self.FILE_SIGNATURES.get(self._normalize_extension(extension), [])
             return any(header.startswith(h) for h in expected_headers)
             
         except:
             return False
     
+    def validate_upload_header(self, header: bytes, extension: str, max_pages: int = None) -> Tuple[bool, str]:
+        """
+        Validação antecipada a partir dos primeiros KB do upload:
+        assinatura, dimensões da imagem e número de páginas do PDF (quando visíveis no header)
+        """
+        extension = self._normalize_extension(extension)
+        max_pages = max_pages or self.MAX_PDF_PAGES
+        
+        if not self._validate_file_header(header, extension):
+            return False, "Header do arquivo suspeito"
+        
+        if extension == '.pdf':
+            paginas = self.read_pdf_page_count(header)
+            if paginas and paginas > max_pages:
+                return False, f"PDF com muitas páginas: {paginas} (máximo {max_pages})"
+        else:
+            dimensoes = self.read_image_dimensions(header, extension)
+            if dimensoes:
+                largura, altura = dimensoes
+                if largura * altura > self.MAX_IMAGE_PIXELS:
+                    return False, f"Imagem muito grande: {largura}x{altura} pixels"
+        
+        return True, "Arquivo válido"
+    
+    def read_image_dimensions(self, header: bytes, extension: str) -> Optional[Tuple[int, int]]:
+        """Lê largura e altura do header da imagem sem decodificá-la (None se não estiver no trecho)"""
+        try:
+            extension = self._normalize_extension(extension)
+            
+            if extension == '.png' and header[12:16] == b'IHDR':
+                return struct.unpack('>II', header[16:24])
+            
+            if extension == '.bmp' and len(header) >= 26:
+                largura, altura = struct.unpack('<ii', header[18:26])
+                return abs(largura), abs(altura)
+            
+            if extension in ('.jpg', '.jpeg'):
+                return self._read_jpeg_dimensions(header)
+            
+            if extension == '.tiff':
+                return self._read_tiff_dimensions(header)
+        except struct.error:
+            pass
+        return None
+    
+    def _read_jpeg_dimensions(self, header: bytes) -> Optional[Tuple[int, int]]:
+        """Percorre os segmentos JPEG até o marcador SOF"""
+        i = 2
+        while i + 9 <= len(header):
+            if header[i] != 0xFF:
+                return None
+            marker = header[i + 1]
+            if marker == 0xFF:  # bytes de preenchimento
+                i += 1
+                continue
+            if marker in (0x01,) or 0xD0 <= marker <= 0xD9:  # marcadores sem tamanho
+                i += 2
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                altura, largura = struct.unpack('>HH', header[i + 5:i + 9])
+                return largura, altura
+            i += 2 + struct.unpack('>H', header[i + 2:i + 4])[0]
+        return None
+    
+    def _read_tiff_dimensions(self, header: bytes) -> Optional[Tuple[int, int]]:
+        """Lê as tags ImageWidth/ImageLength do primeiro IFD"""
+        ordem = '<' if header[:2] == b'II' else '>'
+        offset = struct.unpack(ordem + 'I', header[4:8])[0]
+        quantidade = struct.unpack(ordem + 'H', header[offset:offset + 2])[0]
+        valores = {}
+        for n in range(quantidade):
+            entrada = header[offset + 2 + n * 12:offset + 14 + n * 12]
+            tag, tipo = struct.unpack(ordem + 'HH', entrada[:4])
+            if tag in (256, 257):
+                formato = 'H' if tipo == 3 else 'I'
+                valores[tag] = struct.unpack(ordem + formato, entrada[8:8 + struct.calcsize(formato)])[0]
+        if 256 in valores and 257 in valores:
+            return valores[256], valores[257]
+        return None
+    
+    def read_pdf_page_count(self, data: bytes) -> Optional[int]:
+        """
+        Número de páginas do PDF sem abri-lo: no header de PDFs linearizados (/N)
+        ou, com o arquivo inteiro, pelo maior /Count da árvore de páginas
+        """
+        linearizado = re.search(rb'/Linearized\s[^>]*?/N\s+(\d+)', data[:2048])
+        if linearizado:
+            return int(linearizado.group(1))
+        
+        contagens = [int(c) for c in re.findall(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)', data)]
+        contagens += [int(c) for c in re.findall(rb'/Count\s+(\d+)[^>]*?/Type\s*/Pages\b', data)]
+        return max(contagens) if contagens else None
+    
+    def _normalize_extension(self, extension: str) -> str:
+        """Aceita 'pdf' ou '.pdf'"""
+        return '.' + extension.lower().lstrip('.')
+    
     def generate_secure_filename(self, original_filename: str) -> str:
         """Gera nome seguro para arquivo"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
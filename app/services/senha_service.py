@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class FilaSenhasCheia(Exception):
+    """Executor de hash de senhas sem vaga: o pedido é recusado em vez de esperar indefinidamente"""
+
+class SenhaService:
+    """
+    Hash e verificação de senhas (KDF do werkzeug) num executor dedicado e limitado.
+    Um pico de login/registro ocupa no máximo SENHA_WORKERS threads; pedidos além da fila
+    (SENHA_FILA_MAXIMA) são recusados, e as demais rotas continuam respondendo.
+    """
+
+    def __init__(self):
+        # Método no formato do werkzeug: 'scrypt:n:r:p' ou 'pbkdf2:sha256:iteracoes'
+        self.metodo = os.getenv('SENHA_METODO', 'scrypt:32768:8:1')
+        self.salt_length = int(os.getenv('SENHA_SALT_LENGTH', 16))
+        self.workers = int(os.getenv('SENHA_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+        self.fila_maxima = int(os.getenv('SENHA_FILA_MAXIMA', 32))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='senha')
+        self._vagas = threading.BoundedSemaphore(self.workers + self.fila_maxima)
+        self._prefixo = None
+        self._lock = threading.Lock()
+        self._metricas = {
+            'pendentes': 0,
+            'em_execucao': 0,
+            'concluidos': 0,
+            'recusados': 0,
+            'espera_total': 0.0,
+            'espera_maxima': 0.0,
+            'execucao_total': 0.0,
+        }
+
+    def gerar_hash(self, senha: str) -> str:
+        return self._executar(generate_password_hash, senha, self.metodo, self.salt_length)
+
+    def verificar(self, senha_hash: str, senha: str) -> bool:
+        return self._executar(check_password_hash, senha_hash, senha)
+
+    def precisa_rehash(self, senha_hash: str) -> bool:
+        """True se o hash foi gerado com parâmetros diferentes dos configurados"""
+        if self._prefixo is None:
+            # Forma completa do método ('scrypt' -> 'scrypt:32768:8:1'), como o werkzeug grava
+            self._prefixo = self._executar(generate_password_hash, '', self.metodo, 1).split('$', 1)[0]
+        return senha_hash.split('$', 1)[0] != self._prefixo
+
+    def _executar(self, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                self._metricas['recusados'] += 1
+            raise FilaSenhasCheia('Muitas requisições de autenticação em andamento')
+
+        enfileirado = time.perf_counter()
+        with self._lock:
+            self._metricas['pendentes'] += 1
+
+        def tarefa():
+            inicio = time.perf_counter()
+            with self._lock:
+                espera = inicio - enfileirado
+                self._metricas['em_execucao'] += 1
+                self._metricas['espera_total'] += espera
+                self._metricas['espera_maxima'] = max(self._metricas['espera_maxima'], espera)
+            try:
+                return funcao(*args)
+            finally:
+                with self._lock:
+                    self._metricas['em_execucao'] -= 1
+                    self._metricas['pendentes'] -= 1
+                    self._metricas['concluidos'] += 1
+                    self._metricas['execucao_total'] += time.perf_counter() - inicio
+                self._vagas.release()
+
+        return self._executor.submit(tarefa).result()
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            m = dict(self._metricas)
+        concluidos = m['concluidos'] or 1
+        return {
+            'metodo': self.metodo,
+            'workers': self.workers,
+            'fila_maxima': self.fila_maxima,
+            'em_execucao': m['em_execucao'],
+            'na_fila': m['pendentes'] - m['em_execucao'],
+            'concluidos': m['concluidos'],
+            'recusados': m['recusados'],
+            'espera_media_ms': round(m['espera_total'] / concluidos * 1000, 2),
+            'espera_maxima_ms': round(m['espera_maxima'] * 1000, 2),
+            'execucao_media_ms': round(m['execucao_total'] / concluidos * 1000, 2),
+        }
+
+# Instância compartilhada (o executor é único por processo)
+senha_service = SenhaService()
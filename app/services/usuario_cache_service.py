@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import jwt
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.models.user_model import User
+
+class UsuarioCacheService:
+    """
+    Cache por processo dos tokens já verificados e dos usuários, com TTL curto. Evita decodificar
+    o JWT e consultar o usuário no banco a cada requisição autenticada. Cada worker tem o seu:
+    a invalidação vale para o processo que alterou o usuário e os demais se atualizam pelo TTL.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv('AUTH_CACHE_TTL', 30))
+        self.max_entradas = int(os.getenv('AUTH_CACHE_MAX_ENTRADAS', 10000))
+        self._tokens = OrderedDict()    # token -> (user_id, expira)
+        self._usuarios = OrderedDict()  # user_id -> (cópia destacada do usuário, expira)
+        self._lock = threading.Lock()
+
+    def verificar_token(self, token: str) -> int:
+        """user_id do token. Levanta as mesmas exceções de jwt.decode para tokens inválidos"""
+        agora = time.time()
+        entrada = self._ler(self._tokens, token, agora)
+        if entrada:
+            return entrada
+
+        data = jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=["HS256"])
+        # Nunca além da expiração do próprio token
+        expira = min(agora + self.ttl, data.get('exp', float('inf')))
+        self._guardar(self._tokens, token, data['user_id'], expira)
+        return data['user_id']
+
+    def obter_usuario(self, user_id: int) -> Optional[User]:
+        """Usuário anexado à sessão atual; vindo do cache, sem consulta ao banco"""
+        agora = time.time()
+        copia = self._ler(self._usuarios, user_id, agora)
+        if copia is not None:
+            # load=False: anexa a cópia à sessão sem SELECT; alterações continuam sendo gravadas no commit
+            return db.session.merge(copia, load=False)
+
+        usuario = db.session.get(User, user_id)
+        if usuario:
+            self._guardar(self._usuarios, user_id, self._copia_destacada(usuario), agora + self.ttl)
+        return usuario
+
+    def invalidar_usuario(self, user_id: int):
+        """Descarta o usuário do cache (dados alterados ou conta desativada)"""
+        with self._lock:
+            self._usuarios.pop(user_id, None)
+
+    @staticmethod
+    def _copia_destacada(usuario: User) -> User:
+        """Cópia fora de qualquer sessão, que pode ser compartilhada entre requisições"""
+        copia = User(**{coluna.key: getattr(usuario, coluna.key) for coluna in User.__table__.columns})
+        make_transient_to_detached(copia)
+        return copia
+
+    def _ler(self, cache: OrderedDict, chave, agora: float):
+        with self._lock:
+            entrada = cache.get(chave)
+            if entrada is None:
+                return None
+            if entrada[1] <= agora:
+                del cache[chave]
+                return None
+            return entrada[0]
+
+    def _guardar(self, cache: OrderedDict, chave, valor, expira: float):
+        with self._lock:
+            cache[chave] = (valor, expira)
+            cache.move_to_end(chave)
+            if len(cache) > self.max_entradas:
+                cache.popitem(last=False)
@@ -0,0 +1,511 @@
+"""
+Contadores compartilhados (rate limit, tentativas de login) com interface no estilo do Redis:
+get, set, incrby, ttl, delete e gcra (passo atômico do rate limiter GCRA).
+
+Backends (CONTADORES_BACKEND):
+- memoria: dicionário do próprio processo (cada worker do gunicorn tem o seu)
+- mmap: tabela hash num arquivo mapeado em memória, compartilhada por todos os workers do host
+- sqlite: arquivo SQLite, para desenvolvimento com mais de um host (disco compartilhado)
+- redis: servidor Redis (REDIS_URL), para produção com vários hosts
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem locks de arquivo, o backend mmap não está disponível
+    fcntl = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def _passo_gcra(tat: Optional[float], agora: float, intervalo: float,
+                tolerancia: float) -> Tuple[bool, float, float]:
+    """
+    Um passo do GCRA. tat: instante teórico da próxima requisição (None se a chave não existe).
+    Retorna (permitido, segundos até a próxima liberação, novo tat).
+    """
+    novo_tat = max(tat or agora, agora) + intervalo
+    liberado_em = novo_tat - tolerancia
+    if liberado_em > agora:
+        return False, liberado_em - agora, tat
+    return True, 0.0, novo_tat
+
+
+class ContadoresMemoria:
+    """
+    Contadores no próprio processo, em faixas com lock próprio.
+
+    A expiração usa uma roda de tempo por faixa, com um balde por segundo: cada chave está
+    em exatamente um balde (o do segundo em que expira) e cada operação processa só os
+    baldes vencidos desde a anterior. Cada faixa tem um teto de entradas; acima dele sai a
+    chave escrita há mais tempo. Consultar, gravar e apagar custam O(1) amortizado.
+    """
+
+    BALDES = 1024  # segundos cobertos por uma volta da roda
+
+    def __init__(self, faixas: int = 64, max_entradas: int = 100000):
+        self.faixas = faixas
+        self.max_por_faixa = max(1, max_entradas // faixas)
+        self._entradas = [OrderedDict() for _ in range(faixas)]  # chave -> (valor, expira ou None)
+        self._rodas = [{} for _ in range(faixas)]  # balde -> chaves que expiram naquele segundo
+        self._proximo_segundo = [int(time.time()) for _ in range(faixas)]
+        self._locks = [threading.Lock() for _ in range(faixas)]
+
+    @contextmanager
+    def _faixa(self, chave: str, agora: float):
+        indice = hash(chave) % self.faixas
+        with self._locks[indice]:
+            self._girar(indice, agora)
+            yield indice
+
+    def _girar(self, indice: int, agora: float):
+        """Remove as chaves dos baldes cujos segundos já passaram"""
+        entradas, roda = self._entradas[indice], self._rodas[indice]
+        inicio, fim = self._proximo_segundo[indice], int(agora)
+        if fim <= inicio:
+            return
+        self._proximo_segundo[indice] = fim
+        # Parada longa: uma volta completa já cobre todos os baldes
+        baldes = list(roda) if fim - inicio >= self.BALDES else [s % self.BALDES for s in range(inicio, fim)]
+        for balde in baldes:
+            chaves = roda.get(balde)
+            if not chaves:
+                continue
+            # Chaves com expiração numa volta futura da roda continuam no balde
+            vencidas = [chave for chave in chaves if entradas[chave][1] <= agora]
+            for chave in vencidas:
+                chaves.discard(chave)
+                del entradas[chave]
+            if not chaves:
+                del roda[balde]
+
+    def _desagendar(self, indice: int, chave: str, expira: Optional[float]):
+        if expira is not None:
+            roda = self._rodas[indice]
+            balde = int(expira) % self.BALDES
+            chaves = roda.get(balde)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del roda[balde]
+
+    def _gravar(self, indice: int, chave: str, valor: float, expira: Optional[float]):
+        entradas = self._entradas[indice]
+        anterior = entradas.get(chave)
+        if anterior is not None:
+            self._desagendar(indice, chave, anterior[1])
+        entradas[chave] = (valor, expira)
+        entradas.move_to_end(chave)
+        if expira is not None:
+            self._rodas[indice].setdefault(int(expira) % self.BALDES, set()).add(chave)
+
+        if len(entradas) > self.max_por_faixa:
+            # Teto de memória: descarta a chave escrita há mais tempo
+            antiga, (_, expira_antiga) = entradas.popitem(last=False)
+            self._desagendar(indice, antiga, expira_antiga)
+
+    def _viva(self, indice: int, chave: str, agora: float):
+        entrada = self._entradas[indice].get(chave)
+        if entrada is None or (entrada[1] is not None and entrada[1] <= agora):
+            return None
+        return entrada
+
+    def get(self, chave: str) -> Optional[float]:
+        agora = time.time()
+        with self._faixa(chave, agora) as indice:
+            entrada = self._viva(indice, chave, agora)
+            return entrada[0] if entrada else None
+
+    def set(self, chave: str, valor: float, ex: Optional[float] = None):
+        agora = time.time()
+        with self._faixa(chave, agora) as indice:
+            self._gravar(indice, chave, valor, agora + ex if ex else None)
+
+    def incrby(self, chave: str, quantidade: float = 1, ex: Optional[float] = None) -> float:
+        """
+        Incrementa e retorna o novo valor. Com ex, a expiração é definida quando a chave é criada;
+        os incrementos seguintes a mantêm (janela fixa a partir do primeiro, como INCR + EXPIRE NX)
+        """
+        agora = time.time()
+        with self._faixa(chave, agora) as indice:
+            valor, expira = self._viva(indice, chave, agora) or (0, agora + ex if ex else None)
+            valor += quantidade
+            self._gravar(indice, chave, valor, expira)
+            return valor
+
+    def ttl(self, chave: str) -> float:
+        """Segundos até expirar; -1 se a chave não expira, -2 se não existe (como no Redis)"""
+        agora = time.time()
+        with self._faixa(chave, agora) as indice:
+            entrada = self._viva(indice, chave, agora)
+            if entrada is None:
+                return -2
+            return -1 if entrada[1] is None else entrada[1] - agora
+
+    def delete(self, chave: str):
+        with self._faixa(chave, time.time()) as indice:
+            entrada = self._entradas[indice].pop(chave, None)
+            if entrada is not None:
+                self._desagendar(indice, chave, entrada[1])
+
+    def gcra(self, chave: str, intervalo: float, tolerancia: float) -> Tuple[bool, float]:
+        agora = time.time()
+        with self._faixa(chave, agora) as indice:
+            entrada = self._viva(indice, chave, agora)
+            permitido, retry_after, novo_tat = _passo_gcra(entrada and entrada[0], agora, intervalo, tolerancia)
+            if permitido:
+                # Depois do tat o bucket está cheio de novo, o que equivale à chave não existir
+                self._gravar(indice, chave, novo_tat, novo_tat)
+            return permitido, retry_after
+
+
+class ContadoresMmap:
+    """
+    Tabela hash de endereçamento aberto num arquivo mapeado em memória (MAP_SHARED), vista por
+    todos os processos do host. Cada slot guarda (hash da chave, valor, expira) em 24 bytes.
+
+    A tabela é dividida em faixas independentes; cada faixa é protegida por um lock de thread e
+    por um lock de registro (fcntl) sobre um byte do arquivo, que exclui os outros processos.
+    A capacidade é fixa: com a vizinhança de uma chave cheia, a entrada que expira primeiro é
+    descartada.
+
+    Não precisa da roda de tempo do ContadoresMemoria: a memória já é limitada pela capacidade
+    (24 bytes por slot) e cada operação percorre no máximo `sondagem` slots, qualquer que seja o
+    número de chaves. Slots vencidos são reaproveitados quando a sondagem passa por eles.
+    """
+
+    CABECALHO = struct.Struct('<4sII')  # assinatura, capacidade, faixas
+    TAMANHO_CABECALHO = 16
+    SLOT = struct.Struct('<Qdd')  # hash da chave, valor, expira (0 = não expira)
+    ASSINATURA = b'CTR1'
+    VAZIO, APAGADO = 0, 1
+
+    def __init__(self, caminho: str, capacidade: int = 65536, faixas: int = 64, sondagem: int = 32):
+        if fcntl is None:
+            raise RuntimeError('Backend mmap de contadores requer fcntl (Linux/macOS)')
+        self.caminho = caminho
+        self.capacidade = capacidade
+        self.faixas = faixas
+        self.sondagem = sondagem
+        self._pid = None
+        self._lock_abertura = threading.Lock()
+
+    def _abrir(self):
+        """Mapeia o arquivo (uma vez por processo: depois de um fork os locks fcntl não são herdados)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock_abertura:
+            if self._pid == os.getpid():
+                return
+            fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                cabecalho = os.pread(fd, self.CABECALHO.size, 0)
+                if len(cabecalho) == self.CABECALHO.size and cabecalho[:4] == self.ASSINATURA:
+                    # Arquivo já criado por outro processo: vale a geometria gravada nele
+                    _, self.capacidade, self.faixas = self.CABECALHO.unpack(cabecalho)
+                else:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.TAMANHO_CABECALHO + self.capacidade * self.SLOT.size)
+                    os.pwrite(fd, self.CABECALHO.pack(self.ASSINATURA, self.capacidade, self.faixas), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+
+            self._mm = mmap.mmap(fd, self.TAMANHO_CABECALHO + self.capacidade * self.SLOT.size)
+            self._fd = fd
+            self._slots_por_faixa = self.capacidade // self.faixas
+            self._locks = [threading.Lock() for _ in range(self.faixas)]
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _hash(chave: str) -> int:
+        h = int.from_bytes(hashlib.blake2b(chave.encode('utf-8'), digest_size=8).digest(), 'little')
+        return max(h, 2)  # 0 e 1 marcam slots vazios e apagados
+
+    @contextmanager
+    def _faixa(self, h: int):
+        self._abrir()
+        faixa = h % self.faixas
+        with self._locks[faixa]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, faixa)
+            try:
+                yield faixa
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, faixa)
+
+    def _localizar(self, h: int, faixa: int, agora: float) -> Tuple[Optional[int], int]:
+        """(posição da chave viva ou None, posição onde gravá-la)"""
+        inicio = self.TAMANHO_CABECALHO + faixa * self._slots_por_faixa * self.SLOT.size
+        base = (h >> 8) % self._slots_por_faixa
+        livre, descarte, menor_expira = None, None, None
+        for i in range(self.sondagem):
+            pos = inicio + ((base + i) % self._slots_por_faixa) * self.SLOT.size
+            hs, _, expira = self.SLOT.unpack_from(self._mm, pos)
+            vencido = expira and expira <= agora
+            if hs == h:
+                return (None, pos) if vencido else (pos, pos)
+            if hs == self.VAZIO:
+                # Slot nunca usado: a chave não pode estar mais adiante na sondagem
+                return None, livre if livre is not None else pos
+            if livre is None:
+                if hs == self.APAGADO or vencido:
+                    livre = pos
+                elif expira and (menor_expira is None or expira < menor_expira):
+                    descarte, menor_expira = pos, expira
+        if livre is not None:
+            return None, livre
+        return None, descarte if descarte is not None else inicio + base * self.SLOT.size
+
+    def _ler(self, chave: str) -> Tuple[Optional[float], float]:
+        """(valor, expira) da chave viva, ou (None, 0)"""
+        h = self._hash(chave)
+        with self._faixa(h) as faixa:
+            pos, _ = self._localizar(h, faixa, time.time())
+            if pos is None:
+                return None, 0.0
+            _, valor, expira = self.SLOT.unpack_from(self._mm, pos)
+            return valor, expira
+
+    def get(self, chave: str) -> Optional[float]:
+        return self._ler(chave)[0]
+
+    def set(self, chave: str, valor: float, ex: Optional[float] = None):
+        h = self._hash(chave)
+        agora = time.time()
+        with self._faixa(h) as faixa:
+            _, pos = self._localizar(h, faixa, agora)
+            self.SLOT.pack_into(self._mm, pos, h, valor, agora + ex if ex else 0.0)
+
+    def incrby(self, chave: str, quantidade: float = 1, ex: Optional[float] = None) -> float:
+        """
+        Incrementa e retorna o novo valor. Com ex, a expiração é definida quando a chave é criada;
+        os incrementos seguintes a mantêm (janela fixa a partir do primeiro, como INCR + EXPIRE NX)
+        """
+        h = self._hash(chave)
+        agora = time.time()
+        with self._faixa(h) as faixa:
+            encontrado, pos = self._localizar(h, faixa, agora)
+            valor, expira = 0.0, agora + ex if ex else 0.0
+            if encontrado is not None:
+                _, valor, expira = self.SLOT.unpack_from(self._mm, pos)
+            valor += quantidade
+            self.SLOT.pack_into(self._mm, pos, h, valor, expira)
+            return valor
+
+    def ttl(self, chave: str) -> float:
+        """Segundos até expirar; -1 se a chave não expira, -2 se não existe (como no Redis)"""
+        valor, expira = self._ler(chave)
+        if valor is None:
+            return -2
+        return -1 if not expira else expira - time.time()
+
+    def delete(self, chave: str):
+        h = self._hash(chave)
+        with self._faixa(h) as faixa:
+            pos, _ = self._localizar(h, faixa, time.time())
+            if pos is not None:
+                self.SLOT.pack_into(self._mm, pos, self.APAGADO, 0.0, 0.0)
+
+    def gcra(self, chave: str, intervalo: float, tolerancia: float) -> Tuple[bool, float]:
+        h = self._hash(chave)
+        agora = time.time()
+        with self._faixa(h) as faixa:
+            encontrado, pos = self._localizar(h, faixa, agora)
+            tat = self.SLOT.unpack_from(self._mm, pos)[1] if encontrado is not None else None
+            permitido, retry_after, novo_tat = _passo_gcra(tat, agora, intervalo, tolerancia)
+            if permitido:
+                self.SLOT.pack_into(self._mm, pos, h, novo_tat, novo_tat)
+            return permitido, retry_after
+
+
+class ContadoresSQLite:
+    """
+    Contadores num arquivo SQLite (WAL), uma conexão por thread. As entradas vencidas são
+    removidas aos poucos, algumas a cada centena de escritas.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._escritas = 0
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS contadores '
+                '(chave TEXT PRIMARY KEY, valor REAL NOT NULL, expira REAL) WITHOUT ROWID'
+            )
+            conexao.execute('CREATE INDEX IF NOT EXISTS ix_contadores_expira ON contadores (expira)')
+            self._local.conexao, self._local.pid = conexao, os.getpid()
+        return conexao
+
+    def _depois_de_escrever(self, conexao: sqlite3.Connection, agora: float):
+        self._escritas += 1
+        if self._escritas % 100 == 0:
+            conexao.execute(
+                'DELETE FROM contadores WHERE chave IN '
+                '(SELECT chave FROM contadores WHERE expira <= ? LIMIT 100)', (agora,)
+            )
+
+    def _ler(self, chave: str) -> Tuple[Optional[float], Optional[float]]:
+        linha = self._conexao().execute(
+            'SELECT valor, expira FROM contadores WHERE chave = ? AND (expira IS NULL OR expira > ?)',
+            (chave, time.time())
+        ).fetchone()
+        return linha if linha else (None, None)
+
+    def get(self, chave: str) -> Optional[float]:
+        return self._ler(chave)[0]
+
+    def set(self, chave: str, valor: float, ex: Optional[float] = None):
+        agora = time.time()
+        conexao = self._conexao()
+        conexao.execute('INSERT OR REPLACE INTO contadores VALUES (?, ?, ?)',
+                        (chave, valor, agora + ex if ex else None))
+        self._depois_de_escrever(conexao, agora)
+
+    def incrby(self, chave: str, quantidade: float = 1, ex: Optional[float] = None) -> float:
+        """
+        Incrementa e retorna o novo valor. Com ex, a expiração é definida quando a chave é criada;
+        os incrementos seguintes a mantêm (janela fixa a partir do primeiro, como INCR + EXPIRE NX)
+        """
+        agora = time.time()
+        conexao = self._conexao()
+        valor = conexao.execute(
+            'INSERT INTO contadores VALUES (:chave, :q, :expira) ON CONFLICT (chave) DO UPDATE SET '
+            'valor = CASE WHEN expira <= :agora THEN :q ELSE valor + :q END, '
+            'expira = CASE WHEN expira <= :agora THEN :expira ELSE expira END '
+            'RETURNING valor',
+            {'chave': chave, 'q': quantidade, 'agora': agora, 'expira': agora + ex if ex else None}
+        ).fetchone()[0]
+        self._depois_de_escrever(conexao, agora)
+        return valor
+
+    def ttl(self, chave: str) -> float:
+        """Segundos até expirar; -1 se a chave não expira, -2 se não existe (como no Redis)"""
+        valor, expira = self._ler(chave)
+        if valor is None:
+            return -2
+        return -1 if expira is None else expira - time.time()
+
+    def delete(self, chave: str):
+        self._conexao().execute('DELETE FROM contadores WHERE chave = ?', (chave,))
+
+    def gcra(self, chave: str, intervalo: float, tolerancia: float) -> Tuple[bool, float]:
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            agora = time.time()
+            linha = conexao.execute(
+                'SELECT valor FROM contadores WHERE chave = ? AND expira > ?', (chave, agora)
+            ).fetchone()
+            permitido, retry_after, novo_tat = _passo_gcra(linha and linha[0], agora, intervalo, tolerancia)
+            if permitido:
+                conexao.execute('INSERT OR REPLACE INTO contadores VALUES (?, ?, ?)', (chave, novo_tat, novo_tat))
+            conexao.execute('COMMIT')
+        except Exception:
+            conexao.execute('ROLLBACK')
+            raise
+        if permitido:
+            self._depois_de_escrever(conexao, agora)
+        return permitido, retry_after
+
+
+class ContadoresRedis:
+    """Contadores num servidor Redis; o passo do GCRA roda num script Lua (atômico, com o relógio do Redis)"""
+
+    SCRIPT_GCRA = """
+    local t = redis.call('TIME')
+    local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local intervalo, tolerancia = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1])) or agora
+    if tat < agora then tat = agora end
+    local novo_tat = tat + intervalo
+    local liberado_em = novo_tat - tolerancia
+    if liberado_em > agora then return {0, tostring(liberado_em - agora)} end
+    redis.call('SET', KEYS[1], tostring(novo_tat), 'PX', math.ceil((novo_tat - agora) * 1000))
+    return {1, '0'}
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError('Backend redis de contadores requer o pacote redis (pip install redis)')
+        self.cliente = redis.Redis.from_url(url)
+        self._gcra = self.cliente.register_script(self.SCRIPT_GCRA)
+
+    def get(self, chave: str) -> Optional[float]:
+        valor = self.cliente.get(chave)
+        return float(valor) if valor is not None else None
+
+    def set(self, chave: str, valor: float, ex: Optional[float] = None):
+        self.cliente.set(chave, valor, px=int(ex * 1000) if ex else None)
+
+    def incrby(self, chave: str, quantidade: float = 1, ex: Optional[float] = None) -> float:
+        """
+        Incrementa e retorna o novo valor. Com ex, a expiração é definida quando a chave é criada;
+        os incrementos seguintes a mantêm (janela fixa a partir do primeiro, como INCR + EXPIRE NX)
+        """
+        pipe = self.cliente.pipeline()
+        if ex:
+            # Cria a chave com a expiração só se ela não existir; INCRBYFLOAT preserva o TTL
+            pipe.set(chave, 0, px=int(ex * 1000), nx=True)
+        pipe.incrbyfloat(chave, quantidade)
+        return float(pipe.execute()[-1])
+
+    def ttl(self, chave: str) -> float:
+        """Segundos até expirar; -1 se a chave não expira, -2 se não existe"""
+        pttl = self.cliente.pttl(chave)
+        return pttl if pttl < 0 else pttl / 1000
+
+    def delete(self, chave: str):
+        self.cliente.delete(chave)
+
+    def gcra(self, chave: str, intervalo: float, tolerancia: float) -> Tuple[bool, float]:
+        permitido, retry_after = self._gcra(keys=[chave], args=[intervalo, tolerancia])
+        return bool(permitido), float(retry_after)
+
+
+def criar_contadores():
+    """
+    Backend configurado em CONTADORES_BACKEND (padrão: mmap quando disponível). Em todos, o custo
+    por operação não depende do número de chaves e a memória tem teto: CONTADORES_MAX_ENTRADAS no
+    memoria, CONTADORES_CAPACIDADE no mmap
+    """
+    backend = os.getenv('CONTADORES_BACKEND', 'mmap' if fcntl else 'memoria')
+    if backend == 'memoria':
+        return ContadoresMemoria(
+            faixas=int(os.getenv('CONTADORES_FAIXAS', 64)),
+            max_entradas=int(os.getenv('CONTADORES_MAX_ENTRADAS', 100000))
+        )
+    if backend == 'mmap':
+        return ContadoresMmap(
+            os.getenv('CONTADORES_ARQUIVO', os.path.join(tempfile.gettempdir(), 'detecta_boletos_contadores')),
+            capacidade=int(os.getenv('CONTADORES_CAPACIDADE', 65536)),
+            faixas=int(os.getenv('CONTADORES_FAIXAS', 64))
+        )
+    if backend == 'sqlite':
+        return ContadoresSQLite(os.getenv('CONTADORES_SQLITE', 'contadores.db'))
+    if backend == 'redis':
+        return ContadoresRedis(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    raise ValueError(f'CONTADORES_BACKEND inválido: {backend}')
+
+
+# Instância compartilhada pelo rate limiter e pelo controle de força bruta
+contadores = criar_contadores()
@@ -0,0 +1,188 @@
+"""
+Extração dos campos do boleto (linha digitável, valor, vencimento, banco, agência e
+CNPJ do beneficiário) com padrões pré-compilados sobre uma única cópia em minúsculas
+do texto. Em textos com vários boletos, o documento é varrido uma vez e as ocorrências
+são distribuídas entre os boletos, em vez de reprocessar cada região.
+"""
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.linha_digitavel import (
+    BANCOS_POR_CODIGO, extrair_valor_linha, recuperar_linha_digitavel, validar_linha_digitavel
+)
+
+# Palavras-chave de cada banco, em ordem de prioridade quando o texto cita mais de um
+PALAVRAS_BANCO = [
+    ('banco do brasil', 'Banco do Brasil'),
+    ('itau', 'Itaú'),
+    ('itaú', 'Itaú'),
+    ('bradesco', 'Bradesco'),
+    ('santander', 'Santander'),
+    ('caixa', 'Caixa Econômica'),
+    ('nubank', 'NU Pagamentos S.A. – Nubank'),
+]
+_PRIORIDADE_BANCO = {palavra: (i, nome) for i, (palavra, nome) in enumerate(PALAVRAS_BANCO)}
+
+# Também casa a linha sem separadores (47 dígitos seguidos)
+PADRAO_LINHA_FORMATADA = r'\d{5}[\.\s]*\d{5}[\.\s]*\d{5}[\.\s]*\d{6}[\.\s]*\d{5}[\.\s]*\d{6}[\.\s]*\d[\.\s]*\d{14}'
+
+
+def _padrao_palavras(palavras: List[str]) -> str:
+    """
+    Alternância das palavras fatorada por prefixo (trie): o regex resultante decide
+    a cada caractere entre os ramos possíveis, em vez de testar palavra por palavra
+    """
+    trie = {}
+    for palavra in palavras:
+        no = trie
+        for c in palavra:
+            no = no.setdefault(c, {})
+        no[''] = {}
+
+    def montar(no: Dict) -> str:
+        ramos = [(r'\s+' if c == ' ' else re.escape(c)) + montar(filho)
+                 for c, filho in sorted(no.items()) if c]
+        if not ramos:
+            return ''
+        fim = '' in no
+        if len(ramos) == 1 and not fim:
+            return ramos[0]
+        return '(?:' + '|'.join(ramos) + ')' + ('?' if fim else '')
+
+    return montar(trie)
+
+
+_NUMERO_VALOR = r'\d{1,3}(?:\.\d{3})*(?:,\d{2})?(?!\d)|\d+(?:,\d{2})?(?!\d)'
+
+# Padrões aplicados sobre o texto já em minúsculas (uma única cópia, sem re.IGNORECASE,
+# que deixa cada varredura bem mais lenta). Cada um captura o trecho do campo no grupo 1.
+PADROES_CAMPOS = {
+    'linha_digitavel': re.compile(rf'({PADRAO_LINHA_FORMATADA})'),
+    'cnpj_beneficiario': re.compile(r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})'),
+    'vencimento': re.compile(r'vencimento\s*:?\s*(\d{2}/\d{2}/\d{4})'),
+    'valor': re.compile(rf'(?:valor|r\$)\s*:?\s*({_NUMERO_VALOR})'),
+    'agencia': re.compile(r'ag[eê]ncia\s*(?:/\s*c[oó]digo\s+(?:do\s+)?benefici[aá]rio)?\s*:?\s*(\d{1,5})'),
+}
+PADRAO_BANCOS = re.compile(_padrao_palavras([palavra for palavra, _ in PALAVRAS_BANCO]))
+
+
+def converter_valor(valor_str: str) -> float:
+    """Converte string de valor ('1.234,56') para float"""
+    try:
+        valor_limpo = re.sub(r'[^\d,.]', '', valor_str)
+        if '.' in valor_limpo and ',' in valor_limpo:
+            valor_limpo = valor_limpo.replace('.', '')
+        return float(valor_limpo.replace(',', '.'))
+    except ValueError:
+        return 0.0
+
+
+def varrer_campos(texto_min: str) -> List[Tuple[int, str, str]]:
+    """
+    Todas as ocorrências de campos do texto (em minúsculas) como (posição, campo, trecho).
+    Cada padrão percorre o documento inteiro uma única vez, qualquer que seja o número de boletos.
+    """
+    ocorrencias = [(m.start(), campo, m.group(1))
+                   for campo, padrao in PADROES_CAMPOS.items() for m in padrao.finditer(texto_min)]
+    ocorrencias.extend((m.start(), 'banco', m.group(0)) for m in PADRAO_BANCOS.finditer(texto_min))
+    ocorrencias.sort()
+    return ocorrencias
+
+
+def montar_dados(ocorrencias: List[Tuple[int, str, str]], texto_min: Optional[str] = None) -> Dict:
+    """
+    Dados do boleto a partir das ocorrências: primeira de cada campo, banco por prioridade.
+    Com o texto, tenta recuperar a linha digitável que o OCR leu com erros. Uma linha que casou
+    com o padrão fica como foi lida, mesmo com DV inválido (que pode ser do próprio boleto);
+    só a recuperada é corrigida, com linha_recuperada e a leitura original em linha_ocr.
+    """
+    dados = {}
+    banco = None
+    for _, campo, trecho in ocorrencias:
+        if campo == 'banco':
+            candidato = _PRIORIDADE_BANCO.get(' '.join(trecho.split()))
+            if candidato and (banco is None or candidato[0] < banco[0]):
+                banco = candidato
+        elif campo not in dados:
+            dados[campo] = trecho
+
+    if 'valor' in dados:
+        dados['valor'] = converter_valor(dados['valor'])
+    if 'linha_digitavel' in dados:
+        dados['linha_digitavel'] = re.sub(r'[^\d]', '', dados['linha_digitavel'])
+    elif texto_min is not None:
+        # Letras no lugar de dígitos ou separadores trocados impedem o padrão de casar
+        recuperada = recuperar_linha_digitavel(texto_min, dados.get('valor'))
+        if recuperada:
+            dados['linha_digitavel'], dados['linha_ocr'] = recuperada
+            dados['linha_recuperada'] = True
+    if 'linha_digitavel' in dados:
+        dados['codigo_banco'] = int(dados['linha_digitavel'][:3])
+    if 'agencia' in dados:
+        dados['agencia'] = int(dados['agencia'])
+    if 'cnpj_beneficiario' in dados:
+        dados['cnpj_beneficiario'] = re.sub(r'[^\d]', '', dados['cnpj_beneficiario'])
+    banco = banco[1] if banco else None
+
+    # Completa valor e banco a partir da própria linha digitável quando o texto não traz os rótulos
+    # (caso do nível de OCR que lê apenas dígitos)
+    if dados.get('linha_digitavel') and validar_linha_digitavel(dados['linha_digitavel']):
+        if not dados.get('valor'):
+            valor_linha = extrair_valor_linha(dados['linha_digitavel'])
+            if valor_linha > 0:
+                dados['valor'] = valor_linha
+        if not banco:
+            banco = BANCOS_POR_CODIGO.get(dados.get('codigo_banco'))
+
+    dados['banco'] = banco if banco else 'Banco não identificado'
+
+    dados.setdefault('agencia', 1)
+    dados.setdefault('codigo_banco', 1)
+    dados.setdefault('valor', 0.0)
+
+    return dados
+
+
+def extrair_campos(texto: str) -> Dict:
+    """Extrai os dados de um boleto do texto (primeira ocorrência de cada campo)"""
+    texto_min = texto.lower()
+    ocorrencias = []
+    for campo, padrao in PADROES_CAMPOS.items():
+        match = padrao.search(texto_min)
+        if match:
+            ocorrencias.append((match.start(), campo, match.group(1)))
+
+    # O banco depende da prioridade, não da posição: só dá para parar cedo no de maior prioridade
+    for match in PADRAO_BANCOS.finditer(texto_min):
+        ocorrencias.append((match.start(), 'banco', match.group(0)))
+        if _PRIORIDADE_BANCO.get(' '.join(match.group(0).split()), (None,))[0] == 0:
+            break
+
+    return montar_dados(ocorrencias, texto_min)
+
+
+def extrair_campos_por_boleto(texto: str) -> List[Dict]:
+    """
+    Extrai cada boleto presente no texto. A mesma varredura é segmentada ao redor de cada
+    linha digitável: cada região começa uma linha de texto antes dela (onde costuma estar
+    o nome/código do banco) e vai até o início da região seguinte.
+    """
+    texto_min = texto.lower()
+    ocorrencias = varrer_campos(texto_min)
+    inicios_linha = [inicio for inicio, campo, _ in ocorrencias if campo == 'linha_digitavel']
+    if not inicios_linha:
+        dados = montar_dados(ocorrencias, texto_min)
+        return [dados] if dados.get('linha_recuperada') else []
+
+    cortes = [0]
+    for inicio in inicios_linha[1:]:
+        inicio_linha = texto_min.rfind('\n', 0, inicio)
+        linha_anterior = texto_min.rfind('\n', 0, max(inicio_linha, 0))
+        cortes.append(max(linha_anterior + 1, cortes[-1]))
+
+    regioes = [[] for _ in inicios_linha]
+    for ocorrencia in ocorrencias:
+        regioes[bisect_right(cortes, ocorrencia[0]) - 1].append(ocorrencia)
+
+    return [montar_dados(regiao) for regiao in regioes]
@@ -0,0 +1,80 @@
+"""
+Hashes perceptuais (dHash e pHash, 64 bits) para reconhecer fotos diferentes do mesmo boleto.
+Ao contrário de um hash do conteúdo, mudam pouco com iluminação, compressão e pequenas
+variações de enquadramento, e a semelhança é medida pela distância de Hamming.
+"""
+from typing import Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+LADO_HASH = 8      # 8x8 = 64 bits
+FATOR_PHASH = 4    # pHash: DCT sobre 32x32, mantendo as 8x8 frequências mais baixas
+LADO_DETALHADO = 64  # dHash detalhado (4096 bits) usado para confirmar uma suspeita de duplicata
+
+
+def _matriz_dct(n: int) -> np.ndarray:
+    """Matriz da DCT-II ortonormal de ordem n"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matriz = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matriz[0] /= np.sqrt(2)
+    return matriz
+
+
+_DCT = _matriz_dct(LADO_HASH * FATOR_PHASH)
+
+
+def _bits_para_int(bits: np.ndarray) -> int:
+    return int(''.join('1' if b else '0' for b in bits.flatten()), 2)
+
+
+def preparar_imagem(imagem: Image.Image) -> Image.Image:
+    """Tons de cinza, na orientação do EXIF, decodificando JPEGs já reduzidos quando possível"""
+    # draft() faz o decoder de JPEG entregar a imagem em 1/2, 1/4 ou 1/8 da resolução
+    imagem.draft('L', (LADO_HASH * FATOR_PHASH * 4, LADO_HASH * FATOR_PHASH * 4))
+    return ImageOps.exif_transpose(imagem).convert('L')
+
+
+def _gradiente(imagem: Image.Image, lado: int) -> np.ndarray:
+    pixels = np.asarray(imagem.resize((lado + 1, lado), Image.LANCZOS), dtype=np.int16)
+    return pixels[:, 1:] > pixels[:, :-1]
+
+
+def dhash(imagem: Image.Image) -> int:
+    """Hash de diferença: sinal do gradiente horizontal numa miniatura 9x8"""
+    return _bits_para_int(_gradiente(imagem, LADO_HASH))
+
+
+def dhash_detalhado(imagem: Image.Image) -> bytes:
+    """
+    dHash em 64x64. Os hashes de 64 bits só enxergam o layout (boletos diferentes do mesmo
+    emissor ficam a poucos bits de distância); nesta resolução as linhas de texto já contam.
+    """
+    return np.packbits(_gradiente(imagem, LADO_DETALHADO)).tobytes()
+
+
+def phash(imagem: Image.Image) -> int:
+    """Hash perceptual: frequências baixas da DCT comparadas com a mediana"""
+    lado = LADO_HASH * FATOR_PHASH
+    pixels = np.asarray(imagem.resize((lado, lado), Image.LANCZOS), dtype=np.float64)
+    frequencias = (_DCT @ pixels @ _DCT.T)[:LADO_HASH, :LADO_HASH]
+    # A componente contínua (brilho médio) fica fora da mediana
+    return _bits_para_int(frequencias > np.median(frequencias.flatten()[1:]))
+
+
+def calcular_hashes(imagem: Image.Image) -> Tuple[int, int, bytes]:
+    """(dhash, phash, dhash_detalhado) da imagem"""
+    imagem = preparar_imagem(imagem)
+    return dhash(imagem), phash(imagem), dhash_detalhado(imagem)
+
+
+def distancia_hamming(a: int, b: int) -> int:
+    """Número de bits diferentes entre dois hashes"""
+    return bin(a ^ b).count('1')
+
+
+def distancia_detalhada(a: bytes, b: bytes) -> float:
+    """Fração de bits diferentes entre dois dHash detalhados"""
+    diferentes = np.unpackbits(np.frombuffer(a, dtype=np.uint8) ^ np.frombuffer(b, dtype=np.uint8))
+    return float(diferentes.mean())
@@ -0,0 +1,202 @@
+import re
+from itertools import combinations
+from typing import List, Optional, Tuple
+
+# Código do banco (3 primeiros dígitos da linha digitável) -> nome usado pelo sistema
+BANCOS_POR_CODIGO = {
+    1: 'Banco do Brasil',
+    33: 'Santander',
+    104: 'Caixa Econômica',
+    237: 'Bradesco',
+    260: 'NU Pagamentos S.A. – Nubank',
+    341: 'Itaú'
+}
+
+
+def somente_digitos(linha: str) -> str:
+    """Remove tudo que não for dígito"""
+    return re.sub(r'[^\d]', '', linha or '')
+
+
+def modulo10(numero: str) -> int:
+    """Dígito verificador módulo 10 (pesos 2 e 1 a partir da direita)"""
+    soma = 0
+    peso = 2
+    for digito in reversed(numero):
+        produto = int(digito) * peso
+        soma += produto // 10 + produto % 10
+        peso = 1 if peso == 2 else 2
+    return (10 - soma % 10) % 10
+
+
+def modulo11(numero: str, arrecadacao: bool = False) -> int:
+    """Dígito verificador módulo 11 (pesos 2 a 9 a partir da direita)"""
+    soma = 0
+    peso = 2
+    for digito in reversed(numero):
+        soma += int(digito) * peso
+        peso = 2 if peso == 9 else peso + 1
+    resto = soma % 11
+
+    if arrecadacao:
+        # Convênios/arrecadação: restos 0 e 1 resultam em DV 0
+        return 0 if resto in (0, 1) else 11 - resto
+
+    dv = 11 - resto
+    return 1 if dv in (0, 10, 11) else dv
+
+
+def linha_para_codigo_barras(linha: str) -> str:
+    """Converte linha digitável de 47 dígitos no código de barras de 44 dígitos"""
+    linha = somente_digitos(linha)
+    if len(linha) != 47:
+        return ''
+    return linha[0:4] + linha[32] + linha[33:47] + linha[4:9] + linha[10:20] + linha[21:31]
+
+
+def validar_linha_digitavel(linha: str) -> bool:
+    """Confere os dígitos verificadores de uma linha digitável (47 ou 48 dígitos)"""
+    linha = somente_digitos(linha)
+
+    if len(linha) == 47:
+        # Boleto bancário: três campos com DV módulo 10 e DV geral módulo 11
+        campos = [(linha[0:9], linha[9]), (linha[10:20], linha[20]), (linha[21:31], linha[31])]
+        for campo, dv in campos:
+            if modulo10(campo) != int(dv):
+                return False
+
+        codigo_barras = linha_para_codigo_barras(linha)
+        return modulo11(codigo_barras[:4] + codigo_barras[5:]) == int(codigo_barras[4])
+
+    if len(linha) == 48:
+        # Arrecadação/convênio: quatro blocos de 11 dígitos + DV
+        if linha[0] != '8':
+            return False
+        usa_modulo10 = linha[2] in ('6', '7')
+        for i in range(4):
+            bloco = linha[i * 12:i * 12 + 11]
+            dv = int(linha[i * 12 + 11])
+            esperado = modulo10(bloco) if usa_modulo10 else modulo11(bloco, arrecadacao=True)
+            if esperado != dv:
+                return False
+        return True
+
+    return False
+
+
+def extrair_valor_linha(linha: str) -> float:
+    """Valor em reais codificado nos últimos 10 dígitos de um boleto bancário"""
+    linha = somente_digitos(linha)
+    if len(linha) != 47:
+        return 0.0
+    return int(linha[-10:]) / 100
+
+
+# Recuperação de linhas digitáveis lidas com erro pelo OCR.
+# Caracteres que o OCR costuma trocar, com os dígitos candidatos em ordem de probabilidade
+CONFUSOES_OCR = {
+    'o': '0', 'q': '09', 'd': '0', 'u': '0',
+    'i': '1', 'l': '17', '|': '1', '!': '1', 't': '71',
+    'z': '2', 's': '5', 'g': '96', 'b': '86', 'a': '4',
+}
+# Dígitos que o OCR lê no lugar de outros parecidos
+CONFUSOES_DIGITOS = {
+    '0': '86', '1': '7', '3': '8', '4': '9', '5': '6',
+    '6': '58', '7': '1', '8': '036', '9': '4',
+}
+SEPARADORES_OCR = ' \t.,-_:;\'`'
+
+MAX_LETRAS_TROCADAS = 8   # acima disso o trecho provavelmente não é uma linha digitável
+MAX_TROCAS = 1            # trocas simultâneas pela tabela de confusões
+MAX_TENTATIVAS = 2000     # teto de candidatos testados por texto
+
+_CARACTERES_CANDIDATOS = re.escape('0123456789' + ''.join(CONFUSOES_OCR))
+_PADRAO_TRECHO_OCR = re.compile(
+    rf'[{_CARACTERES_CANDIDATOS}][{_CARACTERES_CANDIDATOS}{re.escape(SEPARADORES_OCR)}]{{45,}}'
+)
+
+# Campos da linha de 47 dígitos com DV módulo 10 próprio: (início, fim exclusivo), DV na última posição
+_CAMPOS_MODULO10 = [(0, 10), (10, 21), (21, 32)]
+
+
+def _opcoes(caractere: str) -> str:
+    """Dígitos possíveis para um caractere lido pelo OCR, o mais provável primeiro"""
+    if caractere.isdigit():
+        return caractere + CONFUSOES_DIGITOS.get(caractere, '')
+    return CONFUSOES_OCR[caractere]
+
+
+def corrigir_linha_digitavel(linha_ocr: str, valor_esperado: Optional[float] = None,
+                             tentativas: List[int] = None) -> Optional[str]:
+    """
+    Corrige uma linha de boleto bancário (47 posições, dígitos ou letras confundidas) usando os
+    dígitos verificadores. Testa primeiro a leitura mais provável de cada posição e depois trocas
+    pela tabela de confusões, das menores para as maiores (até MAX_TROCAS). Os campos cujo DV
+    módulo 10 falha indicam onde as trocas precisam estar. Só aceita uma correção sem concorrentes
+    no mesmo número de trocas e, se o texto trouxer o valor, coerente com ele.
+    Retorna None se não houver correção única dentro dos limites.
+    """
+    if len(linha_ocr) != 47:
+        return None
+    opcoes = [_opcoes(c) for c in linha_ocr]
+    base = [o[0] for o in opcoes]
+    tentativas = tentativas if tentativas is not None else [0]
+
+    if validar_linha_digitavel(''.join(base)):
+        return ''.join(base)
+
+    # Todo campo com DV inválido precisa de ao menos uma troca
+    campos_invalidos = [(inicio, fim) for inicio, fim in _CAMPOS_MODULO10
+                        if modulo10(''.join(base[inicio:fim - 1])) != int(base[fim - 1])]
+    alternativas = [(posicao, digito) for posicao, o in enumerate(opcoes) for digito in o[1:]]
+
+    for trocas in range(max(len(campos_invalidos), 1), MAX_TROCAS + 1):
+        validas = set()
+        for combinacao in combinations(alternativas, trocas):
+            posicoes = {posicao for posicao, _ in combinacao}
+            if len(posicoes) < trocas:
+                continue
+            if not all(any(inicio <= p < fim for p in posicoes) for inicio, fim in campos_invalidos):
+                continue
+            tentativas[0] += 1
+            if tentativas[0] > MAX_TENTATIVAS:
+                return None
+            candidato = list(base)
+            for posicao, digito in combinacao:
+                candidato[posicao] = digito
+            candidato = ''.join(candidato)
+            if validar_linha_digitavel(candidato):
+                validas.add(candidato)
+
+        if valor_esperado:
+            validas = {linha for linha in validas if abs(extrair_valor_linha(linha) - valor_esperado) < 0.005}
+        if validas:
+            return validas.pop() if len(validas) == 1 else None
+    return None
+
+
+def recuperar_linha_digitavel(texto: str, valor_esperado: Optional[float] = None) -> Optional[Tuple[str, str]]:
+    """
+    Procura no texto (em minúsculas) um trecho que seja uma linha digitável com erros de OCR:
+    letras no lugar de dígitos, separadores trocados ou faltando.
+    Retorna (linha corrigida, 47 posições como o OCR leu, sem separadores).
+    """
+    tentativas = [0]
+    for match in _PADRAO_TRECHO_OCR.finditer(texto):
+        # Grupos entre separadores; a linha é uma sequência de grupos inteiros somando 47 posições
+        # (separadores perdidos só juntam grupos). Isso descarta letras coladas, como o 'l' de "digitável:"
+        grupos = [g for g in re.split(f'[{re.escape(SEPARADORES_OCR)}]+', match.group(0)) if g]
+        for inicio in range(len(grupos)):
+            janela = ''
+            for grupo in grupos[inicio:]:
+                janela += grupo
+                if len(janela) >= 47:
+                    break
+            if len(janela) != 47 or sum(1 for c in janela if not c.isdigit()) > MAX_LETRAS_TROCADAS:
+                continue
+            linha = corrigir_linha_digitavel(janela, valor_esperado, tentativas)
+            if linha:
+                return linha, janela
+            if tentativas[0] > MAX_TENTATIVAS:
+                return None
+    return None
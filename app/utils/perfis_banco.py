@@ -0,0 +1,121 @@
+"""
+Perfis de configuração do engine do banco (DB_PERFIL), para SQLite e PostgreSQL.
+
+padrao      -- padrões do SQLAlchemy e do driver (comportamento anterior)
+desempenho  -- SQLite: WAL, synchronous=NORMAL (o commit não espera fsync; uma queda de energia
+               pode perder as últimas transações, mas não corrompe o arquivo), mmap e cache maiores.
+               PostgreSQL: pool maior, pre-ping, statement_timeout e synchronous_commit=off
+duravel     -- SQLite: WAL com synchronous=FULL. PostgreSQL: pool do perfil desempenho com
+               synchronous_commit=on
+
+Todos os perfis, menos o padrao, definem busy_timeout (SQLite; o padrão do driver é 5s, curto
+para vários workers disputando o arquivo) e reciclam conexões (PostgreSQL).
+Variáveis DB_* sobrescrevem valores de qualquer perfil. Consultas lidas em lotes (yield_per)
+já usam cursor no servidor no PostgreSQL (stream_results), em qualquer perfil.
+"""
+import os
+from typing import Dict
+from sqlalchemy import event
+
+PERFIS = {
+    'padrao': {},
+    'desempenho': {
+        'sqlite': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 30000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,  # negativo: em KiB
+            'temp_store': 'MEMORY',
+        },
+        'postgresql': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 10,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+            'statement_timeout': 30000,
+            'synchronous_commit': 'off',
+        },
+    },
+    'duravel': {
+        'sqlite': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 30000,
+        },
+        'postgresql': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 10,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+            'statement_timeout': 30000,
+            'synchronous_commit': 'on',
+        },
+    },
+}
+
+# Sobrescritas por variável de ambiente: nome -> (chave, conversão)
+SOBRESCRITAS = {
+    'DB_BUSY_TIMEOUT_MS': ('busy_timeout', int),
+    'DB_SYNCHRONOUS': ('synchronous', str),
+    'DB_MMAP_SIZE': ('mmap_size', int),
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_STATEMENT_TIMEOUT_MS': ('statement_timeout', int),
+}
+
+# Pragmas por conexão, na ordem em que são aplicados
+PRAGMAS_SQLITE = ('busy_timeout', 'journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store')
+
+
+def dialeto(uri: str) -> str:
+    return 'postgresql' if uri.startswith(('postgres://', 'postgresql')) else 'sqlite' if uri.startswith('sqlite') else 'outro'
+
+
+def configuracao_perfil(uri: str, perfil: str) -> Dict:
+    """Valores do perfil para o banco da URI, com as sobrescritas DB_* aplicadas"""
+    if perfil not in PERFIS:
+        raise ValueError(f"DB_PERFIL inválido: {perfil} (use {', '.join(PERFIS)})")
+
+    config = dict(PERFIS[perfil].get(dialeto(uri), {}))
+    for variavel, (chave, conversao) in SOBRESCRITAS.items():
+        if os.getenv(variavel):
+            config[chave] = conversao(os.getenv(variavel))
+    return config
+
+
+def opcoes_engine(uri: str, perfil: str) -> Dict:
+    """SQLALCHEMY_ENGINE_OPTIONS do perfil"""
+    config = configuracao_perfil(uri, perfil)
+    if dialeto(uri) != 'postgresql':
+        return {}
+
+    opcoes = {chave: config[chave] for chave in
+              ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping') if chave in config}
+    parametros = []
+    if 'statement_timeout' in config:
+        parametros.append(f"-c statement_timeout={config['statement_timeout']}")
+    if 'synchronous_commit' in config:
+        parametros.append(f"-c synchronous_commit={config['synchronous_commit']}")
+    if parametros:
+        opcoes['connect_args'] = {'options': ' '.join(parametros)}
+    return opcoes
+
+
+def aplicar_pragmas(engine, perfil: str):
+    """Registra os pragmas do perfil em cada nova conexão SQLite do engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+    config = configuracao_perfil(str(engine.url), perfil)
+    pragmas = [(nome, config[nome]) for nome in PRAGMAS_SQLITE if nome in config]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        for nome, valor in pragmas:
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
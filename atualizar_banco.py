@@ -0,0 +1,71 @@
+"""
+Atualiza o esquema de um banco existente (SQLite ou PostgreSQL, conforme DATABASE_URL) para os
+modelos atuais, sem apagar dados: cria as tabelas, colunas e índices que faltam.
+Pode rodar mais de uma vez (o que já existe é mantido); roda a cada deploy pelo build.sh.
+Num banco vazio cria todas as tabelas. Para recriar o banco do zero, use resetar_db.py.
+"""
+from sqlalchemy import inspect, text
+from app import create_app, db
+from app.models.boleto import AnaliseBoleto, HashImagemBoleto
+from app.models.estatisticas import ContadorAnalises, RollupAnalisesDia, RollupAnalisesHora
+from app.models.sequencia import Sequencia
+from app.models.uso_diario import UsoDiario
+
+# Tabelas criadas depois do esquema original (users e analises_boleto), com seus índices
+TABELAS_NOVAS = [
+    HashImagemBoleto,
+    UsoDiario,
+    ContadorAnalises,
+    RollupAnalisesHora,
+    RollupAnalisesDia,
+    Sequencia,
+]
+
+# Colunas adicionadas a tabelas existentes: (modelo, coluna). Todas aceitam NULL
+COLUNAS_NOVAS = [
+    (AnaliseBoleto, 'nivel_extracao'),
+    (AnaliseBoleto, 'linha_ocr'),
+]
+
+# Índices adicionados a tabelas existentes: (modelo, nome do índice)
+INDICES_NOVOS = [
+    # Paginação por cursor do histórico: sem eles, cada página ordena a tabela inteira
+    (AnaliseBoleto, 'ix_analises_created_at_id'),
+    (AnaliseBoleto, 'ix_analises_user_created_at_id'),
+    (AnaliseBoleto, 'ix_analises_resultado_created_at_id'),
+]
+
+
+def atualizar():
+    with db.engine.begin() as conexao:
+        inspetor = inspect(conexao)
+        if not inspetor.has_table(AnaliseBoleto.__tablename__):
+            db.metadata.create_all(conexao)
+            print("Banco vazio: todas as tabelas criadas")
+            return
+
+        for modelo in TABELAS_NOVAS:
+            if not inspetor.has_table(modelo.__tablename__):
+                modelo.__table__.create(conexao)
+                print(f"Tabela criada: {modelo.__tablename__}")
+
+        for modelo, nome in COLUNAS_NOVAS:
+            tabela = modelo.__table__
+            if nome not in {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}:
+                tipo = tabela.c[nome].type.compile(dialect=conexao.dialect)
+                conexao.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {nome} {tipo}"))
+                print(f"Coluna criada: {tabela.name}.{nome}")
+
+        for modelo, nome in INDICES_NOVOS:
+            tabela = modelo.__table__
+            if nome not in {indice['name'] for indice in inspetor.get_indexes(tabela.name)}:
+                next(indice for indice in tabela.indexes if indice.name == nome).create(conexao)
+                print(f"Índice criado: {nome}")
+
+    print("Esquema do banco atualizado")
+
+
+if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        atualizar()
@@ -7,4 +7,7 @@ apt-get update
 apt-get install -y tesseract-ocr poppler-utils
 
 # Instala as dependências do Python
-pip install -r requirements.txt
\ No newline at end of file
+pip install -r requirements.txt
+
+# Cria/atualiza as tabelas do banco (DATABASE_URL) sem apagar dados
+python atualizar_banco.py
@@ -0,0 +1,19 @@
+"""
+Refaz os contadores de estatísticas (/api/stats) e os rollups por hora e por dia
+(/api/stats/timeseries) a partir das análises já gravadas.
+Rodar uma vez após criar as tabelas (python atualizar_banco.py) num banco com análises antigas,
+com o servidor parado.
+"""
+from app import create_app, db
+
+app = create_app()
+with app.app_context():
+    db.create_all()
+
+    from app.routes.boleto_routes import estatisticas_service
+    print("Recalculando contadores e rollups de estatísticas...")
+    estatisticas_service.recalcular()
+
+    resumo = estatisticas_service.resumo()
+    print(f"Total de análises: {resumo['total_analises']} "
+          f"({resumo['verdadeiros']} verdadeiras, {resumo['falsos']} falsas)")
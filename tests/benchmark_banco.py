@@ -0,0 +1,124 @@
+"""
+Benchmark dos perfis do banco (DB_PERFIL): processos escritores gravando análises (com os
+contadores de estatísticas, como nas rotas) enquanto processos leitores consultam o histórico,
+como workers do gunicorn disputando o mesmo banco.
+Uso: python tests/benchmark_banco.py [escritores] [analises_por_escritor] [leitores] [url]
+
+Sem url, cada perfil roda num arquivo SQLite temporário. Com url (ex.: PostgreSQL), as tabelas
+são apagadas e recriadas a cada perfil: use um banco descartável.
+"""
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app import create_app, db
+from app.models.boleto import AnaliseBoleto
+from app.utils.perfis_banco import PERFIS
+
+# App do perfil em medição, herdada pelos processos filhos (fork)
+_app = None
+
+
+def nova_analise(indice: int) -> AnaliseBoleto:
+    return AnaliseBoleto(
+        user_id=None, banco=1.0, codigo_banco=[1, 237, 341, 104][indice % 4], agencia=1234, valor=100.0,
+        linha_digitavel='00190000090123456789012345678901234567890123', linha_cod_banco=1, linha_moeda=9,
+        linha_valor=10000, resultado='Falso' if indice % 3 == 0 else 'Verdadeiro',
+        probabilidade_falso=0.3, probabilidade_verdadeiro=0.7, confianca=0.7
+    )
+
+
+def _escrever(numero, quantidade, largada, resultados):
+    latencias, erros = [], []
+    with _app.app_context():
+        db.engine.dispose(close=False)  # conexões do pai não são reaproveitadas no filho
+        largada.wait()
+        for i in range(quantidade):
+            inicio = time.perf_counter()
+            try:
+                db.session.add(nova_analise(numero * quantidade + i))
+                db.session.commit()
+                latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                db.session.rollback()
+                erros.append(str(e).split('\n')[0][:120])
+    resultados.put(('escrita', latencias, erros))
+
+
+def _ler(largada, parar, resultados):
+    leituras = 0
+    with _app.app_context():
+        db.engine.dispose(close=False)
+        largada.wait()
+        while not parar.is_set():
+            AnaliseBoleto.query.order_by(AnaliseBoleto.created_at.desc(), AnaliseBoleto.id.desc()).limit(20).all()
+            db.session.rollback()
+            leituras += 1
+    resultados.put(('leitura', leituras, []))
+
+
+def medir_perfil(perfil: str, url: str, escritores: int, por_escritor: int, leitores: int):
+    global _app
+    os.environ['DB_PERFIL'] = perfil
+    os.environ['DATABASE_URL'] = url
+    _app = create_app()
+    with _app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.remove()
+        db.engine.dispose()
+
+    contexto = multiprocessing.get_context('fork')
+    largada, parar, resultados = contexto.Event(), contexto.Event(), contexto.Queue()
+    processos_escrita = [contexto.Process(target=_escrever, args=(n, por_escritor, largada, resultados))
+                         for n in range(escritores)]
+    processos_leitura = [contexto.Process(target=_ler, args=(largada, parar, resultados)) for _ in range(leitores)]
+    for processo in processos_escrita + processos_leitura:
+        processo.start()
+
+    inicio = time.perf_counter()
+    largada.set()
+    latencias, erros, leituras = [], [], 0
+    for _ in range(escritores):
+        _, lat, err = resultados.get()
+        latencias += lat
+        erros += err
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    for _ in range(leitores):
+        leituras += resultados.get()[1]
+    for processo in processos_escrita + processos_leitura:
+        processo.join()
+
+    with _app.app_context():
+        gravadas = AnaliseBoleto.query.count()
+        db.session.remove()
+        db.engine.dispose()
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95)] if latencias else 0
+    print(f"{perfil:11} {len(latencias) / duracao:8.0f} escritas/s | {leituras / duracao:8.0f} leituras/s | "
+          f"escrita p50 {statistics.median(latencias) * 1000 if latencias else 0:6.1f} ms "
+          f"p95 {p95 * 1000:6.1f} ms | erros {len(erros)} | gravadas {gravadas}")
+    for erro in sorted(set(erros)):
+        print(f"            {erros.count(erro)}x {erro}")
+
+
+def main():
+    escritores = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    por_escritor = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    leitores = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    url = sys.argv[4] if len(sys.argv) > 4 else None
+
+    print(f"=== BENCHMARK BANCO: {escritores} escritores x {por_escritor} análises, {leitores} leitores ===")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for perfil in PERFIS:
+            medir_perfil(perfil, url or f"sqlite:///{os.path.join(diretorio, perfil + '.db')}",
+                         escritores, por_escritor, leitores)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark da extração de campos em textos de OCR grandes (PDFs de várias páginas).
+Uso: python tests/benchmark_extracao.py [boletos] [repeticoes]
+"""
+import random
+import sys
+import time
+
+from corpus_sintetico import gerar_boleto
+
+from app.utils.extrator_campos import extrair_campos, extrair_campos_por_boleto
+
+
+def gerar_texto_ocr(quantidade: int, rng: random.Random):
+    """Texto de várias páginas: boletos intercalados com parágrafos de 'ruído' de OCR"""
+    ruido = "Pagável em qualquer banco até o vencimento. Após, cobrar multa de 2%. Sacador/Avalista: "
+    boletos = [gerar_boleto(rng) for _ in range(quantidade)]
+    paginas = [ruido * rng.randint(5, 30) + "\n" + boleto['texto'] for boleto in boletos]
+    return "\n\f\n".join(paginas), boletos
+
+
+def medir(funcao, texto, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao(texto)
+    return (time.perf_counter() - inicio) / repeticoes, resultado
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    texto, boletos = gerar_texto_ocr(quantidade, random.Random(42))
+    tamanho_mb = len(texto.encode('utf-8')) / 1024 / 1024
+    print(f"=== BENCHMARK EXTRAÇÃO: {quantidade} boletos, {tamanho_mb:.2f} MB de texto ===")
+
+    duracao, dados = medir(extrair_campos, texto, repeticoes)
+    print(f"arquivo único   {duracao * 1000:8.1f} ms | {tamanho_mb / duracao:6.1f} MB/s")
+
+    duracao, extraidos = medir(extrair_campos_por_boleto, texto, repeticoes)
+    acertos = sum(1 for d, b in zip(extraidos, boletos)
+                  if d['linha_digitavel'] == b['linha_digitavel'] and abs(d['valor'] - b['valor']) < 0.01)
+    print(f"vários boletos  {duracao * 1000:8.1f} ms | {tamanho_mb / duracao:6.1f} MB/s | "
+          f"{len(extraidos) / duracao:8.0f} boletos/s | corretos {acertos}/{quantidade}")
+
+
+if __name__ == "__main__":
+    main()
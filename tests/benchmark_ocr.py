@@ -0,0 +1,51 @@
+"""
+Benchmark dos backends de OCR (pytesseract x pool tesserocr) no corpus sintético.
+Uso: python tests/benchmark_ocr.py [quantidade] [threads]
+"""
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus_sintetico import gerar_corpus
+from PIL import Image
+
+from app.services.ocr_service import PytesseractBackend, TesserocrPoolBackend, tesserocr
+
+
+def medir(backend, imagens, threads):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        textos = list(executor.map(lambda img: backend.reconhecer(img, 6, None, 60), imagens))
+    return time.perf_counter() - inicio, textos
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    corpus = [item for item in gerar_corpus(quantidade) if item[2] == 'png']
+    imagens = [Image.open(io.BytesIO(conteudo)).convert('RGB') for _, conteudo, _, _ in corpus]
+    print(f"=== BENCHMARK OCR: {len(imagens)} imagens, {threads} thread(s) ===")
+    if not imagens:
+        # O corpus alterna os formatos: quantidades pequenas podem não ter nenhuma imagem
+        print("Nenhuma imagem PNG no corpus: use uma quantidade maior")
+        return
+
+    backends = [PytesseractBackend()]
+    if tesserocr is not None:
+        backends.append(TesserocrPoolBackend(tamanho_pool=threads))
+    else:
+        print("tesserocr não instalado: medindo apenas pytesseract")
+
+    for backend in backends:
+        backend.reconhecer(imagens[0], 6, None, 60)  # aquecimento
+        duracao, textos = medir(backend, imagens, threads)
+        acertos = sum(1 for texto, (_, _, _, boleto) in zip(textos, corpus)
+                      if boleto['linha_digitavel'][:5] in texto.replace('.', '').replace(' ', ''))
+        print(f"{backend.nome:12s} total {duracao:6.2f}s | {duracao / len(imagens) * 1000:7.1f} ms/imagem | "
+              f"{len(imagens) / duracao:5.2f} imagens/s | linha reconhecida em {acertos}/{len(imagens)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Corpus sintético de boletos para benchmarks.
+Gera linhas digitáveis com dígitos verificadores válidos e as renderiza como
+texto, imagem (limpa ou "fotografada") e PDF (com camada de texto ou escaneado).
+"""
+import io
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.linha_digitavel import modulo10, modulo11
+
+BANCOS = [
+    ('001', 'BANCO DO BRASIL S.A.'),
+    ('341', 'ITAÚ UNIBANCO S.A.'),
+    ('237', 'BANCO BRADESCO S.A.'),
+    ('033', 'BANCO SANTANDER S.A.'),
+    ('104', 'CAIXA ECONÔMICA FEDERAL'),
+]
+
+
+def gerar_linha_digitavel(codigo_banco: str, valor_centavos: int, fator: int, rng: random.Random) -> str:
+    """Linha digitável de 47 dígitos com os três DVs de campo e o DV geral corretos"""
+    campo_livre = ''.join(rng.choice('0123456789') for _ in range(25))
+    sem_dv = codigo_banco + '9' + str(fator).zfill(4) + str(valor_centavos).zfill(10) + campo_livre
+    codigo_barras = sem_dv[:4] + str(modulo11(sem_dv)) + sem_dv[4:]
+
+    c1 = codigo_barras[0:4] + codigo_barras[19:24]
+    c2 = codigo_barras[24:34]
+    c3 = codigo_barras[34:44]
+    return (c1 + str(modulo10(c1)) + c2 + str(modulo10(c2)) + c3 + str(modulo10(c3))
+            + codigo_barras[4] + codigo_barras[5:19])
+
+
+def formatar_linha(linha: str) -> str:
+    """Formata como impresso no boleto: 00190.00009 01234.567890 12345.678901 2 12345678901234"""
+    return (f"{linha[0:5]}.{linha[5:10]} {linha[10:15]}.{linha[15:21]} "
+            f"{linha[21:26]}.{linha[26:32]} {linha[32]} {linha[33:]}")
+
+
+def gerar_boleto(rng: random.Random) -> dict:
+    codigo_banco, nome_banco = rng.choice(BANCOS)
+    valor_centavos = rng.randint(1000, 500000)
+    vencimento = date(2025, 1, 1) + timedelta(days=rng.randint(0, 365))
+    fator = (vencimento - date(1997, 10, 7)).days % 9000 + 1000
+    linha = gerar_linha_digitavel(codigo_banco, valor_centavos, fator, rng)
+    valor_fmt = f"{valor_centavos / 100:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+    texto = "\n".join([
+        nome_banco,
+        f"Linha Digitável: {formatar_linha(linha)}",
+        f"Valor: R$ {valor_fmt}",
+        f"Vencimento: {vencimento.strftime('%d/%m/%Y')}",
+        f"Agência/Código Beneficiário: {rng.randint(1000, 9999)}/{rng.randint(10000, 99999)}-{rng.randint(0, 9)}",
+        f"CNPJ: {rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}/0001-{rng.randint(10, 99)}",
+    ])
+
+    return {
+        'banco': nome_banco,
+        'codigo_banco': int(codigo_banco),
+        'valor': valor_centavos / 100,
+        'linha_digitavel': linha,
+        'texto': texto
+    }
+
+
+def renderizar_imagem(boleto: dict, fotografada: bool = False, rng: random.Random = None):
+    """Imagem do boleto; 'fotografada' adiciona rotação, desfoque e ruído"""
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+    try:
+        fonte = ImageFont.load_default(size=28)
+    except TypeError:  # Pillow < 10.1
+        fonte = ImageFont.load_default()
+
+    imagem = Image.new('RGB', (1700, 500), 'white')
+    desenho = ImageDraw.Draw(imagem)
+    for i, linha in enumerate(boleto['texto'].split('\n')):
+        desenho.text((60, 40 + i * 70), linha, fill='black', font=fonte)
+
+    if fotografada:
+        rng = rng or random.Random()
+        imagem = imagem.rotate(rng.uniform(-2.5, 2.5), expand=True, fillcolor='white')
+        imagem = imagem.filter(ImageFilter.GaussianBlur(rng.uniform(0.6, 1.4)))
+        ruido = Image.effect_noise(imagem.size, rng.uniform(20, 45)).convert('RGB')
+        imagem = Image.blend(imagem, ruido, 0.18)
+
+    return imagem
+
+
+def renderizar_pdf(boleto: dict, escaneado: bool = False, paginas: int = 1) -> bytes:
+    """PDF com camada de texto ou 'escaneado' (apenas a imagem da página)"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    largura, altura = A4
+    for _ in range(paginas):
+        if escaneado:
+            c.drawImage(ImageReader(renderizar_imagem(boleto)), 30, altura - 250, width=largura - 60, height=180)
+        else:
+            c.setFont("Helvetica", 11)
+            for i, linha in enumerate(boleto['texto'].split('\n')):
+                c.drawString(50, altura - 80 - i * 20, linha)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def gerar_corpus(quantidade: int = 30, semente: int = 42) -> list:
+    """
+    Lista de (nome, conteúdo, extensão, boleto) misturando PDFs com texto,
+    PDFs escaneados, screenshots limpos e fotos ruidosas
+    """
+    rng = random.Random(semente)
+    corpus = []
+    for i in range(quantidade):
+        boleto = gerar_boleto(rng)
+        tipo = i % 4
+        if tipo == 0:
+            corpus.append((f'boleto_{i}_texto.pdf', renderizar_pdf(boleto), 'pdf', boleto))
+        elif tipo == 1:
+            corpus.append((f'boleto_{i}_escaneado.pdf', renderizar_pdf(boleto, escaneado=True), 'pdf', boleto))
+        else:
+            buffer = io.BytesIO()
+            renderizar_imagem(boleto, fotografada=(tipo == 3), rng=rng).save(buffer, 'PNG')
+            sufixo = 'foto' if tipo == 3 else 'screenshot'
+            corpus.append((f'boleto_{i}_{sufixo}.png', buffer.getvalue(), 'png', boleto))
+    return corpus
+
+
+if __name__ == "__main__":
+    destino = sys.argv[1] if len(sys.argv) > 1 else 'corpus_boletos'
+    os.makedirs(destino, exist_ok=True)
+    for nome, conteudo, _, _ in gerar_corpus():
+        with open(os.path.join(destino, nome), 'wb') as f:
+            f.write(conteudo)
+    print(f"Corpus gerado em {destino}/")
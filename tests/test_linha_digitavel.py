@@ -0,0 +1,58 @@
+"""
+Testes da correção de linhas digitáveis pelos dígitos verificadores (app/utils/linha_digitavel.py)
+e da regra do extrator: só a linha que o padrão não casou é corrigida.
+Uso: python -m pytest tests/test_linha_digitavel.py
+"""
+from app.utils.extrator_campos import extrair_campos
+from app.utils.linha_digitavel import (
+    corrigir_linha_digitavel, recuperar_linha_digitavel, validar_linha_digitavel
+)
+
+# Linha válida (Santander, R$ 3.983,86)
+LINHA = '03390487614759382421394892411573121630000398386'
+VALOR = 3983.86
+# Mesma linha com o 8 da posição 43 lido como 0: o DV geral falha e mais de uma troca
+# pela tabela de confusões fecha os DVs
+LINHA_DV_ERRADO = LINHA[:43] + '0' + LINHA[44:]
+
+
+def formatar(linha):
+    return f'{linha[:5]}.{linha[5:10]} {linha[10:15]}.{linha[15:21]} {linha[21:26]}.{linha[26:32]} {linha[32]} {linha[33:]}'
+
+
+def test_linha_valida_fica_como_esta():
+    assert validar_linha_digitavel(LINHA)
+    assert corrigir_linha_digitavel(LINHA) == LINHA
+
+    dados = extrair_campos(f'Santander\nLinha digitável: {formatar(LINHA)}\nValor: R$ 3.983,86')
+    assert dados['linha_digitavel'] == LINHA
+    assert 'linha_recuperada' not in dados
+    assert 'linha_ocr' not in dados
+
+
+def test_linha_lida_limpa_com_dv_errado_nao_e_corrigida():
+    assert not validar_linha_digitavel(LINHA_DV_ERRADO)
+    # Com o valor a correção seria única; mesmo assim o extrator não corrige uma linha que casou
+    assert corrigir_linha_digitavel(LINHA_DV_ERRADO, VALOR) == LINHA
+
+    dados = extrair_campos(f'Santander\nLinha digitável: {formatar(LINHA_DV_ERRADO)}\nValor: R$ 3.983,86')
+    assert dados['linha_digitavel'] == LINHA_DV_ERRADO
+    assert 'linha_recuperada' not in dados
+
+
+def test_letras_o_e_l_sao_recuperadas():
+    # 0 lido como 'o' e 1 lido como 'l', com um separador trocado
+    lida = 'o33904876l4759382421394892411573l2163oooo398386'
+    texto = f'linha digitável: {lida[:5]}-{lida[5:10]} {lida[10:]}'
+    assert recuperar_linha_digitavel(texto) == (LINHA, lida)
+
+    dados = extrair_campos(texto)
+    assert dados['linha_digitavel'] == LINHA
+    assert dados['linha_recuperada'] is True
+    assert dados['linha_ocr'] == lida
+
+
+def test_correcao_ambigua_e_rejeitada():
+    # Sem o valor, mais de uma linha válida a uma troca de distância: nenhuma é escolhida
+    assert corrigir_linha_digitavel(LINHA_DV_ERRADO) is None
+    assert recuperar_linha_digitavel(formatar(LINHA_DV_ERRADO).replace(' ', '-')) is None
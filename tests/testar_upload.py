@@ -16,9 +16,21 @@ def testar_upload_sem_arquivo():
     print(f"Resposta: {response.json()}")
     print()
 
+def testar_analise_texto():
+    print("=== TESTE ANÁLISE POR TEXTO (OCR NO DISPOSITIVO) ===")
+    texto = """BANCO DO BRASIL S.A.
+Linha Digitável: 00190.00009 01234.567890 12345.678901 2 12345678901234
+Valor: R$ 1.250,00
+Vencimento: 15/03/2025"""
+    response = requests.post(f"{base_url}/api/upload/analyze-text", json={"texto": texto})
+    print(f"Status: {response.status_code}")
+    print(f"Resposta: {response.json()}")
+    print()
+
 if __name__ == "__main__":
     print("🔄 TESTANDO SISTEMA DE UPLOAD")
     print("=" * 50)
     
     testar_limites()
-    testar_upload_sem_arquivo()
\ No newline at end of file
+    testar_upload_sem_arquivo()
+    testar_analise_texto()
\ No newline at end of file
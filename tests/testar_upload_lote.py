@@ -0,0 +1,54 @@
+import io
+import json
+import random
+import zipfile
+import requests
+
+from corpus_sintetico import gerar_boleto, renderizar_pdf
+
+base_url = "http://localhost:5000"
+
+def fazer_login():
+    dados = {"email": "joao@teste.com", "senha": "MinhaSenh@123!"}
+    response = requests.post(f"{base_url}/api/auth/login", json=dados)
+    return response.json().get('token')
+
+def criar_zip_boletos(quantidade=10):
+    """Cria um .zip em memória com PDFs de boletos sintéticos"""
+    rng = random.Random(7)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as arquivo_zip:
+        for i in range(quantidade):
+            arquivo_zip.writestr(f"boleto_{i}.pdf", renderizar_pdf(gerar_boleto(rng)))
+    return buffer.getvalue()
+
+def testar_upload_lote():
+    print("=== TESTE UPLOAD EM LOTE (.zip) ===")
+
+    token = fazer_login()
+    if not token:
+        print("Falha no login - rode testar_auth.py antes para criar o usuário")
+        return
+
+    files = {'file': ('lote.zip', criar_zip_boletos(), 'application/zip')}
+    response = requests.post(
+        f"{base_url}/api/upload/analyze-archive",
+        files=files,
+        headers={'Authorization': f'Bearer {token}'},
+        stream=True
+    )
+    print(f"Status: {response.status_code}")
+
+    # Uma linha NDJSON por arquivo, à medida que cada um termina
+    for linha in response.iter_lines():
+        resultado = json.loads(linha)
+        if 'resumo' in resultado:
+            print(f"Resumo: {resultado['resumo']}")
+        elif resultado['status'] == 'ok':
+            print(f"{resultado['arquivo']}: {resultado['resultado_ml']['predicao']} "
+                  f"({resultado['resultado_ml']['confianca']:.2%})")
+        else:
+            print(f"{resultado['arquivo']}: ERRO - {resultado['erro']}")
+
+if __name__ == "__main__":
+    testar_upload_lote()